@@ -0,0 +1,262 @@
+"""
+基于 adb 服务协议（默认 127.0.0.1:5037）的 ADB 客户端
+
+与每条命令启动一个 adb 进程不同，客户端直接与 adb 服务通信，并为每台设备保持若干个
+常驻的 sh 会话，命令写入会话后按结束标记读取输出，单条命令的额外开销接近于零。
+所有连接都在客户端自有的事件循环线程中处理：异步代码使用 a 前缀的方法，同步代码使用同名的同步方法。
+"""
+
+import asyncio
+import subprocess
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+from config import Config
+from logger import logger
+from metrics import ADB_LATENCY
+
+
+class AdbError(RuntimeError):
+    """adb 服务返回 FAIL 或连接异常"""
+
+
+class AdbConnectionError(AdbError):
+    """无法连接 adb 服务"""
+
+
+class AdbTimeoutError(AdbError):
+    """命令超过截止时间"""
+
+
+async def _send_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, payload: str):
+    """发送一条服务请求（4 位十六进制长度 + 内容），服务返回 FAIL 时抛出 AdbError"""
+    data = payload.encode("utf-8")
+    writer.write(f"{len(data):04x}".encode() + data)
+    await writer.drain()
+    status = await reader.readexactly(4)
+    if status == b"OKAY":
+        return
+    if status == b"FAIL":
+        raise AdbError(await _read_length_prefixed(reader))
+    raise AdbError(f"Unexpected adb response: {status!r}")
+
+
+async def _read_length_prefixed(reader: asyncio.StreamReader) -> str:
+    length = int(await reader.readexactly(4), 16)
+    return (await reader.readexactly(length)).decode("utf-8", "replace")
+
+
+class _ShellSession:
+    """设备上常驻的 sh 进程，命令依次执行"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    async def run(self, command: str) -> Tuple[str, int]:
+        marker = f"__ADB_DONE_{uuid.uuid4().hex}__".encode()
+        # 子 shell 隔离 cd/exit，stdin 重定向避免命令读走后续输入
+        self.writer.write(f"( {command}\n) </dev/null 2>&1; echo \"{marker.decode()}$?\"\n".encode("utf-8"))
+        await self.writer.drain()
+
+        buffer = bytearray()
+        search_from = 0
+        while True:
+            index = buffer.find(marker, search_from)
+            if index >= 0:
+                end = buffer.find(b"\n", index)
+                if end >= 0:
+                    exit_code = int(buffer[index + len(marker):end] or 0)
+                    return buffer[:index].decode("utf-8", "replace"), exit_code
+            else:
+                search_from = max(0, len(buffer) - len(marker))
+            chunk = await self.reader.read(65536)
+            if not chunk:
+                raise AdbError("Shell session closed by device")
+            buffer += chunk
+
+    def close(self):
+        self.writer.close()
+
+
+class AdbClient:
+    """
+    共享的 ADB 客户端
+
+    每台设备最多保持 max_sessions 个 sh 会话，同一设备的命令可以并发执行；
+    命令超时后对应会话会被关闭（设备端进程随之结束），不会影响后续命令
+    """
+
+    def __init__(self, host: str = None, port: int = None, max_sessions: int = None,
+                 default_timeout: float = None):
+        self.host = host or Config.ADB_SERVER_HOST
+        self.port = port or Config.ADB_SERVER_PORT
+        self.max_sessions = max_sessions or Config.ADB_MAX_SESSIONS
+        self.default_timeout = default_timeout or Config.ADB_COMMAND_TIMEOUT
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        # 以下状态只在客户端事件循环中访问
+        self._idle: Dict[str, List[_ShellSession]] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    # ---------- 事件循环 ----------
+
+    def _submit(self, coro) -> Future:
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="adb-client", daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def _call(self, coro):
+        return await asyncio.wrap_future(self._submit(coro))
+
+    # ---------- 公共接口 ----------
+
+    def shell(self, serial: Optional[str], command: str, timeout: float = None) -> Tuple[str, int]:
+        """
+        在设备上执行 shell 命令
+
+        Args:
+            serial: 设备序列号，None 时由 adb 选择唯一连接的设备
+            command: shell 命令
+            timeout: 截止时间（秒），包括等待空闲会话的时间
+
+        Returns:
+            (输出, 退出码)，stderr 合并到输出中
+        """
+        return self._submit(self._shell(serial, command, timeout)).result()
+
+    async def ashell(self, serial: Optional[str], command: str, timeout: float = None) -> Tuple[str, int]:
+        """shell 的异步版本"""
+        return await self._call(self._shell(serial, command, timeout))
+
+    def exec_out(self, serial: Optional[str], command: str, timeout: float = None) -> bytes:
+        """执行命令并返回原始二进制输出（不经过常驻会话，等同于 adb exec-out）"""
+        return self._submit(self._exec_out(serial, command, timeout)).result()
+
+    async def aexec_out(self, serial: Optional[str], command: str, timeout: float = None) -> bytes:
+        """exec_out 的异步版本"""
+        return await self._call(self._exec_out(serial, command, timeout))
+
+    def devices(self) -> List[Tuple[str, str]]:
+        """返回 [(序列号, 状态)]，等同于 adb devices"""
+        return self._submit(self._devices()).result()
+
+    async def adevices(self) -> List[Tuple[str, str]]:
+        """devices 的异步版本"""
+        return await self._call(self._devices())
+
+    def close(self):
+        """关闭所有常驻会话"""
+        if self._loop is not None:
+            self._submit(self._close_sessions()).result()
+
+    # ---------- 事件循环内的实现 ----------
+
+    async def _open(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        try:
+            return await asyncio.open_connection(self.host, self.port)
+        except OSError:
+            pass
+        # adb 服务未启动时与 adb 命令行一样尝试拉起
+        try:
+            await asyncio.to_thread(
+                subprocess.run, ["adb", "start-server"], capture_output=True, timeout=10
+            )
+            return await asyncio.open_connection(self.host, self.port)
+        except (OSError, subprocess.SubprocessError) as e:
+            raise AdbConnectionError(f"Cannot connect to adb server at {self.host}:{self.port}: {e}")
+
+    async def _open_service(self, serial: Optional[str], service: str):
+        reader, writer = await self._open()
+        try:
+            await _send_request(reader, writer, f"host:transport:{serial}" if serial else "host:transport-any")
+            await _send_request(reader, writer, service)
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer
+
+    async def _shell(self, serial: Optional[str], command: str, timeout: Optional[float]) -> Tuple[str, int]:
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(self._shell_in_session(serial, command), timeout or self.default_timeout)
+        except asyncio.TimeoutError:
+            raise AdbTimeoutError(f"Command timed out on {serial or 'default device'}: {command}")
+        finally:
+            ADB_LATENCY.labels("shell").observe(time.perf_counter() - start)
+
+    async def _shell_in_session(self, serial: Optional[str], command: str) -> Tuple[str, int]:
+        key = serial or ""
+        semaphore = self._semaphores.setdefault(key, asyncio.Semaphore(self.max_sessions))
+        async with semaphore:
+            idle = self._idle.setdefault(key, [])
+            # 空闲会话可能已随设备断开失效，失败时换新会话重试一次
+            while True:
+                reused = bool(idle)
+                session = idle.pop() if reused else _ShellSession(*await self._open_service(serial, "exec:sh"))
+                try:
+                    result = await session.run(command)
+                except AdbError:
+                    session.close()
+                    if reused:
+                        continue
+                    raise
+                except BaseException:
+                    # 超时/取消时会话中可能仍有命令在执行，直接丢弃
+                    session.close()
+                    raise
+                idle.append(session)
+                return result
+
+    async def _exec_out(self, serial: Optional[str], command: str, timeout: Optional[float]) -> bytes:
+        async def run():
+            reader, writer = await self._open_service(serial, f"exec:{command}")
+            try:
+                return await reader.read()
+            finally:
+                writer.close()
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(run(), timeout or self.default_timeout)
+        except asyncio.TimeoutError:
+            raise AdbTimeoutError(f"Command timed out on {serial or 'default device'}: {command}")
+        finally:
+            ADB_LATENCY.labels("exec_out").observe(time.perf_counter() - start)
+
+    async def _devices(self) -> List[Tuple[str, str]]:
+        reader, writer = await self._open()
+        try:
+            await _send_request(reader, writer, "host:devices")
+            output = await _read_length_prefixed(reader)
+        finally:
+            writer.close()
+        devices = []
+        for line in output.splitlines():
+            parts = line.split("\t")
+            if len(parts) >= 2:
+                devices.append((parts[0], parts[1]))
+        return devices
+
+    async def _close_sessions(self):
+        for sessions in self._idle.values():
+            for session in sessions:
+                session.close()
+        self._idle.clear()
+
+
+_client: Optional[AdbClient] = None
+_client_lock = threading.Lock()
+
+
+def get_adb_client() -> AdbClient:
+    """进程内共享的 ADB 客户端"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = AdbClient()
+            logger.info(f"ADB client using server {_client.host}:{_client.port}")
+        return _client
@@ -1,17 +1,39 @@
+import hashlib
 import subprocess
 import os
 import re
-from typing import List, Dict, Optional
+import shlex
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
+from adb_client import AdbConnectionError, get_adb_client
+from apk_label import read_device_apk_label
+from config import Config
 from logger import logger
+from metrics import ADB_LATENCY
 
 
 class ADBAppManager:
     """管理通过 ADB 获取 Android 应用信息的类"""
     
-    TEMP_APK_FILE = 'temp_app.apk'
+    # 应用名称缓存：(设备, 包名, versionCode, APK 路径) -> (名称, 过期时间)
+    # 应用更新后 versionCode/路径变化，缓存自然失效；解析失败的结果只短暂缓存
+    _label_cache: Dict[Tuple[str, str, str, str], Tuple[Optional[str], Optional[float]]] = {}
+    _cache_lock = threading.Lock()
+    # 同一设备正在进行的枚举，并发请求直接等待其结果
+    _inflight: Dict[str, Future] = {}
+    FAILED_LABEL_TTL = 600
+    
+    @staticmethod
+    def _adb(serial: Optional[str] = None) -> List[str]:
+        return ['adb', '-s', serial] if serial else ['adb']
     
     @staticmethod
     def _run_adb_command(command: List[str], check: bool = True) -> subprocess.CompletedProcess:
+        start = time.perf_counter()
         try:
             return subprocess.run(
                 command,
@@ -27,19 +49,73 @@ class ADBAppManager:
         except FileNotFoundError:
             logger.error("错误: 未找到 adb 命令，请确保 Android SDK 已安装并在 PATH 中")
             raise
+        finally:
+            ADB_LATENCY.labels("cli").observe(time.perf_counter() - start)
     
     @staticmethod
-    def get_third_party_packages() -> List[str]:
+    def _shell(serial: Optional[str], command: str, check: bool = True) -> subprocess.CompletedProcess:
+        """
+        在设备上执行 shell 命令：优先使用常驻会话，adb 服务不可用时回退到 adb 命令行
+        """
         try:
-            result = ADBAppManager._run_adb_command(
-                ['adb', 'shell', 'pm', 'list', 'packages', '-3']
-            )
+            output, returncode = get_adb_client().shell(serial, command)
+        except AdbConnectionError as e:
+            logger.warning(f"ADB 客户端不可用，回退到命令行: {e}")
+            return ADBAppManager._run_adb_command(ADBAppManager._adb(serial) + ['shell', command], check=check)
+        
+        if check and returncode != 0:
+            logger.error(f"ADB 命令执行失败: {command}\n输出: {output}")
+            raise subprocess.CalledProcessError(returncode, command, output)
+        return subprocess.CompletedProcess(command, returncode, output, '')
+    
+    @staticmethod
+    def _list_devices() -> List[Tuple[str, str]]:
+        """返回 [(序列号, 状态)]，包括 offline/unauthorized 设备"""
+        try:
+            return get_adb_client().devices()
+        except AdbConnectionError as e:
+            logger.warning(f"ADB 客户端不可用，回退到命令行: {e}")
+        
+        result = ADBAppManager._run_adb_command(['adb', 'devices'], check=False)
+        if result.returncode != 0:
+            raise RuntimeError("ADB 命令执行失败")
+        
+        # 跳过第一行 "List of devices attached"
+        devices = []
+        for line in result.stdout.strip().split('\n')[1:]:
+            parts = line.split()
+            if len(parts) >= 2:
+                devices.append((parts[0], parts[1]))
+        return devices
+    
+    @staticmethod
+    def get_third_party_packages(serial: Optional[str] = None) -> List[str]:
+        return [pkg for pkg, _, _ in ADBAppManager._list_third_party_packages(serial)]
+    
+    @staticmethod
+    def _list_third_party_packages(serial: Optional[str] = None) -> List[Tuple[str, str, str]]:
+        """
+        一次 adb 调用列出第三方应用的包名、APK 路径和 versionCode
+
+        Returns:
+            [(包名, APK 路径, versionCode)]；Android 9 以下的设备不支持 --show-versioncode，
+            versionCode 为空（应用更新后 APK 路径同样会变化），需要时由 _get_version_code 单独查询
+        """
+        try:
+            result = ADBAppManager._shell(serial, 'pm list packages -3 -f --show-versioncode', check=False)
+            if result.returncode != 0 or 'package:' not in result.stdout:
+                # 旧版 pm 报 "Unknown option"（旧版 adb 的退出码恒为 0），去掉该参数重试
+                result = ADBAppManager._shell(serial, 'pm list packages -3 -f')
             
-            packages = [
-                line.replace('package:', '').strip()
-                for line in result.stdout.strip().split('\n')
-                if line.startswith('package:')
-            ]
+            # 格式：package:/data/app/~~xxx/com.foo-yyy/base.apk=com.foo versionCode:123
+            packages = []
+            for line in result.stdout.strip().split('\n'):
+                line = line.strip()
+                if not line.startswith('package:'):
+                    continue
+                entry, _, version_code = line[8:].partition(' versionCode:')
+                apk_path, _, package = entry.rpartition('=')
+                packages.append((package, apk_path, version_code.strip()))
             
             return packages
         
@@ -48,27 +124,90 @@ class ADBAppManager:
             return []
     
     @staticmethod
-    def _get_apk_path(package_name: str) -> Optional[str]:
-        result = ADBAppManager._run_adb_command(
-            ['adb', 'shell', 'pm', 'path', package_name],
-            check=False
-        )
+    def _get_apk_path(package_name: str, serial: Optional[str] = None) -> Optional[str]:
+        result = ADBAppManager._shell(serial, f'pm path {shlex.quote(package_name)}', check=False)
         
         if result.returncode != 0:
             logger.error(f"错误: 未找到包 {package_name}")
             return None
         
-        apk_path = result.stdout.strip()
+        # 拆分 APK 会返回多行，base.apk 在第一行
+        apk_path = result.stdout.strip().split('\n')[0].strip()
         if apk_path.startswith('package:'):
             apk_path = apk_path[8:]
         
         return apk_path
     
     @staticmethod
-    def _pull_apk(apk_path: str, local_path: str) -> bool:
+    def get_apk_fingerprint(package_name: str, serial: Optional[str] = None) -> Optional[Dict[str, str]]:
+        """
+        在设备上计算已安装 APK 的内容指纹，用于判断同一包名的 APK 是否与之前采集过的完全相同
+
+        Returns:
+            {"sha256": 内容哈希, "version_code": versionCode}；拆分 APK 的哈希由各文件（按文件名排序）的哈希合并得到，
+            应用未安装或设备不支持 sha256sum 时返回 None
+        """
+        try:
+            quoted = shlex.quote(package_name)
+            result = ADBAppManager._shell(serial, f'pm path {quoted}', check=False)
+            apk_paths = [line.strip()[8:] for line in result.stdout.split('\n') if line.strip().startswith('package:')]
+            if not apk_paths:
+                logger.warning(f"未找到包 {package_name} 的 APK")
+                return None
+
+            # 格式：<sha256>  /data/app/~~xxx/com.foo-yyy/base.apk
+            result = ADBAppManager._shell(serial, 'sha256sum ' + ' '.join(shlex.quote(p) for p in apk_paths))
+            digests = {}
+            for line in result.stdout.strip().split('\n'):
+                digest, _, path = line.strip().partition(' ')
+                if path:
+                    digests[os.path.basename(path.strip())] = digest
+            if len(digests) != len(apk_paths):
+                logger.warning(f"计算 {package_name} 的 APK 哈希失败: {result.stdout.strip()}")
+                return None
+            if len(digests) == 1:
+                sha256 = next(iter(digests.values()))
+            else:
+                # 安装目录名每次安装都会变化，只按文件名合并
+                combined = '\n'.join(f"{name}:{digests[name]}" for name in sorted(digests))
+                sha256 = hashlib.sha256(combined.encode()).hexdigest()
+
+            return {"sha256": sha256, "version_code": ADBAppManager._get_version_code(package_name, serial)}
+
+        except Exception as e:
+            logger.error(f"计算 {package_name} 的 APK 指纹失败: {e}")
+            return None
+
+    @staticmethod
+    def _get_version_code(package_name: str, serial: Optional[str] = None) -> str:
+        """查询单个应用的 versionCode，Android 9 以下从 dumpsys 中解析；查询失败时返回空字符串"""
+        quoted = shlex.quote(package_name)
+        result = ADBAppManager._shell(serial, f'pm list packages --show-versioncode {quoted}', check=False)
+        for line in result.stdout.split('\n'):
+            entry, _, code = line.strip().partition(' versionCode:')
+            if entry == f'package:{package_name}':
+                return code.strip()
+
+        # 格式：versionCode=123 minSdk=21 targetSdk=26
+        result = ADBAppManager._shell(serial, f'dumpsys package {quoted}', check=False)
+        match = re.search(r'versionCode=(\d+)', result.stdout)
+        return match.group(1) if match else ''
+
+    @staticmethod
+    def force_stop_app(package_name: str, serial: Optional[str] = None) -> bool:
+        """强制停止应用，任务取消后使设备回到空闲状态"""
+        try:
+            result = ADBAppManager._shell(serial, f'am force-stop {shlex.quote(package_name)}', check=False)
+            return result.returncode == 0
+        except Exception as e:
+            logger.error(f"停止应用 {package_name} 失败: {e}")
+            return False
+
+    @staticmethod
+    def _pull_apk(apk_path: str, local_path: str, serial: Optional[str] = None) -> bool:
         try:
             ADBAppManager._run_adb_command(
-                ['adb', 'pull', apk_path, local_path],
+                ADBAppManager._adb(serial) + ['pull', apk_path, local_path],
                 check=False
             )
             return os.path.exists(local_path)
@@ -109,97 +248,152 @@ class ADBAppManager:
             return None
     
     @staticmethod
-    def get_app_name(package_name: str, verbose: bool = False) -> Optional[str]:
+    def get_app_name(package_name: str, verbose: bool = False, serial: Optional[str] = None,
+                     apk_path: Optional[str] = None) -> Optional[str]:
+        # 每次调用使用独立的临时目录，支持并发解析
+        tmp_dir = tempfile.mkdtemp(prefix='apk_label_')
+        local_apk = os.path.join(tmp_dir, 'base.apk')
         try:
             if verbose:
                 logger.info(f"正在查找包 {package_name} 的路径...")
             
             # 1. 获取 APK 路径
-            apk_path = ADBAppManager._get_apk_path(package_name)
+            apk_path = apk_path or ADBAppManager._get_apk_path(package_name, serial)
             if not apk_path:
                 return None
             
             if verbose:
                 logger.info(f"找到 APK 路径: {apk_path}")
+            
+            # 2. 只读取清单和资源表解析名称，无需传输整个 APK
+            app_name = read_device_apk_label(apk_path, serial)
+            if app_name:
+                if verbose:
+                    logger.info(f"\n应用名称: {app_name}")
+                return app_name
+            
+            if verbose:
                 logger.info("正在拉取 APK 到本地...")
             
-            # 2. 拉取 APK 到本地
-            if not ADBAppManager._pull_apk(apk_path, ADBAppManager.TEMP_APK_FILE):
-                logger.error("错误: APK 拉取失败")
+            # 3. 回退：拉取 APK 到本地
+            if not ADBAppManager._pull_apk(apk_path, local_apk, serial):
+                logger.error(f"错误: APK 拉取失败 {package_name}")
                 return None
             
             if verbose:
                 logger.info("正在解析 APK...")
             
-            # 3. 解析 APK 获取应用名称
-            app_name = ADBAppManager._extract_app_name_from_apk(ADBAppManager.TEMP_APK_FILE)
-            
-            # 4. 清理临时文件
-            if os.path.exists(ADBAppManager.TEMP_APK_FILE):
-                os.remove(ADBAppManager.TEMP_APK_FILE)
-                if verbose:
-                    logger.info("临时文件已清理")
+            # 4. 解析 APK 获取应用名称
+            app_name = ADBAppManager._extract_app_name_from_apk(local_apk)
             
             if app_name and verbose:
                 logger.info(f"\n应用名称: {app_name}")
             elif not app_name:
-                logger.error("错误: 未能提取应用名称")
+                logger.error(f"错误: 未能提取应用名称 {package_name}")
             
             return app_name
             
         except Exception as e:
             logger.error(f"获取应用名称时发生错误: {e}")
-            # 确保清理临时文件
-            if os.path.exists(ADBAppManager.TEMP_APK_FILE):
-                os.remove(ADBAppManager.TEMP_APK_FILE)
             return None
+        finally:
+            # 5. 清理临时文件
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    
+    @staticmethod
+    def get_all_third_party_apps(verbose: bool = False, serial: Optional[str] = None) -> List[Dict[str, str]]:
+        """
+        获取第三方应用的包名和名称；名称按 (设备, 包名, versionCode, APK 路径) 缓存，
+        未命中的应用并行解析，同一设备的并发请求共享同一次枚举结果
+        """
+        slot = serial or 'default'
+        with ADBAppManager._cache_lock:
+            future = ADBAppManager._inflight.get(slot)
+            owner = future is None
+            if owner:
+                future = Future()
+                ADBAppManager._inflight[slot] = future
+        
+        if not owner:
+            if verbose:
+                logger.info(f"设备 {slot} 的应用列表正在获取中，等待结果")
+            return future.result()
+        
+        try:
+            apps = ADBAppManager._enumerate_apps(slot, serial, verbose)
+            future.set_result(apps)
+            return apps
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with ADBAppManager._cache_lock:
+                ADBAppManager._inflight.pop(slot, None)
     
     @staticmethod
-    def get_all_third_party_apps(verbose: bool = False) -> List[Dict[str, str]]:
-        packages = ADBAppManager.get_third_party_packages()
+    def _enumerate_apps(slot: str, serial: Optional[str], verbose: bool) -> List[Dict[str, str]]:
+        packages = ADBAppManager._list_third_party_packages(serial)
         
         if not packages:
             logger.warning("未找到第三方应用")
             return []
         
+        now = time.time()
+        labels = {}
+        misses = []
+        with ADBAppManager._cache_lock:
+            for package, apk_path, version_code in packages:
+                cached = ADBAppManager._label_cache.get((slot, package, version_code, apk_path))
+                if cached and (cached[1] is None or cached[1] > now):
+                    labels[package] = cached[0]
+                else:
+                    misses.append((package, apk_path, version_code))
+        
         if verbose:
-            logger.info(f"\n找到 {len(packages)} 个第三方应用，开始获取应用名称...\n")
+            logger.info(f"\n找到 {len(packages)} 个第三方应用，缓存命中 {len(labels)} 个，开始获取其余应用名称...\n")
         
-        apps = []
-        for i, package in enumerate(packages, 1):
-            if verbose:
-                logger.info(f"[{i}/{len(packages)}] 处理: {package}")
-            
-            app_name = ADBAppManager.get_app_name(package, verbose=False)
+        if misses:
+            def resolve(item):
+                package, apk_path, version_code = item
+                app_name = ADBAppManager.get_app_name(package, serial=serial, apk_path=apk_path)
+                expires_at = None if app_name else time.time() + ADBAppManager.FAILED_LABEL_TTL
+                with ADBAppManager._cache_lock:
+                    ADBAppManager._label_cache[(slot, package, version_code, apk_path)] = (app_name, expires_at)
+                if verbose:
+                    logger.info(f"  {package} -> {app_name if app_name else '未知'}")
+                return package, app_name
             
-            apps.append({
+            with ThreadPoolExecutor(max_workers=Config.APP_LABEL_WORKERS, thread_name_prefix='apk-label') as pool:
+                for package, app_name in pool.map(resolve, misses):
+                    labels[package] = app_name
+        
+        return [
+            {
                 'package_name': package,
-                'app_name': app_name if app_name else '未知'
-            })
-            
-            if verbose:
-                logger.info(f"  -> {app_name if app_name else '未知'}\n")
+                'app_name': labels.get(package) or '未知'
+            }
+            for package, _, _ in packages
+        ]
+    
+    @staticmethod
+    def get_connected_devices() -> List[str]:
+        """返回处于 device 状态的设备序列号列表"""
+        try:
+            # 忽略 offline/unauthorized 设备
+            return [serial for serial, state in ADBAppManager._list_devices() if state == 'device']
         
-        return apps
+        except FileNotFoundError:
+            logger.error("错误: 未找到 adb 命令,请确保 Android SDK 已安装并在 PATH 中")
+            return []
+        except Exception as e:
+            logger.error(f"获取设备列表时发生错误: {e}")
+            return []
     
     @staticmethod
     def connect_device():
         try:
-            result = ADBAppManager._run_adb_command(
-                ['adb', 'devices'],
-                check=False
-            )
-            
-            if result.returncode != 0:
-                logger.error("ADB 命令执行失败")
-                return False
-            
-            # 解析输出,查找连接的设备
-            lines = result.stdout.strip().split('\n')
-            logger.info(f"adb devices 输出:\n{result.stdout}")
-            
-            # 跳过第一行 "List of devices attached"
-            devices = [line for line in lines[1:] if line.strip()]
+            devices = ADBAppManager._list_devices()
+            logger.info("adb devices 输出:\n" + "\n".join(f"{serial}\t{state}" for serial, state in devices))
             
             if devices:
                 logger.info(f"检测到 {len(devices)} 个设备已连接")
@@ -0,0 +1,386 @@
+"""
+不拉取完整 APK 的应用名称解析
+
+APK 是 ZIP 文件：先读取文件末尾定位中央目录，再只读取 AndroidManifest.xml 和
+resources.arsc 两个条目，解析 <application android:label> 并在资源表中查找对应字符串。
+读取方式可替换：设备上的 APK 通过 adb exec-out dd 按块读取，本地文件直接读取。
+"""
+
+import shlex
+import struct
+import subprocess
+import zlib
+from typing import Dict, List, Optional, Tuple, Union
+from adb_client import AdbConnectionError, get_adb_client
+from logger import logger
+
+
+# ZIP 结构签名
+EOCD_SIGNATURE = 0x06054b50
+CENTRAL_DIR_SIGNATURE = 0x02014b50
+LOCAL_HEADER_SIGNATURE = 0x04034b50
+EOCD_SEARCH_SIZE = 0xFFFF + 22  # EOCD 之后最多跟 64KB 注释
+EOCD_FIRST_READ = 4096  # APK 通常没有注释，先读少量末尾数据
+
+# Android 资源二进制格式的 chunk 类型
+RES_STRING_POOL_TYPE = 0x0001
+RES_TABLE_TYPE = 0x0002
+RES_XML_TYPE = 0x0003
+RES_XML_START_ELEMENT_TYPE = 0x0102
+RES_XML_RESOURCE_MAP_TYPE = 0x0180
+RES_TABLE_PACKAGE_TYPE = 0x0200
+RES_TABLE_TYPE_TYPE = 0x0201
+
+UTF8_FLAG = 0x100
+TYPE_REFERENCE = 0x01
+TYPE_STRING = 0x03
+NO_ENTRY = 0xFFFFFFFF
+ENTRY_FLAG_COMPLEX = 0x0001
+ENTRY_FLAG_COMPACT = 0x0008
+TYPE_FLAG_SPARSE = 0x01
+TYPE_FLAG_OFFSET16 = 0x02
+
+ANDROID_LABEL_ATTR = 0x01010001
+
+# 与 aapt 解析时的优先级一致：zh-CN > zh > 默认 > 其他语言
+LOCALE_PREFERENCE = [("zh", "CN"), ("zh", ""), ("", "")]
+
+
+class ApkFormatError(ValueError):
+    """APK 结构无法解析"""
+
+
+class LocalFileReader:
+    """按偏移读取本地文件"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.bytes_read = 0
+        with open(path, "rb") as f:
+            f.seek(0, 2)
+            self.size = f.tell()
+
+    def read(self, offset: int, length: int) -> bytes:
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            data = f.read(length)
+        self.bytes_read += len(data)
+        return data
+
+
+class AdbFileReader:
+    """通过 adb exec-out dd 按块读取设备上的文件，只传输需要的字节"""
+
+    BLOCK_SIZE = 4096
+
+    def __init__(self, device_path: str, serial: Optional[str] = None, timeout: float = 30):
+        self.device_path = device_path
+        self.serial = serial
+        self.timeout = timeout
+        self.bytes_read = 0
+        output = self._exec(["stat", "-c", "%s", device_path]).strip()
+        if not output.isdigit():
+            raise ApkFormatError(f"Cannot stat {device_path}: {output[:100]!r}")
+        self.size = int(output)
+
+    def _exec(self, args: List[str]) -> bytes:
+        command = " ".join(shlex.quote(arg) for arg in args)
+        try:
+            return get_adb_client().exec_out(self.serial, f"{command} 2>/dev/null", timeout=self.timeout)
+        except AdbConnectionError:
+            pass
+        # adb 服务不可用时回退到 adb 命令行
+        adb = ["adb", "-s", self.serial] if self.serial else ["adb"]
+        result = subprocess.run(adb + ["exec-out"] + args, capture_output=True, timeout=self.timeout)
+        if result.returncode != 0:
+            raise ApkFormatError(f"adb exec-out failed: {result.stderr.decode('utf-8', 'ignore').strip()}")
+        return result.stdout
+
+    def read(self, offset: int, length: int) -> bytes:
+        length = max(0, min(length, self.size - offset))
+        if length == 0:
+            return b""
+        first_block = offset // self.BLOCK_SIZE
+        last_block = (offset + length - 1) // self.BLOCK_SIZE
+        data = self._exec([
+            "dd", f"if={self.device_path}", f"bs={self.BLOCK_SIZE}",
+            f"skip={first_block}", f"count={last_block - first_block + 1}",
+        ])
+        self.bytes_read += len(data)
+        start = offset - first_block * self.BLOCK_SIZE
+        chunk = data[start:start + length]
+        if len(chunk) != length:
+            raise ApkFormatError(f"Short read at {offset}: {len(chunk)}/{length} bytes")
+        return chunk
+
+
+class RemoteZip:
+    """只读取所需条目的 ZIP 读取器"""
+
+    def __init__(self, reader):
+        self.reader = reader
+        self.entries: Dict[str, Tuple[int, int, int, int]] = {}  # name -> (method, csize, usize, offset)
+        self._read_central_directory()
+
+    def _read_central_directory(self):
+        size = self.reader.size
+        for search_size in (EOCD_FIRST_READ, EOCD_SEARCH_SIZE):
+            tail_offset = max(0, size - search_size)
+            tail = self.reader.read(tail_offset, size - tail_offset)
+            eocd = tail.rfind(struct.pack("<I", EOCD_SIGNATURE))
+            if eocd >= 0 and len(tail) - eocd >= 22:
+                break
+            if tail_offset == 0:
+                break
+        else:
+            eocd = -1
+        if eocd < 0 or len(tail) - eocd < 22:
+            raise ApkFormatError("End of central directory not found")
+        cd_size, cd_offset = struct.unpack_from("<II", tail, eocd + 12)
+        if cd_offset == 0xFFFFFFFF:
+            raise ApkFormatError("ZIP64 archives are not supported")
+
+        # 中央目录通常紧挨在 EOCD 之前，多数情况下已包含在末尾数据中
+        if cd_offset >= tail_offset:
+            central = tail[cd_offset - tail_offset:cd_offset - tail_offset + cd_size]
+        else:
+            central = self.reader.read(cd_offset, cd_size)
+
+        pos = 0
+        while pos + 46 <= len(central):
+            (signature, _, _, _, method, _, _, _, csize, usize,
+             name_len, extra_len, comment_len, _, _, _, local_offset) = struct.unpack_from(
+                "<IHHHHHHIIIHHHHHII", central, pos)
+            if signature != CENTRAL_DIR_SIGNATURE:
+                raise ApkFormatError("Corrupt central directory")
+            name = central[pos + 46:pos + 46 + name_len].decode("utf-8", "replace")
+            self.entries[name] = (method, csize, usize, local_offset)
+            pos += 46 + name_len + extra_len + comment_len
+
+    def read(self, name: str, slack: int = 1024) -> bytes:
+        if name not in self.entries:
+            raise KeyError(name)
+        method, csize, usize, offset = self.entries[name]
+        # 本地头的扩展字段长度可能与中央目录不同，多读一些避免二次请求
+        data = self.reader.read(offset, 30 + len(name.encode("utf-8")) + slack + csize)
+        signature, _, _, _, _, _, _, _, _, name_len, extra_len = struct.unpack_from("<IHHHHHIIIHH", data)
+        if signature != LOCAL_HEADER_SIGNATURE:
+            raise ApkFormatError(f"Corrupt local header for {name}")
+        start = 30 + name_len + extra_len
+        if start + csize > len(data):
+            data += self.reader.read(offset + len(data), start + csize - len(data))
+        raw = data[start:start + csize]
+
+        if method == 0:
+            return raw
+        if method == 8:
+            return zlib.decompressobj(-15).decompress(raw, usize)
+        raise ApkFormatError(f"Unsupported compression method {method} for {name}")
+
+
+def _parse_string_pool(data: bytes, offset: int) -> List[str]:
+    _, header_size, _, count, _, flags, strings_start, _ = struct.unpack_from("<HHIIIIII", data, offset)
+    is_utf8 = bool(flags & UTF8_FLAG)
+    offsets = struct.unpack_from(f"<{count}I", data, offset + header_size)
+    base = offset + strings_start
+    strings = []
+    for string_offset in offsets:
+        pos = base + string_offset
+        if is_utf8:
+            # 依次为 UTF-16 长度和 UTF-8 字节长度，各占 1 或 2 字节
+            pos += 2 if data[pos] & 0x80 else 1
+            length = data[pos]
+            if length & 0x80:
+                length = ((length & 0x7F) << 8) | data[pos + 1]
+                pos += 2
+            else:
+                pos += 1
+            strings.append(data[pos:pos + length].decode("utf-8", "replace"))
+        else:
+            length = struct.unpack_from("<H", data, pos)[0]
+            if length & 0x8000:
+                length = ((length & 0x7FFF) << 16) | struct.unpack_from("<H", data, pos + 2)[0]
+                pos += 4
+            else:
+                pos += 2
+            strings.append(data[pos:pos + length * 2].decode("utf-16-le", "replace"))
+    return strings
+
+
+def parse_manifest_label(data: bytes) -> Union[str, int, None]:
+    """
+    解析二进制 AndroidManifest.xml，返回 <application> 的 android:label 属性
+
+    Returns:
+        直接写在清单中的字符串，或字符串资源 ID（int）；未声明 label 时返回 None
+    """
+    chunk_type, header_size, total_size = struct.unpack_from("<HHI", data, 0)
+    if chunk_type != RES_XML_TYPE:
+        raise ApkFormatError("AndroidManifest.xml is not binary XML")
+
+    strings: List[str] = []
+    resource_ids: List[int] = []
+    pos = header_size
+    while pos + 8 <= min(total_size, len(data)):
+        chunk_type, header_size, size = struct.unpack_from("<HHI", data, pos)
+        if size < 8:
+            raise ApkFormatError("Corrupt XML chunk")
+        if chunk_type == RES_STRING_POOL_TYPE:
+            strings = _parse_string_pool(data, pos)
+        elif chunk_type == RES_XML_RESOURCE_MAP_TYPE:
+            resource_ids = list(struct.unpack_from(f"<{(size - header_size) // 4}I", data, pos + header_size))
+        elif chunk_type == RES_XML_START_ELEMENT_TYPE:
+            ext = pos + header_size
+            _, name, attr_start, attr_size, attr_count = struct.unpack_from("<IIHHH", data, ext)
+            if strings[name] == "application":
+                for i in range(attr_count):
+                    attr = ext + attr_start + i * attr_size
+                    _, attr_name, raw_value, _, _, data_type, value = struct.unpack_from("<IIIHBBI", data, attr)
+                    is_label = (
+                        attr_name < len(resource_ids) and resource_ids[attr_name] == ANDROID_LABEL_ATTR
+                    ) or strings[attr_name] == "label"
+                    if not is_label:
+                        continue
+                    if data_type == TYPE_STRING:
+                        return strings[value]
+                    if raw_value != NO_ENTRY:
+                        return strings[raw_value]
+                    if data_type == TYPE_REFERENCE:
+                        return value
+                    return None
+                return None
+        pos += size
+    return None
+
+
+class ResourceTable:
+    """resources.arsc 中字符串资源的查找"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.strings: List[str] = []
+        # (包 ID, 类型 ID) -> [(语言, 地区, 条目偏移表位置, 条目数, 条目起始位置, flags)]
+        self.types: Dict[Tuple[int, int], List[tuple]] = {}
+        self._parse()
+
+    def _parse(self):
+        data = self.data
+        chunk_type, header_size, total_size, _ = struct.unpack_from("<HHII", data, 0)
+        if chunk_type != RES_TABLE_TYPE:
+            raise ApkFormatError("resources.arsc has an unexpected header")
+        pos = header_size
+        while pos + 8 <= min(total_size, len(data)):
+            chunk_type, header_size, size = struct.unpack_from("<HHI", data, pos)
+            if size < 8:
+                raise ApkFormatError("Corrupt resource table chunk")
+            if chunk_type == RES_STRING_POOL_TYPE:
+                self.strings = _parse_string_pool(data, pos)
+            elif chunk_type == RES_TABLE_PACKAGE_TYPE:
+                self._parse_package(pos, header_size, size)
+            pos += size
+
+    def _parse_package(self, start: int, header_size: int, size: int):
+        data = self.data
+        package_id = struct.unpack_from("<I", data, start + 8)[0]
+        pos = start + header_size
+        while pos + 8 <= start + size:
+            chunk_type, chunk_header_size, chunk_size = struct.unpack_from("<HHI", data, pos)
+            if chunk_size < 8:
+                raise ApkFormatError("Corrupt package chunk")
+            if chunk_type == RES_TABLE_TYPE_TYPE:
+                type_id, flags, _, entry_count, entries_start = struct.unpack_from("<BBHII", data, pos + 8)
+                config = pos + 20
+                language = data[config + 8:config + 10].rstrip(b"\0").decode("ascii", "ignore")
+                country = data[config + 10:config + 12].rstrip(b"\0").decode("ascii", "ignore")
+                self.types.setdefault((package_id, type_id), []).append(
+                    (language, country, pos + chunk_header_size, entry_count, pos + entries_start, flags)
+                )
+            pos += chunk_size
+
+    def _entry_value(self, table: tuple, entry_id: int) -> Optional[Tuple[int, int]]:
+        _, _, offsets_pos, entry_count, entries_start, flags = table
+        data = self.data
+        if flags & TYPE_FLAG_SPARSE:
+            # 稀疏表：(条目 ID, 偏移/4) 成对存储，按 ID 升序
+            for i in range(entry_count):
+                idx, offset = struct.unpack_from("<HH", data, offsets_pos + i * 4)
+                if idx == entry_id:
+                    entry_offset = offset * 4
+                    break
+            else:
+                return None
+        elif flags & TYPE_FLAG_OFFSET16:
+            if entry_id >= entry_count:
+                return None
+            offset = struct.unpack_from("<H", data, offsets_pos + entry_id * 2)[0]
+            if offset == 0xFFFF:
+                return None
+            entry_offset = offset * 4
+        else:
+            if entry_id >= entry_count:
+                return None
+            entry_offset = struct.unpack_from("<I", data, offsets_pos + entry_id * 4)[0]
+            if entry_offset == NO_ENTRY:
+                return None
+
+        entry = entries_start + entry_offset
+        entry_size, entry_flags = struct.unpack_from("<HH", data, entry)
+        if entry_flags & ENTRY_FLAG_COMPACT:
+            # 紧凑条目：高 8 位为数据类型，数据紧随其后
+            return entry_flags >> 8, struct.unpack_from("<I", data, entry + 4)[0]
+        if entry_flags & ENTRY_FLAG_COMPLEX:
+            return None
+        _, _, data_type, value = struct.unpack_from("<HBBI", data, entry + entry_size)
+        return data_type, value
+
+    def resolve_string(self, resource_id: int, depth: int = 0) -> Optional[str]:
+        """按语言优先级解析字符串资源，支持资源间的引用"""
+        package_id = resource_id >> 24
+        type_id = (resource_id >> 16) & 0xFF
+        entry_id = resource_id & 0xFFFF
+        tables = self.types.get((package_id, type_id), [])
+
+        def priority(table):
+            locale = (table[0], table[1])
+            return LOCALE_PREFERENCE.index(locale) if locale in LOCALE_PREFERENCE else len(LOCALE_PREFERENCE)
+
+        for table in sorted(tables, key=priority):
+            value = self._entry_value(table, entry_id)
+            if value is None:
+                continue
+            data_type, data = value
+            if data_type == TYPE_STRING and data < len(self.strings):
+                return self.strings[data]
+            if data_type == TYPE_REFERENCE and depth < 5:
+                return self.resolve_string(data, depth + 1)
+        return None
+
+
+def read_apk_label(reader) -> Optional[str]:
+    """
+    从 APK 中解析应用名称，只读取 ZIP 目录、AndroidManifest.xml 和 resources.arsc
+
+    Args:
+        reader: 提供 size 属性和 read(offset, length) 方法的读取器
+    """
+    apk = RemoteZip(reader)
+    label = parse_manifest_label(apk.read("AndroidManifest.xml"))
+    if not isinstance(label, int):
+        return label
+    if "resources.arsc" not in apk.entries:
+        return None
+    return ResourceTable(apk.read("resources.arsc")).resolve_string(label)
+
+
+def read_device_apk_label(apk_path: str, serial: Optional[str] = None) -> Optional[str]:
+    """
+    按需读取设备上的 APK 并解析应用名称，失败时返回 None（由调用方回退到完整拉取）
+    """
+    try:
+        reader = AdbFileReader(apk_path, serial)
+        label = read_apk_label(reader)
+        logger.debug(f"从 {apk_path} 读取 {reader.bytes_read} 字节解析应用名称: {label}")
+        return label
+    except Exception as e:
+        logger.warning(f"按需读取 APK 失败，将回退到完整拉取: {apk_path}: {e}")
+        return None
@@ -1,10 +1,18 @@
 import datetime
-from fastapi import FastAPI, HTTPException
-from models.task_models import TaskRequest, TaskStatusResponse, RunTaskRequest, MultipleTaskRequest, MultipleRunTaskRequest
+import json
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from models.task_models import TaskRequest, TaskStatusResponse, RunTaskRequest, MultipleTaskRequest, MultipleRunTaskRequest, BulkStatusRequest, CancelTasksRequest
 from task_manager import TaskManager
+from device_scheduler import QueueFullError
 from logger import logger
 from config import Config
 from adb_service import ADBAppManager
+from fake_engine import fake_devices
+from metrics import TASK_QUEUE_DEPTH, STAGE_QUEUE_DEPTH
 from fastapi.middleware.cors import CORSMiddleware
 
 app = FastAPI()
@@ -19,6 +27,12 @@ app.add_middleware(
 
 try:
     task_manager = TaskManager(redis_url=Config.get_redis_url(), task_ttl=Config.TASK_TTL)
+    if Config.EMBEDDED_WORKER:
+        # API 进程同时作为 worker 消费任务队列；也可单独运行 worker_main.py 扩展消费能力
+        task_manager.scheduler.refresh_devices(
+            fake_devices() if Config.FAKE_ENGINE else ADBAppManager.get_connected_devices()
+        )
+        task_manager.start_stage_workers()
 except Exception as e:
     logger.error(f"Failed to initialize TaskManager: {str(e)}")
     raise
@@ -28,13 +42,13 @@ except Exception as e:
 ##################################################
 
 @app.get("/api/apps")
-async def get_third_party_apps():
+async def get_third_party_apps(serial: Optional[str] = None):
     """
-    通过 ADB 获取手机上所有第三方下载的的包名和应用名
+    通过 ADB 获取手机上所有第三方下载的的包名和应用名，可通过 serial 指定设备
     """
     try:
-        logger.info("Getting all third party apps from device via ADB")
-        apps = ADBAppManager.get_all_third_party_apps(verbose=True)
+        logger.info(f"Getting all third party apps from device {serial or 'default'} via ADB")
+        apps = await run_in_threadpool(ADBAppManager.get_all_third_party_apps, True, serial)
         return {
             "total": len(apps),
             "apps": apps
@@ -51,6 +65,9 @@ async def connect_device():
     try:
         logger.info("Connecting to device via ADB")
         result = ADBAppManager.connect_device()
+        # 设备插拔后同步调度器的设备列表
+        if Config.EMBEDDED_WORKER and not Config.FAKE_ENGINE:
+            task_manager.scheduler.refresh_devices(ADBAppManager.get_connected_devices())
         return result
     except Exception as e:
         logger.error(f"Error connecting to device: {str(e)}")
@@ -92,52 +109,38 @@ async def run_multiple_task(req: MultipleRunTaskRequest):
     """
     前端提交多个任务：通过包名、应用名和时间戳提交多个任务
     后端会查找是否已有相同包名的任务，如果有则返回现有任务ID，否则创建新任务
-    处理过程是串行的
+    任务的 force 为 true 时总是创建新任务，并且不复用相同 APK 之前的采集结果
+    整批任务的查重和入队通过 pipeline 完成，Redis 往返次数与任务数量无关
     """
     try:
         logger.info(f"Received run_multiple_task request - Total tasks: {len(req.tasks)}")
-        
+
+        submitted = await task_manager.asubmit_tasks(
+            [(task_req.pkg, task_req.app, task_req.timestamp, task_req.force) for task_req in req.tasks]
+        )
+
         results = []
-        
-        # 串行处理每个任务
-        for idx, task_req in enumerate(req.tasks, 1):
-            try:
-                logger.info(f"Processing task {idx}/{len(req.tasks)} - Package: {task_req.pkg}, App: {task_req.app}, Timestamp: {task_req.timestamp}")
-                
-                # 查找是否已有该包名的任务
-                existing_task_id = task_manager.find_task_by_package(task_req.pkg)
-                
-                if existing_task_id:
-                    logger.info(f"Found existing task for package {task_req.pkg}: {existing_task_id}")
-                    task_id = existing_task_id
-                    is_new = False
-                else:
-                    # 创建新任务
-                    task_id = task_manager.submit_task(task_req.pkg, task_req.app, task_req.timestamp)
-                    logger.info(f"Created new task - ID: {task_id}")
-                    is_new = True
-                
+        for task_req, item in zip(req.tasks, submitted):
+            if item["error"] is None:
                 results.append({
                     "pkg": task_req.pkg,
                     "app": task_req.app,
                     "timestamp": task_req.timestamp,
                     "success": True,
-                    "task_id": task_id,
-                    "is_new": is_new,
+                    "task_id": item["task_id"],
+                    "is_new": item["is_new"],
                     "message": "Task submitted successfully"
                 })
-                
-            except Exception as e:
-                logger.error(f"Error in run_multiple_task task {idx}/{len(req.tasks)} - Package: {task_req.pkg}, App: {task_req.app}, Error: {str(e)}")
+            else:
                 results.append({
                     "pkg": task_req.pkg,
                     "app": task_req.app,
                     "timestamp": task_req.timestamp,
                     "success": False,
                     "task_id": None,
-                    "message": f"Task submission failed: {str(e)}"
+                    "message": f"Task submission failed: {item['error']}"
                 })
-        
+
         successful_count = len([r for r in results if r["success"]])
         logger.info(f"Multiple tasks processing completed - Total: {len(req.tasks)}, Successful: {successful_count}")
         
@@ -162,14 +165,14 @@ async def check_task_completion(pkg: str):
         logger.info(f"Checking task completion for package: {pkg}")
         
         # 通过包名查找任务
-        task_id = task_manager.find_task_by_package(pkg)
+        task_id = await task_manager.afind_task_by_package(pkg)
         
         if not task_id:
             logger.info(f"No task found for package: {pkg}")
             return False
         
         # 获取任务状态
-        task_status = task_manager.get_status(task_id)
+        task_status = await task_manager.aget_status(task_id)
         status = task_status.get("status", "unknown")
         
         # 判断是否完成
@@ -195,11 +198,13 @@ async def run_single_app(req: TaskRequest):
     try:
         logger.info(f"Received task request - Package: {req.pkg}, App: {req.app}")
         
-        task_id = task_manager.submit_task(req.pkg, req.app)
+        task_id = await task_manager.asubmit_task(req.pkg, req.app, force=req.force)
         
         logger.info(f"Task submitted successfully - ID: {task_id}")
         return {"task_id": task_id}
         
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error submitting task - Package: {req.pkg}, App: {req.app}, Error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Task submission failed: {str(e)}")
@@ -264,7 +269,7 @@ async def get_status(task_id: str):
     try:
         logger.debug(f"Querying status for task: {task_id}")
         
-        status = task_manager.get_status(task_id)
+        status = await task_manager.aget_status(task_id)
         
         if status.get("status") == "not_found":
             raise HTTPException(status_code=404, detail=f"Task not found: {task_id}")
@@ -278,11 +283,144 @@ async def get_status(task_id: str):
         logger.error(f"Error querying task status - ID: {task_id}, Error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error retrieving task status: {str(e)}")
 
+@app.post("/api/tasks/status", response_model=dict)
+async def get_bulk_status(req: BulkStatusRequest):
+    """
+    批量查询任务状态：可同时按任务ID和包名查询，整批只需一次 HTTP 请求
+    """
+    if not req.task_ids and not req.pkgs:
+        raise HTTPException(status_code=400, detail="task_ids or pkgs is required")
+    if len(req.task_ids) + len(req.pkgs) > Config.TASK_QUEUE_MAXSIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many tasks in one request (max {Config.TASK_QUEUE_MAXSIZE})"
+        )
+    try:
+        return await task_manager.aget_statuses(req.task_ids, req.pkgs)
+    except Exception as e:
+        logger.error(f"Error querying bulk task status - Error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error retrieving task status: {str(e)}")
+
+@app.post("/api/task/{task_id}/cancel", response_model=dict)
+async def cancel_task(task_id: str):
+    """
+    取消任务：排队中的任务立即取消；执行中的任务终止引擎进程树、停止应用并释放设备，
+    状态变为 cancelled（返回 cancelling 时稍后完成，可通过状态接口或进度推送确认）
+    """
+    try:
+        result = (await task_manager.acancel_tasks([task_id]))[task_id]
+    except Exception as e:
+        logger.error(f"Error cancelling task - ID: {task_id}, Error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error cancelling task: {str(e)}")
+    if result == "not_found":
+        raise HTTPException(status_code=404, detail=f"Task not found: {task_id}")
+    if result == "finished":
+        raise HTTPException(status_code=409, detail=f"Task already finished: {task_id}")
+    return {"task_id": task_id, "status": result}
+
+@app.post("/api/tasks/cancel", response_model=dict)
+async def cancel_tasks(req: CancelTasksRequest):
+    """
+    批量取消任务（例如撤回误提交的一整批任务），整批只需一次 Redis 往返；
+    各任务的结果为 cancelled / cancelling / finished / not_found
+    """
+    if len(req.task_ids) > Config.TASK_QUEUE_MAXSIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many tasks in one request (max {Config.TASK_QUEUE_MAXSIZE})"
+        )
+    try:
+        return {"tasks": await task_manager.acancel_tasks(req.task_ids)}
+    except Exception as e:
+        logger.error(f"Error cancelling tasks - Error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error cancelling tasks: {str(e)}")
+
+def _format_sse(event, data):
+    if event == "ping":
+        return ": ping\n\n"
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.get("/api/task/{task_id}/events")
+async def stream_task_events(task_id: str):
+    """
+    通过 Server-Sent Events 推送任务进度，替代轮询 /status：
+    连接后先推送一次完整状态（status 事件），之后推送阶段切换和进度等字段变更（update 事件），
+    任务结束（stage 为 done）后服务端关闭连接
+    """
+    events = task_manager.astream_events(task_id)
+    try:
+        first = await events.__anext__()
+    except Exception as e:
+        await events.aclose()
+        logger.error(f"Error subscribing task events - ID: {task_id}, Error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error subscribing task events: {str(e)}")
+
+    if first[1].get("status") == "not_found":
+        await events.aclose()
+        raise HTTPException(status_code=404, detail=f"Task not found: {task_id}")
+
+    async def event_source():
+        try:
+            yield _format_sse(*first)
+            async for event, data in events:
+                yield _format_sse(event, data)
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/task/{task_id}/log")
+async def get_task_log(
+    task_id: str,
+    offset: Optional[int] = Query(None, ge=0),
+    length: int = Query(64 * 1024, ge=1024, le=Config.TASK_LOG_MAX_RANGE),
+    tail: int = Query(100, ge=0, le=100000),
+    follow: bool = False
+):
+    """
+    读取任务日志：指定 offset 时返回从该字节位置开始的最多 length 字节，否则返回最后 tail 行；
+    返回的 next_offset 可作为下次请求的 offset 增量读取。
+    follow=true 时以纯文本流持续推送新增内容，直到任务结束，响应头 X-Log-Offset 为起始位置
+    """
+    try:
+        page = await run_in_threadpool(task_manager.get_task_log, task_id, offset, length, tail)
+        if page is None:
+            raise HTTPException(status_code=404, detail=f"Log not found for task: {task_id}")
+        if not follow:
+            return page
+        return StreamingResponse(
+            task_manager.afollow_task_log(task_id, page["offset"]),
+            media_type="text/plain; charset=utf-8",
+            headers={"X-Log-Offset": str(page["offset"]), "Cache-Control": "no-cache"}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error reading task log - Task ID: {task_id}, Error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error reading task log: {str(e)}")
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus 指标：排队时间、各阶段耗时、Redis/adb 延迟、下载流量和引擎上报的爬取计数
+    """
+    try:
+        TASK_QUEUE_DEPTH.set(await task_manager.task_queue.adepth())
+        STAGE_QUEUE_DEPTH.labels("match").set(await task_manager.match_queue.adepth())
+        STAGE_QUEUE_DEPTH.labels("publish").set(await task_manager.publish_queue.adepth())
+    except Exception as e:
+        logger.error(f"Error sampling queue depth for metrics: {str(e)}")
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/health")
 async def health_check():
     """健康检查端点"""
     logger.debug("Health check requested")
-    redis_healthy = task_manager.health_check()
+    redis_healthy = await task_manager.ahealth_check()
     return {
         "status": "healthy" if redis_healthy else "degraded",
         "redis": "connected" if redis_healthy else "disconnected",
@@ -299,29 +437,66 @@ async def health_check():
 #     )
 
 @app.get("/api/list_tasks", response_model=dict)
-async def list_tasks():
+async def list_tasks(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    status: Optional[str] = None,
+    pkg: Optional[str] = None
+):
     """
-    列出所有任务
+    按提交时间从新到旧分页列出任务，可按状态和包名过滤；
+    返回的 next_cursor 用于请求下一页，为 null 时表示没有更多任务
     """
     try:
-        task_ids = task_manager.list_all_tasks()
+        page = await task_manager.alist_all_tasks(cursor, limit, status, pkg)
         return {
-            "total": len(task_ids),
-            "task_ids": task_ids
+            "total": len(page["tasks"]),
+            "task_ids": [task["task_id"] for task in page["tasks"]],
+            "tasks": page["tasks"],
+            "next_cursor": page["next_cursor"]
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error listing tasks: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error listing tasks: {str(e)}")
 
 @app.get("/api/download/{task_id}")
-async def download_task_collected_data(task_id):
+async def download_task_collected_data(task_id, cursor: Optional[str] = None):
     """
-    下载任务收集的数据
+    下载任务收集的数据；指定 cursor 时只下载该游标之后新增或修改的文件，
+    响应头 X-Manifest-Cursor 为下次增量下载使用的游标（URL 编码）
     """
     try:
-        logger.info(f"Downloading task collected data - Task ID: {task_id}")
-        data = task_manager.get_task_collected_data(task_id)
+        logger.info(f"Downloading task collected data - Task ID: {task_id}, Cursor: {cursor}")
+        data = await run_in_threadpool(task_manager.get_task_collected_data, task_id, cursor)
+        if data is None:
+            raise HTTPException(status_code=404, detail=f"Collected data not found for task: {task_id}")
         return data
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error downloading task collected data - Task ID: {task_id}, Error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error downloading task collected data: {str(e)}")
+
+@app.get("/api/task/{task_id}/manifest", response_model=dict)
+async def get_collected_manifest(task_id: str, cursor: Optional[str] = None,
+                                 limit: int = Query(1000, ge=1, le=10000)):
+    """
+    列出任务收集的文件清单（路径、大小、sha256、修改时间），按修改时间排序；
+    传入上次返回的 cursor 只列出之后新增或修改的文件，配合 /api/download?cursor= 增量同步
+    """
+    try:
+        manifest = await run_in_threadpool(task_manager.get_collected_manifest, task_id, cursor, limit)
+        if manifest is None:
+            raise HTTPException(status_code=404, detail=f"Collected data not found for task: {task_id}")
+        return manifest
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error building manifest - Task ID: {task_id}, Error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error building manifest: {str(e)}")
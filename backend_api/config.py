@@ -8,6 +8,7 @@ class Config:
     REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
     REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", None)
     TASK_TTL = int(os.getenv("TASK_TTL", 86400))  # 24小时
+    REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))  # API 异步连接池大小
 
     # GitHub 配置
     GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
@@ -16,12 +17,73 @@ class Config:
     GITHUB_MAIN_BRANCH = os.getenv("GITHUB_MAIN_BRANCH", "main")
     GITHUB_WORKFLOW_FILE = os.getenv("GITHUB_WORKFLOW_FILE", "build_release.yml")
     GITHUB_API_BASE = os.getenv("GITHUB_API_BASE", "https://api.github.com")
+    GITHUB_MAX_RETRIES = int(os.getenv("GITHUB_MAX_RETRIES", 4))  # GitHub API 请求失败（5xx、限流、网络错误）后的最多重试次数
+    GITHUB_RETRY_BACKOFF = float(os.getenv("GITHUB_RETRY_BACKOFF", 1))  # 重试的初始退避时间（秒），每次翻倍
+    GITHUB_MAX_RETRY_WAIT = float(os.getenv("GITHUB_MAX_RETRY_WAIT", 300))  # 单次重试最长等待时间（秒），限流要求等待更久时直接失败
     GKD_REPO_PATH = os.getenv("GKD_REPO_PATH", "../GKD_subscription")
+    GKD_WORKTREE_DIR = os.getenv("GKD_WORKTREE_DIR")  # 发布用临时工作树的存放目录，默认使用系统临时目录
+    GKD_FETCH_MAX_AGE = float(os.getenv("GKD_FETCH_MAX_AGE", 30))  # 多次发布复用同一次 fetch 的最长时间（秒）
     GITHUB_REMOTE_BRANCH_NAME = os.getenv("GITHUB_REMOTE_BRANCH_NAME", "test/api")
 
     # 数据收集路径
     COLLECTED_BASE_DIR = os.getenv("COLLECTED_BASE_DIR", "../poker/collectData")
 
+    # 任务调度配置
+    TASK_QUEUE_MAXSIZE = int(os.getenv("TASK_QUEUE_MAXSIZE", 1000))  # 等待队列最大长度
+    TASK_STREAM = os.getenv("TASK_STREAM", "task_stream")
+    TASK_CONSUMER_GROUP = os.getenv("TASK_CONSUMER_GROUP", "task_workers")
+    TASK_QUEUE_BLOCK_MS = int(os.getenv("TASK_QUEUE_BLOCK_MS", 2000))  # 需小于 Redis socket_timeout
+    TASK_HEARTBEAT_INTERVAL = int(os.getenv("TASK_HEARTBEAT_INTERVAL", 30))  # 运行中任务续期间隔（秒）
+    TASK_CLAIM_IDLE_MS = int(os.getenv("TASK_CLAIM_IDLE_MS", 180000))  # 超过该时间无心跳的任务会被其他 worker 回收
+    TASK_MAX_DELIVERIES = int(os.getenv("TASK_MAX_DELIVERIES", 3))  # 任务最多被投递的次数
+    TASK_CANCEL_POLL_INTERVAL = float(os.getenv("TASK_CANCEL_POLL_INTERVAL", 1))  # 执行中的任务检查取消请求的间隔（秒）
+    MATCH_STREAM = os.getenv("MATCH_STREAM", f"{TASK_STREAM}:match")  # GKD 匹配阶段的队列
+    PUBLISH_STREAM = os.getenv("PUBLISH_STREAM", f"{TASK_STREAM}:publish")  # GitHub 发布阶段的队列
+    MATCH_WORKERS = int(os.getenv("MATCH_WORKERS", os.cpu_count() or 1))  # 每个进程并行执行 GKD 匹配的任务数
+    PUBLISH_WORKERS = int(os.getenv("PUBLISH_WORKERS", 2))  # 每个进程并行发布的批次数，各批次在独立的工作树中提交
+    PUBLISH_BATCH_WINDOW = float(os.getenv("PUBLISH_BATCH_WINDOW", 60))  # 合并为一次 GitHub 发布的时间窗口（秒），0 表示逐个发布
+    PUBLISH_BATCH_SIZE = int(os.getenv("PUBLISH_BATCH_SIZE", 100))  # 单次发布最多合并的任务数
+    WORKER_STAGES = os.getenv("WORKER_STAGES", "crawl,match,publish")  # 本进程执行的流水线阶段（逗号分隔）
+    DEVICE_REFRESH_INTERVAL = int(os.getenv("DEVICE_REFRESH_INTERVAL", 60))  # worker_main 同步设备列表间隔（秒）
+    TASK_EVENT_KEEPALIVE = int(os.getenv("TASK_EVENT_KEEPALIVE", 15))  # 进度推送连接的保活间隔（秒）
+    TASK_STATUS_CACHE_SIZE = int(os.getenv("TASK_STATUS_CACHE_SIZE", 10000))  # 每个 API 进程缓存的任务记录数
+    TASK_STATUS_CACHE_TTL = float(os.getenv("TASK_STATUS_CACHE_TTL", 30))  # 任务记录缓存的最长保存时间（秒）
+    TASK_STATS_CACHE_TTL = float(os.getenv("TASK_STATS_CACHE_TTL", 1))  # 队列统计信息（排队数、排队位置）的缓存时间（秒）
+    WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", 9108))  # worker_main 暴露 Prometheus 指标的端口，0 表示不暴露
+    APK_RESULT_REUSE = os.getenv("APK_RESULT_REUSE", "true").lower() == "true"  # 相同 APK（内容哈希一致）已有完成结果时跳过采集，直接复用
+    APK_RESULT_TTL = int(os.getenv("APK_RESULT_TTL", 30 * 86400))  # 可复用结果的保存时间（秒），超过后重新采集
+    EMBEDDED_WORKER = os.getenv("EMBEDDED_WORKER", "true").lower() == "true"  # API 进程是否同时消费任务
+
+    # ADB 配置
+    ADB_SERVER_HOST = os.getenv("ADB_SERVER_HOST", "127.0.0.1")
+    ADB_SERVER_PORT = int(os.getenv("ANDROID_ADB_SERVER_PORT", 5037))
+    ADB_MAX_SESSIONS = int(os.getenv("ADB_MAX_SESSIONS", 4))  # 每台设备常驻 sh 会话数（可并发执行的命令数）
+    ADB_COMMAND_TIMEOUT = float(os.getenv("ADB_COMMAND_TIMEOUT", 30))  # 单条命令默认截止时间（秒）
+
+    # 应用列表配置
+    APP_LABEL_WORKERS = int(os.getenv("APP_LABEL_WORKERS", 4))  # 并行拉取/解析 APK 的线程数
+
+    # 采集引擎配置
+    POKER_WARM_WORKERS = os.getenv("POKER_WARM_WORKERS", "true").lower() == "true"  # 每台设备使用常驻采集进程（需支持 fork）
+    POKER_WORKER_START_TIMEOUT = float(os.getenv("POKER_WORKER_START_TIMEOUT", 300))  # 等待常驻采集进程完成预热的最长时间（秒）
+
+    # 任务日志配置
+    TASK_LOG_FLUSH_INTERVAL = float(os.getenv("TASK_LOG_FLUSH_INTERVAL", 0.5))  # 任务日志最长写入间隔（秒）
+    TASK_LOG_FLUSH_SIZE = int(os.getenv("TASK_LOG_FLUSH_SIZE", 256 * 1024))  # 缓冲内容达到该字符数时立即写入
+    TASK_LOG_MAX_BUFFERED = int(os.getenv("TASK_LOG_MAX_BUFFERED", 16 * 1024 * 1024))  # 缓冲内容上限（字符数），超出时丢弃
+    TASK_LOG_MAX_RANGE = int(os.getenv("TASK_LOG_MAX_RANGE", 1024 * 1024))  # 日志接口单次最多返回的字节数
+    TASK_LOG_POLL_INTERVAL = float(os.getenv("TASK_LOG_POLL_INTERVAL", 0.5))  # 跟随日志时检查新内容的间隔（秒）
+    TASK_LOG_MAX_OPEN_FILES = int(os.getenv("TASK_LOG_MAX_OPEN_FILES", 256))  # 同时打开的任务日志文件数
+
+    # 压测配置：用模拟引擎（fake_engine.py）代替 Poker、GKD 和 GitHub 发布，无需手机
+    FAKE_ENGINE = os.getenv("FAKE_ENGINE", "false").lower() == "true"
+    FAKE_DEVICES = int(os.getenv("FAKE_DEVICES", 4))  # 虚拟设备数量（并行采集的任务数）
+    FAKE_CRAWL_SECONDS = float(os.getenv("FAKE_CRAWL_SECONDS", 5))  # 单次采集耗时（秒），实际耗时上下浮动 20%
+    FAKE_MATCH_SECONDS = float(os.getenv("FAKE_MATCH_SECONDS", 1))  # 单次 GKD 匹配耗时（秒）
+    FAKE_PUBLISH_SECONDS = float(os.getenv("FAKE_PUBLISH_SECONDS", 2))  # 单次 GitHub 发布耗时（秒）
+    FAKE_OUTPUT_KB = int(os.getenv("FAKE_OUTPUT_KB", 1024))  # 每个任务写出的采集数据大小（KB）
+    FAKE_FAILURE_RATE = float(os.getenv("FAKE_FAILURE_RATE", 0))  # 每个阶段的失败概率（0~1）
+
     # 调试开关
     DEBUG_SKIP_POKER = os.getenv("DEBUG_SKIP_POKER", "false").lower() == "true"
 
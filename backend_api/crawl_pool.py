@@ -0,0 +1,161 @@
+import os
+import secrets
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Client
+from pathlib import Path
+from typing import Callable, Dict, Optional
+from config import Config
+from logger import logger, LOG_DIR
+
+
+class CrawlWorkerError(RuntimeError):
+    """常驻采集进程启动失败或在任务执行期间退出"""
+
+
+class _CrawlWorker:
+    """一台设备的常驻采集进程（poker/crawl_worker.py）"""
+
+    def __init__(self, serial: Optional[str], python_exec: str, poker_path: Path):
+        self.serial = serial
+        self.authkey = secrets.token_bytes(16)
+        # 常驻进程在私有临时目录（仅本用户可访问）下的 Unix 套接字上监听，预热完成后才创建，
+        # 不需要预先分配 TCP 端口，也就不会在预热期间被其他进程占用
+        self.socket_dir = tempfile.mkdtemp(prefix="crawl_worker_")
+        self.address = os.path.join(self.socket_dir, "worker.sock")
+        env = os.environ.copy()
+        env["CRAWL_WORKER_AUTHKEY"] = self.authkey.hex()
+        if serial:
+            env["ANDROID_SERIAL"] = serial
+        self.log_path = LOG_DIR / f"crawl_worker_{serial or 'default'}.log"
+        with open(self.log_path, "a", encoding="utf-8") as log_file:
+            self.proc = subprocess.Popen(
+                [python_exec, str(poker_path / "crawl_worker.py"), "--address", self.address],
+                cwd=str(poker_path),
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+                env=env,
+            )
+        logger.info(f"Crawl worker for device {serial or 'default'} started (pid {self.proc.pid}, socket {self.address})")
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def connect(self, timeout: float):
+        """连接常驻进程；进程仍在预热（导入模块、加载模型）时等待，直到超时"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return Client(self.address, family="AF_UNIX", authkey=self.authkey)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if not self.alive():
+                    raise CrawlWorkerError(f"Crawl worker exited with code {self.proc.returncode}, see {self.log_path}")
+                if time.monotonic() > deadline:
+                    raise CrawlWorkerError(f"Crawl worker not ready after {timeout}s, see {self.log_path}")
+                time.sleep(0.5)
+
+    def stop(self):
+        if self.alive():
+            self.proc.kill()
+            self.proc.wait()
+        shutil.rmtree(self.socket_dir, ignore_errors=True)
+
+
+class CrawlWorkerPool:
+    """
+    常驻采集进程池：每台设备一个长期运行的 poker 进程，导入的模块和加载的模型在任务之间复用，
+    省去每个任务启动两次 Python 解释器、重新导入 torch/cv2/uiautomator2 和加载 YOLO 权重的开销。
+
+    常驻进程为每个任务 fork 一个子进程运行采集，采集状态随子进程销毁；
+    设备接入时由调度器调用 warm 提前启动（第一个任务无需等待预热），设备断开时调用 stop 结束；
+    常驻进程异常退出后，下一个任务会重新启动它
+    """
+
+    def __init__(self, python_exec: str, poker_path: Path):
+        self.python_exec = python_exec
+        self.poker_path = poker_path
+        self._lock = threading.Lock()
+        self._workers: Dict[Optional[str], _CrawlWorker] = {}
+
+    @staticmethod
+    def supported() -> bool:
+        """常驻进程依赖 fork，Windows 上使用原有的逐任务启动方式"""
+        return Config.POKER_WARM_WORKERS and hasattr(os, "fork")
+
+    def _get_worker(self, serial: Optional[str]) -> _CrawlWorker:
+        with self._lock:
+            worker = self._workers.get(serial)
+            if worker is None or not worker.alive():
+                if worker is not None:
+                    worker.stop()
+                worker = self._workers[serial] = _CrawlWorker(serial, self.python_exec, self.poker_path)
+            return worker
+
+    def warm(self, serials):
+        """提前启动设备的常驻进程，使第一个任务也无需等待预热"""
+        for serial in serials:
+            self._get_worker(serial)
+
+    def stop(self, serial: Optional[str]):
+        """结束设备的常驻进程（设备已断开），释放其加载的模型"""
+        with self._lock:
+            worker = self._workers.pop(serial, None)
+        if worker is not None:
+            worker.stop()
+            logger.info(f"Crawl worker for device {serial or 'default'} stopped")
+
+    def run(self, serial: Optional[str], pkg: str, app: str, task_id: str, log_path: str,
+            cancelled: Callable[[], bool] = None) -> int:
+        """
+        在设备的常驻进程中运行一次采集，输出追加到 log_path，阻塞直到采集结束
+
+        Args:
+            cancelled: 定期调用，返回 True 时终止采集子进程的整个进程组，常驻进程随后停止应用并结束任务
+
+        Returns:
+            与 poker_engine 进程相同含义的返回码
+        """
+        worker = self._get_worker(serial)
+        conn = worker.connect(Config.POKER_WORKER_START_TIMEOUT)
+        try:
+            conn.send({"pkg": pkg, "app": app, "task_id": task_id, "log_path": str(Path(log_path).resolve())})
+            # 常驻进程 fork 出采集子进程后先回复其 PID，采集结束后再回复结果
+            child_pid = None
+            killed = False
+            while True:
+                if conn.poll(Config.TASK_CANCEL_POLL_INTERVAL):
+                    reply = conn.recv()
+                    if "pid" not in reply:
+                        break
+                    child_pid = reply["pid"]
+                elif child_pid and not killed and cancelled is not None and cancelled():
+                    logger.info(f"Task {task_id} - Cancel requested, killing crawl process group {child_pid}")
+                    try:
+                        # 采集子进程以新会话运行，进程组 ID 即其 PID
+                        os.killpg(child_pid, signal.SIGKILL)
+                    except ProcessLookupError:
+                        # 进程组不存在：子进程尚未建立新会话（或已退出），直接结束子进程本身
+                        try:
+                            os.kill(child_pid, signal.SIGKILL)
+                        except ProcessLookupError:
+                            pass
+                    killed = True
+        except (EOFError, OSError) as e:
+            # 常驻进程在任务执行期间退出，下一个任务会重新启动
+            raise CrawlWorkerError(f"Crawl worker for device {serial or 'default'} exited during task: {e}") from e
+        finally:
+            conn.close()
+        if reply.get("crawl_exit"):
+            logger.warning(f"Task {task_id} - crawl process exited with code {reply['crawl_exit']}")
+        return reply["returncode"]
+
+    def close(self):
+        with self._lock:
+            for worker in self._workers.values():
+                worker.stop()
+            self._workers.clear()
+
@@ -0,0 +1,302 @@
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from config import Config
+from logger import logger
+from task_queue import RedisTaskQueue
+
+
+# 未检测到设备时使用的占位槽位，由 adb 自行选择设备（兼容单设备环境）
+DEFAULT_SLOT = "default"
+
+
+class QueueFullError(RuntimeError):
+    """等待队列已满，拒绝继续提交任务"""
+
+
+class DeviceScheduler:
+    """
+    按设备调度任务：每台设备同一时间只运行一个采集任务，
+    超出设备数量的任务在 Redis Stream 有界队列中按提交顺序等待。
+
+    多个进程/主机可以各自启动 DeviceScheduler 消费同一个队列，从而横向扩展采集能力
+    """
+
+    def __init__(self, runner: Callable[[str, str, str, Optional[str], dict], None],
+                 task_queue: RedisTaskQueue, maxsize: int = None,
+                 on_device_start: Callable[[Optional[str]], None] = None,
+                 on_device_stop: Callable[[Optional[str]], None] = None):
+        """
+        Args:
+            runner: 任务执行函数，签名为 runner(task_id, pkg, app, serial, job)
+            task_queue: 持久化任务队列
+            maxsize: 等待队列的最大长度
+            on_device_start: 设备工作线程启动时调用（参数为设备序列号，默认槽位为 None），如预热设备的常驻进程
+            on_device_stop: 设备断开、工作线程退出时调用，释放为该设备保留的资源
+        """
+        self.runner = runner
+        self.on_device_start = on_device_start
+        self.on_device_stop = on_device_stop
+        self.task_queue = task_queue
+        self.maxsize = maxsize or Config.TASK_QUEUE_MAXSIZE
+        self._lock = threading.Lock()
+        self._running: Dict[str, Optional[dict]] = {}  # serial -> job
+        self._workers: Dict[str, threading.Thread] = {}
+        self._stop_events: Dict[str, threading.Event] = {}
+        self._heartbeat_thread: Optional[threading.Thread] = None
+
+    def refresh_devices(self, serials: List[str]):
+        """
+        根据当前连接的设备列表增删设备工作线程
+
+        Args:
+            serials: 设备序列号列表，为空时使用默认槽位
+        """
+        serials = list(serials) or [DEFAULT_SLOT]
+        changed = False
+        with self._lock:
+            for serial in serials:
+                worker = self._workers.get(serial)
+                if worker is None or not worker.is_alive():
+                    self._start_worker(serial)
+                    changed = True
+                else:
+                    # 设备重新连接，取消尚未生效的退出请求
+                    self._stop_events[serial].clear()
+            for serial, stop_event in self._stop_events.items():
+                if serial not in serials and not stop_event.is_set():
+                    # 设备已断开，当前任务结束后线程退出
+                    stop_event.set()
+                    changed = True
+            if self._heartbeat_thread is None:
+                self._heartbeat_thread = threading.Thread(
+                    target=self._heartbeat_loop, name="device-heartbeat", daemon=True
+                )
+                self._heartbeat_thread.start()
+        if changed:
+            logger.info(f"Scheduler devices refreshed: {serials}")
+
+    def _start_worker(self, serial: str):
+        self._running[serial] = None
+        self._stop_events[serial] = threading.Event()
+        worker = threading.Thread(
+            target=self._worker_loop,
+            args=(serial,),
+            name=f"device-worker-{serial}",
+            daemon=True,
+        )
+        self._workers[serial] = worker
+        worker.start()
+
+    def _slot_name(self, serial: str) -> str:
+        # 默认槽位在多主机间不唯一，附加主机名区分
+        return f"{DEFAULT_SLOT}@{socket.gethostname()}" if serial == DEFAULT_SLOT else serial
+
+    def submit(self, task_id: str, pkg: str, app: str, task_key: str, task_fields: list, ttl: int) -> str:
+        """
+        将任务加入等待队列并保存任务记录，返回 Stream 条目 ID；
+        队列已满时抛出 QueueFullError
+        """
+        if self.task_queue.depth() >= self.maxsize:
+            raise QueueFullError(f"Task queue is full ({self.maxsize} tasks waiting)")
+        return self.task_queue.enqueue(task_id, pkg, app, task_key, task_fields, ttl)
+
+    async def asubmit(self, task_id: str, pkg: str, app: str, task_key: str, task_fields: list, ttl: int) -> str:
+        """submit 的异步版本，供 API 事件循环使用"""
+        if await self.task_queue.adepth() >= self.maxsize:
+            raise QueueFullError(f"Task queue is full ({self.maxsize} tasks waiting)")
+        return await self.task_queue.aenqueue(task_id, pkg, app, task_key, task_fields, ttl)
+
+    def _worker_loop(self, serial: str):
+        consumer = f"{self.task_queue.consumer_prefix}-{serial}"
+        stop_event = self._stop_events[serial]
+        logger.info(f"Device worker started: {serial} (consumer {consumer})")
+        self._device_hook(self.on_device_start, serial)
+
+        while not stop_event.is_set():
+            try:
+                entry = self.task_queue.claim(consumer)
+            except Exception as e:
+                logger.error(f"Device worker {serial} failed to claim task: {str(e)}")
+                stop_event.wait(1)
+                continue
+            if entry is None:
+                continue
+
+            entry_id, job = entry
+            job["entry_id"] = entry_id
+            job["consumer"] = consumer
+            job["device"] = None if serial == DEFAULT_SLOT else serial
+            job["started_at"] = time.time()
+            with self._lock:
+                self._running[serial] = job
+            self._publish_slot(serial, job["task_id"])
+
+            logger.info(f"Task {job['task_id']} dispatched to device {serial}")
+            try:
+                self.runner(job["task_id"], job["pkg"], job["app"], job["device"], job)
+            except Exception as e:
+                logger.error(f"Device worker {serial} error on task {job['task_id']}: {str(e)}")
+            finally:
+                with self._lock:
+                    self._running[serial] = None
+                try:
+                    self.task_queue.ack(entry_id)
+                except Exception as e:
+                    logger.error(f"Failed to ack task {job['task_id']} ({entry_id}): {str(e)}")
+                self._publish_slot(serial, None)
+
+        self._device_hook(self.on_device_stop, serial)
+        with self._lock:
+            self._workers.pop(serial, None)
+            self._running.pop(serial, None)
+            self._stop_events.pop(serial, None)
+        try:
+            self.task_queue.remove_slot(self._slot_name(serial))
+        except Exception as e:
+            logger.error(f"Failed to remove device slot {serial}: {str(e)}")
+        logger.info(f"Device worker stopped: {serial}")
+
+    def _device_hook(self, hook: Optional[Callable[[Optional[str]], None]], serial: str):
+        if hook is None:
+            return
+        try:
+            hook(None if serial == DEFAULT_SLOT else serial)
+        except Exception as e:
+            logger.error(f"Device hook {hook.__name__} failed for {serial}: {str(e)}")
+
+    def _publish_slot(self, serial: str, task_id: Optional[str]):
+        try:
+            self.task_queue.set_slot(self._slot_name(serial), task_id)
+        except Exception as e:
+            logger.error(f"Failed to publish device slot {serial}: {str(e)}")
+
+    def _heartbeat_loop(self):
+        """定期为运行中的任务续期，并刷新设备占用信息"""
+        while True:
+            time.sleep(Config.TASK_HEARTBEAT_INTERVAL)
+            with self._lock:
+                running = dict(self._running)
+            for serial, job in running.items():
+                try:
+                    if job:
+                        self.task_queue.heartbeat(job["consumer"], [job["entry_id"]])
+                    self.task_queue.set_slot(self._slot_name(serial), job["task_id"] if job else None)
+                except Exception as e:
+                    logger.error(f"Heartbeat failed for device {serial}: {str(e)}")
+
+
+class StageWorkerPool:
+    """
+    流水线后续阶段（GKD 匹配、GitHub 发布）的工作线程池
+
+    每个阶段有独立的 Redis Stream 队列和并发上限，与设备采集互不阻塞：
+    设备采集完一个应用即可开始下一个，匹配和发布在各自的线程池中并行处理之前的任务。
+    多个进程可以各自启动同一阶段的线程池，共同消费该阶段的队列
+    """
+
+    def __init__(self, stage: str, runner: Callable, task_queue: RedisTaskQueue, concurrency: int,
+                 batch_size: int = 1, batch_window: float = 0):
+        """
+        Args:
+            stage: 阶段名，用于线程名和消费者名
+            runner: 任务执行函数，签名为 runner(task_id, pkg, app, job)；
+                batch_size 大于 1 时为 runner(jobs)，一次处理一批任务
+            task_queue: 该阶段的任务队列
+            concurrency: 并发执行的任务（批次）数
+            batch_size: 每批最多合并的任务数
+            batch_window: 领取到第一个任务后继续等待同批任务的时间（秒）
+        """
+        self.stage = stage
+        self.runner = runner
+        self.task_queue = task_queue
+        self.concurrency = max(concurrency, 1)
+        self.batch_size = max(batch_size, 1)
+        self.batch_window = batch_window
+        self._lock = threading.Lock()
+        self._running: Dict[int, List[dict]] = {}  # 线程序号 -> 执行中（或正在凑批）的 job
+        self._started = False
+
+    def start(self):
+        """启动工作线程，重复调用无效果"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for index in range(self.concurrency):
+                self._running[index] = []
+                threading.Thread(
+                    target=self._worker_loop, args=(index,),
+                    name=f"{self.stage}-worker-{index}", daemon=True,
+                ).start()
+            threading.Thread(
+                target=self._heartbeat_loop, name=f"{self.stage}-heartbeat", daemon=True
+            ).start()
+        logger.info(f"Stage {self.stage} started with {self.concurrency} workers, consuming {self.task_queue.stream}")
+
+    def _claim_job(self, index: int, consumer: str, block_ms: int = None) -> Optional[dict]:
+        try:
+            entry = self.task_queue.claim(consumer, block_ms=block_ms)
+        except Exception as e:
+            logger.error(f"Stage {self.stage} worker {index} failed to claim task: {str(e)}")
+            time.sleep(1)
+            return None
+        if entry is None:
+            return None
+        entry_id, job = entry
+        job["entry_id"] = entry_id
+        job["consumer"] = consumer
+        with self._lock:
+            self._running[index].append(job)
+        return job
+
+    def _collect_batch(self, index: int, consumer: str, jobs: List[dict]):
+        """在 batch_window 内继续领取任务，直到凑满 batch_size"""
+        deadline = time.monotonic() + self.batch_window
+        while len(jobs) < self.batch_size:
+            remaining_ms = int((deadline - time.monotonic()) * 1000)
+            if remaining_ms <= 0:
+                break
+            job = self._claim_job(index, consumer, block_ms=min(remaining_ms, Config.TASK_QUEUE_BLOCK_MS))
+            if job is not None:
+                jobs.append(job)
+
+    def _worker_loop(self, index: int):
+        consumer = f"{self.task_queue.consumer_prefix}-{self.stage}-{index}"
+        while True:
+            job = self._claim_job(index, consumer)
+            if job is None:
+                continue
+
+            jobs = [job]
+            try:
+                if self.batch_size > 1:
+                    self._collect_batch(index, consumer, jobs)
+                    logger.info(f"Stage {self.stage} worker {index} running batch of {len(jobs)} tasks")
+                    self.runner(jobs)
+                else:
+                    self.runner(job["task_id"], job["pkg"], job["app"], job)
+            except Exception as e:
+                task_ids = [job["task_id"] for job in jobs]
+                logger.error(f"Stage {self.stage} worker {index} error on tasks {task_ids}: {str(e)}")
+            finally:
+                with self._lock:
+                    self._running[index] = []
+                for job in jobs:
+                    try:
+                        self.task_queue.ack(job["entry_id"])
+                    except Exception as e:
+                        logger.error(f"Failed to ack task {job['task_id']} ({job['entry_id']}): {str(e)}")
+
+    def _heartbeat_loop(self):
+        """定期为运行中的任务续期"""
+        while True:
+            time.sleep(Config.TASK_HEARTBEAT_INTERVAL)
+            with self._lock:
+                running = [job for jobs in self._running.values() for job in jobs]
+            for job in running:
+                try:
+                    self.task_queue.heartbeat(job["consumer"], [job["entry_id"]])
+                except Exception as e:
+                    logger.error(f"Heartbeat failed for stage {self.stage} task {job['task_id']}: {str(e)}")
@@ -0,0 +1,113 @@
+"""
+模拟引擎：代替 poker_engine.py、run_match_ele.py 和 GitHub 发布，无需手机即可压测后端
+
+Config.FAKE_ENGINE 为 true 时由 process_launcher 以与真实引擎相同的方式启动（子进程、输出写入任务日志），
+耗时、采集数据大小和失败概率由 FAKE_* 配置项控制；设备调度使用 Config.FAKE_DEVICES 个虚拟设备。
+
+    python fake_engine.py crawl --pkg com.foo --app Foo --task_id <id>   # 代替 poker_engine.py
+    python fake_engine.py match <task_id>                                # 代替 run_match_ele.py
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Tuple
+from config import Config
+
+# 采集数据中单个截图文件的大小上限，总大小由 Config.FAKE_OUTPUT_KB 决定
+FAKE_FILE_SIZE = 256 * 1024
+
+
+def fake_devices() -> List[str]:
+    """模拟模式下的设备列表，代替 ADBAppManager.get_connected_devices()"""
+    return [f"fake-{i}" for i in range(1, Config.FAKE_DEVICES + 1)]
+
+
+def _sleep(seconds: float):
+    # 上下浮动 20%，避免所有任务同时结束
+    time.sleep(max(0.0, seconds * random.uniform(0.8, 1.2)))
+
+
+def _failed() -> bool:
+    return random.random() < Config.FAKE_FAILURE_RATE
+
+
+def fake_crawl(pkg: str, app: str, task_id: str) -> int:
+    """模拟一次采集：按配置写出采集数据和 crawl_stats.json，返回进程退出码"""
+    print(f"{pkg}, {app}")
+    print(f"[ENGINE] Start processing {pkg} | {app} (fake engine, device {os.getenv('ANDROID_SERIAL', 'default')})")
+    _sleep(Config.FAKE_CRAWL_SECONDS)
+    if _failed():
+        print("[ENGINE] Fake crawl failed", file=sys.stderr)
+        return 1
+
+    output_dir = Path(Config.COLLECTED_BASE_DIR) / task_id
+    output_dir.mkdir(parents=True, exist_ok=True)
+    remaining = Config.FAKE_OUTPUT_KB * 1024
+    index = 0
+    while remaining > 0:
+        size = min(remaining, FAKE_FILE_SIZE)
+        (output_dir / f"screen_{index}.png").write_bytes(os.urandom(size))
+        (output_dir / f"screen_{index}.json").write_text(
+            json.dumps({"pkg": pkg, "activity": f"{pkg}.Activity{index}", "screen": index}), encoding="utf-8"
+        )
+        remaining -= size
+        index += 1
+    stats = {"steps": index * 5, "screens": index, "popups": index // 3, "restarts": 0}
+    (output_dir / "crawl_stats.json").write_text(json.dumps(stats), encoding="utf-8")
+    print(f"[ENGINE] Completed {pkg}, {index} screens")
+    return 0
+
+
+def fake_match(task_id: str) -> int:
+    """模拟一次 GKD 规则匹配，返回进程退出码"""
+    print(f"[GKD] Fake matching for task {task_id}")
+    _sleep(Config.FAKE_MATCH_SECONDS)
+    if _failed():
+        print("[GKD] Fake match failed", file=sys.stderr)
+        return 1
+    return 0
+
+
+def fake_publish(tasks: List[Tuple[str, str, str]]) -> Dict:
+    """
+    模拟一批任务的 GitHub 发布，返回与 run_github_task 相同结构的结果；失败时抛出异常
+
+    Args:
+        tasks: [(task_id, pkg, app), ...]
+    """
+    _sleep(Config.FAKE_PUBLISH_SECONDS)
+    if _failed():
+        raise RuntimeError("Fake GitHub publication failed")
+    number = random.randint(1, 10 ** 6)
+    return {
+        "status": "completed",
+        "branch": {"branch": f"{Config.GITHUB_REMOTE_BRANCH_NAME}-fake-{uuid.uuid4().hex[:6]}"},
+        "pr": {"number": number, "html_url": f"https://fake.github/pull/{number}"},
+        "tasks": {task_id: True for task_id, _, _ in tasks},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake engine for backend load tests")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    crawl = subparsers.add_parser("crawl")
+    crawl.add_argument("--pkg", required=True)
+    crawl.add_argument("--app", required=True)
+    crawl.add_argument("--task_id", required=True)
+    match = subparsers.add_parser("match")
+    match.add_argument("task_id")
+    args = parser.parse_args()
+
+    if args.command == "crawl":
+        return fake_crawl(args.pkg, args.app, args.task_id)
+    return fake_match(args.task_id)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,224 @@
+import hashlib
 import os
-import shutil
+import threading
+import time
 import zipfile
+from collections import OrderedDict
+from typing import List, Optional, Tuple
 
-def create_zip_from_folder(folder_path, zip_path):
-    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for root, dirs, files in os.walk(folder_path):
-            for file in files:
-                file_path = os.path.join(root, file)
-                arcname = os.path.relpath(file_path, folder_path)
-                zipf.write(file_path, arcname)
-
-def cleanup_tmp_files(zip_path: str, temp_dir: str):
-    def cleanup():
-        try:
-            if os.path.exists(zip_path):
-                os.remove(zip_path)
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
-        except Exception as e:
-            print(f"清理临时文件时出错: {e}")
-    
-    return cleanup
\ No newline at end of file
+# 已压缩格式直接存储，重复 deflate 只会浪费 CPU
+STORED_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".webp", ".mp4", ".zip", ".apk", ".gz", ".xz", ".7z"}
+
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# 最近修改过的文件可能仍在写入，暂不列入清单，等下次同步再返回
+MANIFEST_SETTLE_SECONDS = 2
+
+HASH_CACHE_SIZE = 100000
+_hash_cache = OrderedDict()  # (path, size, mtime_ns) -> sha256
+_hash_cache_lock = threading.Lock()
+
+
+class _ZipStreamBuffer:
+    """只写、不可 seek 的缓冲区，zipfile 写入后由生成器取出已生成的数据"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        if data:
+            self._chunks.append(bytes(data))
+            self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def scan_folder(folder_path, cursor: Optional[Tuple[int, str]] = None,
+                settle_seconds: float = MANIFEST_SETTLE_SECONDS) -> List[dict]:
+    """
+    列出文件夹中已写入完成的文件，按 (mtime_ns, path) 排序
+
+    Args:
+        folder_path: 待扫描的文件夹
+        cursor: parse_manifest_cursor 的结果，只返回排在游标之后的文件
+
+    Returns:
+        [{"path": 相对路径, "size": 字节数, "mtime": 秒, "mtime_ns": 纳秒}]
+    """
+    settled_before = time.time_ns() - int(settle_seconds * 1e9)
+    entries = []
+    for root, dirs, files in os.walk(folder_path):
+        for file in files:
+            file_path = os.path.join(root, file)
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime_ns > settled_before:
+                continue
+            rel_path = os.path.relpath(file_path, folder_path).replace(os.sep, "/")
+            if cursor is not None and (stat.st_mtime_ns, rel_path) <= cursor:
+                continue
+            entries.append({
+                "path": rel_path,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "mtime_ns": stat.st_mtime_ns,
+            })
+    entries.sort(key=lambda entry: (entry["mtime_ns"], entry["path"]))
+    return entries
+
+
+def manifest_cursor(entry: dict) -> str:
+    """由清单条目生成游标，下次扫描只返回其后的文件"""
+    return f"{entry['mtime_ns']}:{entry['path']}"
+
+
+def parse_manifest_cursor(cursor: str) -> Tuple[int, str]:
+    """解析 manifest_cursor 生成的游标，格式错误时抛出 ValueError"""
+    mtime_ns, sep, path = cursor.partition(":")
+    if not sep:
+        raise ValueError(f"Invalid manifest cursor: {cursor}")
+    return int(mtime_ns), path
+
+
+def file_sha256(file_path, size: int, mtime_ns: int) -> str:
+    """计算文件的 sha256，按 (路径, 大小, 修改时间) 缓存，文件未变化时不重复读取"""
+    key = (str(file_path), size, mtime_ns)
+    with _hash_cache_lock:
+        digest = _hash_cache.get(key)
+        if digest is not None:
+            _hash_cache.move_to_end(key)
+            return digest
+
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while True:
+            data = f.read(STREAM_CHUNK_SIZE)
+            if not data:
+                break
+            sha256.update(data)
+    digest = sha256.hexdigest()
+
+    with _hash_cache_lock:
+        _hash_cache[key] = digest
+        if len(_hash_cache) > HASH_CACHE_SIZE:
+            _hash_cache.popitem(last=False)
+    return digest
+
+
+def _walk_files(folder_path):
+    for root, dirs, files in os.walk(folder_path):
+        dirs.sort()
+        for file in sorted(files):
+            yield os.path.relpath(os.path.join(root, file), folder_path)
+
+
+def iter_zip_from_folder(folder_path, paths: Optional[List[str]] = None, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    边压缩边输出文件夹的 ZIP 数据，不生成临时文件；
+    内存占用只与 chunk_size 有关，与文件夹大小无关
+
+    Args:
+        folder_path: 待打包的文件夹
+        paths: 只打包这些相对路径，默认打包整个文件夹
+        chunk_size: 每次读取源文件的字节数
+
+    Yields:
+        ZIP 数据块
+    """
+    buffer = _ZipStreamBuffer()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zipf:
+        for arcname in (paths if paths is not None else _walk_files(folder_path)):
+            file_path = os.path.join(folder_path, arcname)
+            try:
+                zinfo = zipfile.ZipInfo.from_file(file_path, arcname, strict_timestamps=False)
+            except FileNotFoundError:
+                # 扫描后被删除的文件
+                continue
+            if os.path.splitext(arcname)[1].lower() in STORED_EXTENSIONS:
+                zinfo.compress_type = zipfile.ZIP_STORED
+            else:
+                zinfo.compress_type = zipfile.ZIP_DEFLATED
+
+            # 不可 seek 时无法回填头部，超大文件需要预先声明 ZIP64
+            force_zip64 = zinfo.file_size * 1.05 > zipfile.ZIP64_LIMIT
+            with open(file_path, "rb") as src, zipf.open(zinfo, "w", force_zip64=force_zip64) as dest:
+                while True:
+                    data = src.read(chunk_size)
+                    if not data:
+                        break
+                    dest.write(data)
+                    chunk = buffer.drain()
+                    if chunk:
+                        yield chunk
+            chunk = buffer.drain()
+            if chunk:
+                yield chunk
+    # 写入中央目录
+    chunk = buffer.drain()
+    if chunk:
+        yield chunk
+
+
+def _utf8_complete_length(data: bytes) -> int:
+    """去掉末尾不完整的 UTF-8 字符后的长度，避免范围读取把多字节字符截断"""
+    for back in range(1, min(4, len(data)) + 1):
+        byte = data[-back]
+        if byte & 0xC0 != 0x80:
+            # 找到字符起始字节，判断其后的续字节是否齐全
+            expected = 1 if byte < 0x80 else 2 if byte >= 0xC0 and byte < 0xE0 else 3 if byte < 0xF0 else 4
+            return len(data) if back >= expected else len(data) - back
+    return len(data)
+
+
+def read_file_range(file_path, offset: int, length: int) -> Tuple[bytes, int]:
+    """
+    读取文件 [offset, offset + length) 范围内的内容，末尾不完整的 UTF-8 字符留给下一次读取
+
+    Returns:
+        (内容, 下一次读取的起始位置)
+    """
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        data = f.read(length)
+    if len(data) == length:
+        data = data[:_utf8_complete_length(data)]
+    return data, offset + len(data)
+
+
+def tail_offset(file_path, lines: int, block_size: int = 64 * 1024) -> int:
+    """从文件末尾向前按块查找，返回最后 lines 行的起始位置，读取量只与这些行的长度有关"""
+    with open(file_path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = position = f.tell()
+        if lines <= 0 or size == 0:
+            return size
+        # 末尾的换行符不算作新的一行
+        f.seek(size - 1)
+        newlines = -1 if f.read(1) == b"\n" else 0
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            block = f.read(read_size)
+            index = len(block)
+            while True:
+                index = block.rfind(b"\n", 0, index)
+                if index < 0:
+                    break
+                newlines += 1
+                if newlines == lines:
+                    return position + index + 1
+        return 0
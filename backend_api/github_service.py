@@ -1,11 +1,162 @@
+import random
+import shutil
+import tempfile
+import threading
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional, Tuple
 import requests
+from requests.adapters import HTTPAdapter
 from git import Repo, GitCommandError
 from config import Config
 from logger import logger
 
 
+# 可重试的服务端错误
+RETRY_STATUS = (500, 502, 503, 504)
+# 重复发送没有副作用的请求方法；其余方法（如触发工作流的 POST、合并 PR 的 PUT）在超时或 5xx 时
+# 可能已被 GitHub 执行，重发会产生重复的工作流运行，只在明确被限流拒绝时重试
+IDEMPOTENT_METHODS = ("GET", "HEAD")
+
+
+class GitHubClient:
+    """
+    GitHub REST API 客户端
+
+    所有请求复用同一个 Session 的 keep-alive 连接池；GET 请求带 If-None-Match 条件请求，
+    命中 304 时返回缓存的响应（不计入限流配额）；GET/HEAD 请求在网络错误、服务端错误和限流时按
+    Retry-After / X-RateLimit-Reset 等待后重试，其他请求只在带 Retry-After 的限流响应时重试，
+    重试次数和单次等待时间都有上限
+    """
+
+    def __init__(self, token: str, api_base: str, max_retries: int = None, backoff: float = None,
+                 max_wait: float = None, pool_size: int = 10):
+        self.api_base = api_base.rstrip("/")
+        self.max_retries = Config.GITHUB_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = Config.GITHUB_RETRY_BACKOFF if backoff is None else backoff
+        self.max_wait = Config.GITHUB_MAX_RETRY_WAIT if max_wait is None else max_wait
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Accept": "application/vnd.github+json",
+            "Authorization": f"Bearer {token}",
+            "X-GitHub-Api-Version": "2022-11-28",
+        })
+        self._etag_cache: Dict[str, Tuple[str, requests.Response]] = {}  # 请求 URL -> (ETag, 响应)
+        self._lock = threading.Lock()
+
+    def request(self, method: str, path: str, params: dict = None, timeout: float = 15, **kwargs) -> requests.Response:
+        """
+        发送请求并返回最终响应（可能是非 2xx），网络错误重试耗尽后抛出 requests.RequestException
+
+        Args:
+            path: 以 / 开头的 API 路径
+        """
+        url = f"{self.api_base}{path}"
+        cache_key = requests.Request(method, url, params=params).prepare().url
+        idempotent = method in IDEMPOTENT_METHODS
+        for attempt in range(self.max_retries + 1):
+            headers = {}
+            cached = None
+            if method == "GET":
+                with self._lock:
+                    cached = self._etag_cache.get(cache_key)
+                if cached:
+                    headers["If-None-Match"] = cached[0]
+            try:
+                resp = self.session.request(method, url, params=params, headers=headers, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if not idempotent or attempt == self.max_retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+                logger.warning(f"GitHub {method} {path} 请求失败: {e}，{delay:.1f} 秒后重试")
+                time.sleep(delay)
+                continue
+
+            if resp.status_code == 304 and cached:
+                return cached[1]
+            if method == "GET" and resp.ok and resp.headers.get("ETag"):
+                with self._lock:
+                    self._etag_cache[cache_key] = (resp.headers["ETag"], resp)
+
+            delay = self._retry_delay(resp, attempt, idempotent)
+            if delay is None or attempt == self.max_retries:
+                return resp
+            logger.warning(f"GitHub {method} {path} 返回 {resp.status_code}，{delay:.1f} 秒后重试")
+            time.sleep(delay)
+        return resp
+
+    def _retry_delay(self, resp: requests.Response, attempt: int, idempotent: bool = True) -> Optional[float]:
+        """需要重试时返回等待秒数，不应重试（或需等待的时间超过上限）时返回 None"""
+        status = resp.status_code
+        rate_limited = status == 429 or (status == 403 and (
+            resp.headers.get("X-RateLimit-Remaining") == "0" or "rate limit" in resp.text.lower()
+        ))
+        if status not in RETRY_STATUS and not rate_limited:
+            return None
+        if not idempotent and not (rate_limited and resp.headers.get("Retry-After")):
+            # 非幂等请求：只有明确带 Retry-After 的限流响应说明请求未被执行
+            return None
+
+        if resp.headers.get("Retry-After"):
+            try:
+                delay = float(resp.headers["Retry-After"])
+            except ValueError:
+                delay = self.backoff * 2 ** attempt
+        elif rate_limited and resp.headers.get("X-RateLimit-Remaining") == "0" and resp.headers.get("X-RateLimit-Reset"):
+            delay = float(resp.headers["X-RateLimit-Reset"]) - time.time() + 1
+        elif rate_limited:
+            # 次级限流未给出等待时间时，GitHub 建议至少等待一分钟
+            delay = max(60.0, self.backoff * 2 ** attempt)
+        else:
+            delay = self.backoff * 2 ** attempt * (1 + random.random() / 2)
+
+        delay = max(delay, 0)
+        if delay > self.max_wait:
+            logger.warning(f"GitHub 要求等待 {delay:.0f} 秒，超过上限 {self.max_wait:.0f} 秒，不再重试")
+            return None
+        return delay
+
+
+_clients: Dict[Tuple[str, str], GitHubClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_github_client() -> GitHubClient:
+    """按当前配置（token、API 地址）返回进程内共享的客户端，各任务复用同一个连接池"""
+    key = (Config.GITHUB_TOKEN, Config.GITHUB_API_BASE)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = GitHubClient(Config.GITHUB_TOKEN, Config.GITHUB_API_BASE)
+        return client
+
+
+def changed_paths(repo: Repo) -> set:
+    """工作区中相对 HEAD 有改动（含未跟踪）的文件路径"""
+    paths = set(repo.untracked_files)
+    paths.update(diff.a_path for diff in repo.index.diff(None))
+    paths.update(diff.a_path for diff in repo.index.diff("HEAD"))
+    return paths
+
+
+# 各仓库最近一次 fetch 的开始时间和互斥锁，多个发布任务共用一次 fetch
+_fetch_times: Dict[Path, float] = {}
+# 本进程最近一次合并 PR（改动远端基准分支）的时间，此前开始的 fetch 结果不再复用
+_base_changed_times: Dict[Path, float] = {}
+# 已合并到远端、但主仓库尚未同步的文件：路径 -> 发布的 blob（None 表示删除），同步主仓库时据此判断本地改动是否已发布
+_published_blobs: Dict[Path, Dict[str, Optional[str]]] = {}
+_repo_locks: Dict[Path, threading.Lock] = {}
+_repo_locks_lock = threading.Lock()
+
+
+def _repo_lock(repo_path: Path) -> threading.Lock:
+    with _repo_locks_lock:
+        return _repo_locks.setdefault(repo_path, threading.Lock())
+
+
 class GitHubService:
     """封装 GKD_subscription 仓库的 Git/GitHub 操作"""
 
@@ -20,37 +171,119 @@ class GitHubService:
         self.repo = Repo(self.repo_path)
         if self.repo.bare:
             raise ValueError(f"路径 {self.repo_path} 不是有效的 Git 仓库")
+        self.client = get_github_client()
+        self.repo_api = f"/repos/{Config.GITHUB_OWNER}/{Config.GITHUB_REPO}"
+
+    def fetch_base(self, base_branch: Optional[str] = None, max_age: float = None) -> bool:
+        """
+        拉取远端基准分支；距上次 fetch 不超过 max_age 秒、且此后本进程没有合并过 PR 时复用上次结果，
+        并发的发布任务在锁上等待同一次 fetch。返回本次是否实际执行了 fetch
+        """
+        base_branch = base_branch or Config.GITHUB_MAIN_BRANCH
+        max_age = Config.GKD_FETCH_MAX_AGE if max_age is None else max_age
+        with _repo_lock(self.repo_path):
+            last = _fetch_times.get(self.repo_path)
+            if last is not None and time.monotonic() - last <= max_age and \
+                    last > _base_changed_times.get(self.repo_path, float("-inf")):
+                return False
+            started = time.monotonic()
+            try:
+                self.repo.git.fetch("origin", base_branch)
+            except GitCommandError as e:
+                logger.error(f"拉取远端分支失败: {e}")
+                raise RuntimeError(f"拉取远端分支失败: {e}") from e
+            _fetch_times[self.repo_path] = started
+            return True
+
+    def invalidate_fetch(self):
+        """远端基准分支已被本进程改动（如合并了 PR），下一次发布必须重新 fetch"""
+        # 不等待仓库锁：正在进行的 fetch 开始得更早，其结果同样不会被复用
+        _base_changed_times[self.repo_path] = time.monotonic()
 
-    def _checkout_base(self, base_branch: str):
-        """拉取并切换到基准分支"""
-        self.repo.git.fetch("origin", base_branch)
-        self.repo.git.checkout(base_branch)
-        self.repo.git.pull("origin", base_branch)
+    def record_published(self, blobs: Dict[str, Optional[str]]):
+        """记录已合并到远端基准分支的文件内容，下次同步主仓库时这些本地改动不再视为待发布"""
+        with _repo_lock(self.repo_path):
+            _published_blobs.setdefault(self.repo_path, {}).update(blobs)
 
-    def create_branch(self, branch_name: str, base_branch: Optional[str] = None) -> dict:
+    def sync_checkout(self, base_branch: Optional[str] = None) -> bool:
+        """
+        将主仓库的基准分支更新到 origin/<base_branch>（调用方先 fetch），保留工作区中尚未发布的改动：
+        远端改动过的文件，本地未改动或本地内容就是已发布的版本时换成远端版本，否则保留本地内容。
+        返回是否更新了主仓库
+        """
         base_branch = base_branch or Config.GITHUB_MAIN_BRANCH
-        logger.info(f"准备创建/切换分支: {branch_name}, 基于: {base_branch}")
+        with _repo_lock(self.repo_path):
+            target = self.repo.commit(f"origin/{base_branch}")
+            head = self.repo.head.commit
+            if head == target and not self.repo.head.is_detached and self.repo.active_branch.name == base_branch:
+                return False
 
+            local = changed_paths(self.repo)
+            published = _published_blobs.get(self.repo_path, {})
+            upstream = set()
+            for diff in head.diff(target):
+                upstream.update(path for path in (diff.a_path, diff.b_path) if path)
+            take = sorted(path for path in upstream
+                          if path not in local or (path in published and self._matches(path, published[path])))
+
+            # 只移动分支和暂存区，工作区中的改动原样保留
+            self.repo.git.update_ref(f"refs/heads/{base_branch}", target.hexsha)
+            self.repo.git.symbolic_ref("HEAD", f"refs/heads/{base_branch}")
+            self.repo.git.reset("-q")
+            tracked = set(self.repo.git.ls_tree("-r", "--name-only", target.hexsha, "--", *take).splitlines()) \
+                if take else set()
+            if tracked:
+                self.repo.git.checkout("--", *sorted(tracked))
+            for path in set(take) - tracked:
+                (self.repo_path / path).unlink(missing_ok=True)
+            for path in upstream:
+                published.pop(path, None)
+            logger.info(f"主仓库已更新到 origin/{base_branch} ({target.hexsha[:8]})，更新了 {len(take)} 个文件")
+            return True
+
+    def _matches(self, path: str, blob: Optional[str]) -> bool:
+        file_path = self.repo_path / path
+        if blob is None:
+            return not file_path.exists()
+        return file_path.is_file() and self.repo.git.hash_object(str(file_path)) == blob
+
+    def create_worktree(self, base_branch: Optional[str] = None) -> Repo:
+        """
+        基于 origin/<base_branch> 创建独立的工作树（与主仓库共享对象库），
+        每次发布在各自的工作树中提交和推送，互不影响，也不改动主仓库的工作区
+        """
+        base_branch = base_branch or Config.GITHUB_MAIN_BRANCH
+        worktree_root = Path(Config.GKD_WORKTREE_DIR) if Config.GKD_WORKTREE_DIR else None
+        if worktree_root:
+            worktree_root.mkdir(parents=True, exist_ok=True)
+        path = Path(tempfile.mkdtemp(prefix="gkd-publish-", dir=worktree_root))
         try:
-            self._checkout_base(base_branch)
-            existing = branch_name in self.repo.heads
-            self.repo.git.checkout("-B", branch_name, base_branch)
+            # worktree add 会修改主仓库的 worktrees 元数据，同一仓库的操作串行执行
+            with _repo_lock(self.repo_path):
+                self.repo.git.worktree("prune")
+                self.repo.git.worktree("add", "--detach", str(path), f"origin/{base_branch}")
         except GitCommandError as e:
-            logger.error(f"创建分支失败: {e}")
-            raise RuntimeError(f"创建分支失败: {e}") from e
+            shutil.rmtree(path, ignore_errors=True)
+            logger.error(f"创建工作树失败: {e}")
+            raise RuntimeError(f"创建工作树失败: {e}") from e
+        logger.info(f"已创建工作树: {path} (origin/{base_branch})")
+        return Repo(path)
 
-        return {
-            "branch": branch_name,
-            "base_branch": base_branch,
-            "created": not existing,
-            "path": str(self.repo_path),
-        }
+    def remove_worktree(self, worktree: Repo):
+        path = worktree.working_tree_dir
+        worktree.close()
+        try:
+            with _repo_lock(self.repo_path):
+                self.repo.git.worktree("remove", "--force", path)
+        except GitCommandError as e:
+            logger.warning(f"删除工作树失败: {e}")
+            shutil.rmtree(path, ignore_errors=True)
 
-    def push_branch(self, branch_name: str) -> dict:
+    def push_head(self, worktree: Repo, branch_name: str) -> dict:
+        """将工作树当前提交推送为远端分支"""
         logger.info(f"推送分支到远程: {branch_name}")
         try:
-            self.repo.git.checkout(branch_name)
-            push_result = self.repo.git.push("--set-upstream", "origin", branch_name)
+            push_result = worktree.git.push("origin", f"HEAD:refs/heads/{branch_name}")
         except GitCommandError as e:
             logger.error(f"推送分支失败: {e}")
             raise RuntimeError(f"推送分支失败: {e}") from e
@@ -59,6 +292,13 @@ class GitHubService:
             "result": push_result,
         }
 
+    def _request(self, method: str, path: str, action: str, **kwargs) -> requests.Response:
+        try:
+            return self.client.request(method, f"{self.repo_api}{path}", **kwargs)
+        except requests.RequestException as e:
+            logger.error(f"请求 GitHub {action}失败: {e}")
+            raise RuntimeError(f"请求 GitHub {action}失败: {e}") from e
+
     def create_pull_request(
         self,
         branch_name: str,
@@ -68,9 +308,6 @@ class GitHubService:
     ) -> dict:
         base_branch = base_branch or Config.GITHUB_MAIN_BRANCH
         owner = Config.GITHUB_OWNER
-        repo_name = Config.GITHUB_REPO
-        api_base = Config.GITHUB_API_BASE.rstrip("/")
-        url = f"{api_base}/repos/{owner}/{repo_name}/pulls"
 
         payload = {
             "title": title or f"{branch_name} -> {base_branch}",
@@ -80,22 +317,34 @@ class GitHubService:
         if body:
             payload["body"] = body
 
-        headers = {
-            "Accept": "application/vnd.github+json",
-            "Authorization": f"Bearer {Config.GITHUB_TOKEN}",
-            "X-GitHub-Api-Version": "2022-11-28",
-        }
-
-        try:
-            resp = requests.post(url, json=payload, headers=headers, timeout=15)
-        except requests.RequestException as e:
-            logger.error(f"请求 GitHub 创建 PR 失败: {e}")
-            raise RuntimeError(f"请求 GitHub 创建 PR 失败: {e}") from e
+        resp = self._request("POST", "/pulls", "创建 PR ", json=payload)
+        if resp.status_code == 422 and "already exists" in resp.text:
+            # 同一分支已有未合并的 PR（例如重试时上一次请求其实已成功），直接沿用
+            existing = self.find_pull_request(branch_name, base_branch)
+            if existing:
+                logger.info(f"分支 {branch_name} 已有 PR #{existing['number']}，沿用该 PR")
+                return existing
         if resp.status_code not in (200, 201):
             logger.error(f"创建 PR 失败: {resp.status_code} - {resp.text}")
             raise RuntimeError(f"创建 PR 失败: {resp.status_code} - {resp.text}")
+        return self._pr_info(resp.json())
+
+    def find_pull_request(self, branch_name: str, base_branch: Optional[str] = None) -> Optional[dict]:
+        """查找分支上未关闭的 PR（条件请求，内容未变化时不消耗限流配额）"""
+        params = {
+            "head": f"{Config.GITHUB_OWNER}:{branch_name}",
+            "base": base_branch or Config.GITHUB_MAIN_BRANCH,
+            "state": "open",
+        }
+        resp = self._request("GET", "/pulls", "查询 PR ", params=params)
+        if resp.status_code != 200:
+            logger.error(f"查询 PR 失败: {resp.status_code} - {resp.text}")
+            raise RuntimeError(f"查询 PR 失败: {resp.status_code} - {resp.text}")
+        pulls = resp.json()
+        return self._pr_info(pulls[0]) if pulls else None
 
-        data = resp.json()
+    @staticmethod
+    def _pr_info(data: dict) -> dict:
         return {
             "html_url": data.get("html_url"),
             "number": data.get("number"),
@@ -108,21 +357,9 @@ class GitHubService:
         workflow = workflow or Config.GITHUB_WORKFLOW_FILE
         owner = Config.GITHUB_OWNER
         repo_name = Config.GITHUB_REPO
-        api_base = Config.GITHUB_API_BASE.rstrip("/")
-        url = f"{api_base}/repos/{owner}/{repo_name}/actions/workflows/{workflow}/dispatches"
-
-        payload = {"ref": ref}
-        headers = {
-            "Accept": "application/vnd.github+json",
-            "Authorization": f"Bearer {Config.GITHUB_TOKEN}",
-            "Content-Type": "application/json",
-        }
 
-        try:
-            resp = requests.post(url, json=payload, headers=headers, timeout=15)
-        except requests.RequestException as e:
-            logger.error(f"请求 GitHub 触发工作流失败: {e}")
-            raise RuntimeError(f"请求 GitHub 触发工作流失败: {e}") from e
+        resp = self._request("POST", f"/actions/workflows/{workflow}/dispatches", "触发工作流",
+                             json={"ref": ref})
         if resp.status_code != 204:
             logger.error(f"触发工作流失败: {resp.status_code} - {resp.text}")
             raise RuntimeError(f"触发工作流失败: {resp.status_code} - {resp.text}")
@@ -141,11 +378,6 @@ class GitHubService:
         commit_title: Optional[str] = None,
         commit_message: Optional[str] = None,
     ) -> dict:
-        owner = Config.GITHUB_OWNER
-        repo_name = Config.GITHUB_REPO
-        api_base = Config.GITHUB_API_BASE.rstrip("/")
-        url = f"{api_base}/repos/{owner}/{repo_name}/pulls/{pr_number}/merge"
-
         payload = {
             "merge_method": merge_method,
         }
@@ -154,21 +386,12 @@ class GitHubService:
         if commit_message:
             payload["commit_message"] = commit_message
 
-        headers = {
-            "Accept": "application/vnd.github+json",
-            "Authorization": f"Bearer {Config.GITHUB_TOKEN}",
-            "X-GitHub-Api-Version": "2022-11-28",
-        }
-
-        try:
-            resp = requests.put(url, json=payload, headers=headers, timeout=15)
-        except requests.RequestException as e:
-            logger.error(f"请求 GitHub 合并 PR 失败: {e}")
-            raise RuntimeError(f"请求 GitHub 合并 PR 失败: {e}") from e
+        resp = self._request("PUT", f"/pulls/{pr_number}/merge", "合并 PR ", json=payload)
         
         if resp.status_code == 200:
             data = resp.json()
             logger.info(f"PR #{pr_number} 合并成功: {data.get('sha')}")
+            self.invalidate_fetch()
             return {
                 "merged": True,
                 "sha": data.get("sha"),
@@ -185,3 +408,13 @@ class GitHubService:
         else:
             logger.error(f"合并 PR 失败: {resp.status_code} - {resp.text}")
             raise RuntimeError(f"合并 PR 失败: {resp.status_code} - {resp.text}")
+
+    def delete_branch(self, branch_name: str) -> bool:
+        """删除远端分支，PR 合并后调用，避免发布分支无限累积；分支已不存在时同样返回 True"""
+        resp = self._request("DELETE", f"/git/refs/heads/{branch_name}", "删除分支 ")
+        # 分支已被删除（如仓库开启了合并后自动删除分支）时返回 422
+        if resp.status_code in (204, 422):
+            logger.info(f"已删除远端分支: {branch_name}")
+            return True
+        logger.warning(f"删除远端分支 {branch_name} 失败: {resp.status_code} - {resp.text}")
+        return False
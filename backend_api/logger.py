@@ -1,8 +1,13 @@
+import atexit
 import logging
 import sys
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from datetime import datetime
+from typing import Dict, List
 import json
+from config import Config
 
 # 创建logs目录
 LOG_DIR = Path("logs")
@@ -54,6 +59,124 @@ def setup_logger():
 # 创建全局logger实例
 logger = setup_logger()
 
+
+class TaskLogWriter:
+    """
+    任务日志的后台写入器
+
+    调用方只把内容追加到内存缓冲区，从不等待磁盘；后台线程按时间间隔或缓冲区大小批量写入，
+    并为活跃任务保持文件句柄。缓冲区总量有上限，磁盘过慢时丢弃新内容并在日志中注明丢弃的字节数
+    """
+
+    def __init__(self, flush_interval: float = None, flush_size: int = None,
+                 max_buffered: int = None, max_open_files: int = None):
+        """
+        Args:
+            flush_interval: 最长写入间隔（秒）
+            flush_size: 缓冲内容达到该字符数时立即写入
+            max_buffered: 缓冲内容的上限（字符数）
+            max_open_files: 同时保持打开的日志文件数
+        """
+        self.flush_interval = flush_interval or Config.TASK_LOG_FLUSH_INTERVAL
+        self.flush_size = flush_size or Config.TASK_LOG_FLUSH_SIZE
+        self.max_buffered = max_buffered or Config.TASK_LOG_MAX_BUFFERED
+        self.max_open_files = max_open_files or Config.TASK_LOG_MAX_OPEN_FILES
+        self._cond = threading.Condition()
+        self._buffers: Dict[str, List[str]] = {}
+        self._buffered = 0
+        self._dropped: Dict[str, int] = {}
+        self._closing = set()  # 写入后需要关闭句柄的任务
+        self._waiters: List[threading.Event] = []
+        self._thread = None
+        # 以下状态只在写入线程中访问
+        self._handles = OrderedDict()  # task_id -> 文件对象
+
+    def write(self, task_id: str, content: str):
+        """追加日志内容，不阻塞调用方"""
+        with self._cond:
+            if self._buffered + len(content) > self.max_buffered:
+                self._dropped[task_id] = self._dropped.get(task_id, 0) + len(content.encode("utf-8"))
+            else:
+                self._buffers.setdefault(task_id, []).append(content)
+                self._buffered += len(content)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="task-log-writer", daemon=True)
+                self._thread.start()
+            if self._buffered >= self.flush_size:
+                self._cond.notify()
+
+    def flush(self, task_id: str = None, close: bool = False, timeout: float = 10) -> bool:
+        """
+        等待已追加的内容写入磁盘
+
+        Args:
+            task_id: 写入后关闭该任务的文件句柄（close 为 True 时）
+            close: 是否关闭句柄，任务结束或将日志文件交给子进程前使用
+
+        Returns:
+            是否在 timeout 内完成
+        """
+        with self._cond:
+            if self._thread is None:
+                return True
+            done = threading.Event()
+            self._waiters.append(done)
+            if close and task_id:
+                self._closing.add(task_id)
+            self._cond.notify()
+        return done.wait(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._waiters and self._buffered < self.flush_size:
+                    self._cond.wait(self.flush_interval)
+                buffers, self._buffers = self._buffers, {}
+                dropped, self._dropped = self._dropped, {}
+                closing, self._closing = self._closing, set()
+                waiters, self._waiters = self._waiters, []
+                self._buffered = 0
+
+            for task_id, chunks in buffers.items():
+                if task_id in dropped:
+                    chunks.append(f"[TaskLogger] {dropped.pop(task_id)} bytes dropped (log writer backlog full)\n")
+                self._write(task_id, "".join(chunks))
+            for task_id, size in dropped.items():
+                self._write(task_id, f"[TaskLogger] {size} bytes dropped (log writer backlog full)\n")
+            for f in self._handles.values():
+                self._flush_handle(f)
+            for task_id in closing:
+                f = self._handles.pop(task_id, None)
+                if f is not None:
+                    f.close()
+            for done in waiters:
+                done.set()
+
+    def _write(self, task_id: str, data: str):
+        try:
+            f = self._handles.get(task_id)
+            if f is None:
+                f = open(TaskLogger.get_task_log_path(task_id), "a", encoding="utf-8")
+                self._handles[task_id] = f
+                if len(self._handles) > self.max_open_files:
+                    self._handles.popitem(last=False)[1].close()
+            else:
+                self._handles.move_to_end(task_id)
+            f.write(data)
+        except Exception as e:
+            logger.error(f"Error writing task log for {task_id}: {str(e)}")
+
+    @staticmethod
+    def _flush_handle(f):
+        try:
+            f.flush()
+        except Exception as e:
+            logger.error(f"Error flushing task log {f.name}: {str(e)}")
+
+
+_task_log_writer = TaskLogWriter()
+atexit.register(_task_log_writer.flush)
+
 class TaskLogger:
     """任务专用的日志记录器"""
     
@@ -90,6 +213,8 @@ class TaskLogger:
     def create_task_log_file(task_id: str, pkg: str, app: str, cmd: str) -> Path:
         """创建任务日志文件并写入初始信息"""
         log_path = TaskLogger.get_task_log_path(task_id)
+        # 先写完之前缓冲的内容并关闭句柄，避免与新文件的内容交错
+        _task_log_writer.flush(task_id, close=True)
         
         with open(log_path, 'w', encoding='utf-8') as f:
             f.write("=" * 80 + "\n")
@@ -104,24 +229,31 @@ class TaskLogger:
     
     @staticmethod
     def append_task_log(task_id: str, content: str):
-        """追加内容到任务日志文件"""
-        log_path = TaskLogger.get_task_log_path(task_id)
-        with open(log_path, 'a', encoding='utf-8') as f:
-            f.write(content)
-            if not content.endswith('\n'):
-                f.write('\n')
+        """追加内容到任务日志文件（写入缓冲区，由后台线程写入磁盘，不阻塞调用方）"""
+        if not content.endswith('\n'):
+            content += '\n'
+        _task_log_writer.write(task_id, content)
+
+    @staticmethod
+    def flush_task_log(task_id: str, timeout: float = 10) -> bool:
+        """
+        将任务日志缓冲区写入磁盘并关闭文件句柄；
+        子进程直接写同一日志文件之前调用，保证内容顺序
+        """
+        return _task_log_writer.flush(task_id, close=True, timeout=timeout)
     
     @staticmethod
     def finalize_task_log(task_id: str, returncode: int, status: str):
         """在任务日志文件末尾写入结束信息"""
-        log_path = TaskLogger.get_task_log_path(task_id)
-        
-        with open(log_path, 'a', encoding='utf-8') as f:
-            f.write("\n" + "=" * 80 + "\n")
-            f.write(f"Ended at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"Status: {status}\n")
-            f.write(f"Return code: {returncode}\n")
-            f.write("=" * 80 + "\n")
+        _task_log_writer.write(
+            task_id,
+            "\n" + "=" * 80 + "\n"
+            f"Ended at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+            f"Status: {status}\n"
+            f"Return code: {returncode}\n"
+            + "=" * 80 + "\n"
+        )
+        TaskLogger.flush_task_log(task_id)
     
     @staticmethod
     def engine_output(task_id: str, line: str):
@@ -0,0 +1,117 @@
+"""
+Prometheus 指标
+
+API 进程通过 /metrics 暴露；独立运行的 worker_main 进程在 Config.WORKER_METRICS_PORT 上单独暴露，
+由 Prometheus 分别抓取。指标不带 task_id 等高基数标签，单个任务的爬取统计保存在任务记录的 crawl_stats 字段中
+"""
+
+import json
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional
+from prometheus_client import Counter, Gauge, Histogram
+from config import Config
+from logger import logger
+
+TASK_QUEUE_WAIT = Histogram(
+    "deviceguard_task_queue_wait_seconds",
+    "Time a task waited in the queue before a device picked it up",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200, 14400),
+)
+TASK_QUEUE_DEPTH = Gauge(
+    "deviceguard_task_queue_depth",
+    "Tasks waiting in the queue (sampled on scrape)",
+)
+STAGE_QUEUE_DEPTH = Gauge(
+    "deviceguard_stage_queue_depth",
+    "Tasks waiting for the GKD matching / GitHub publishing stage (sampled on scrape)",
+    ["stage"],
+)
+TASK_STAGE_DURATION = Histogram(
+    "deviceguard_task_stage_duration_seconds",
+    "Duration of each pipeline stage",
+    ["stage", "result"],
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200),
+)
+TASKS_FINISHED = Counter(
+    "deviceguard_tasks_finished_total",
+    "Tasks that finished, by final status",
+    ["status"],
+)
+REDIS_LATENCY = Histogram(
+    "deviceguard_redis_operation_seconds",
+    "Latency of Redis round trips, by backend operation",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+ADB_LATENCY = Histogram(
+    "deviceguard_adb_command_seconds",
+    "Latency of adb commands, by transport",
+    ["transport"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+DOWNLOAD_BYTES = Counter(
+    "deviceguard_download_bytes_total",
+    "Bytes sent by collected-data downloads",
+)
+DOWNLOAD_DURATION = Histogram(
+    "deviceguard_download_duration_seconds",
+    "Duration of collected-data downloads",
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800),
+)
+CRAWL_EVENTS = Counter(
+    "deviceguard_crawl_events_total",
+    "Crawl counters reported by the poker engine, summed over tasks",
+    ["event"],
+)
+
+# crawl_stats.json 中参与汇总的计数
+CRAWL_COUNTERS = ("steps", "screens", "popups", "restarts")
+CRAWL_STATS_FILE = "crawl_stats.json"
+
+
+@contextmanager
+def observe_redis(operation: str):
+    """统计一次 Redis 往返的耗时，同步和异步代码都可以使用"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        REDIS_LATENCY.labels(operation).observe(time.perf_counter() - start)
+
+
+def observe_stage(stage: str, started: float, success: bool):
+    """记录流水线阶段耗时，started 为阶段开始时的 time.perf_counter()"""
+    TASK_STAGE_DURATION.labels(stage, "success" if success else "failure").observe(time.perf_counter() - started)
+
+
+def count_download(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """包装下载数据流，统计发送的字节数和下载耗时"""
+    start = time.perf_counter()
+    try:
+        for chunk in chunks:
+            DOWNLOAD_BYTES.inc(len(chunk))
+            yield chunk
+    finally:
+        DOWNLOAD_DURATION.observe(time.perf_counter() - start)
+
+
+def read_crawl_stats(task_id: str) -> Optional[Dict[str, int]]:
+    """
+    读取 poker 引擎写入的爬取统计（collectData/<task_id>/crawl_stats.json），
+    计入汇总指标后返回，文件不存在或格式错误时返回 None
+    """
+    stats_path = Path(Config.COLLECTED_BASE_DIR) / task_id / CRAWL_STATS_FILE
+    try:
+        stats = json.loads(stats_path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Invalid crawl stats for task {task_id}: {str(e)}")
+        return None
+    for event in CRAWL_COUNTERS:
+        value = stats.get(event)
+        if isinstance(value, int) and value > 0:
+            CRAWL_EVENTS.labels(event).inc(value)
+    return stats
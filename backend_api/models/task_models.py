@@ -1,23 +1,39 @@
 from pydantic import BaseModel
-from typing import List
+from typing import Dict, List, Optional
 
 class TaskRequest(BaseModel):
     pkg: str
     app: str
+    force: bool = False  # 强制重新采集，不复用相同 APK 之前的结果
 
 class TaskStatusResponse(BaseModel):
     task_id: str
     status: str
     progress: float
     message: str
+    stage: Optional[str] = None
+    device: Optional[str] = None
+    queue_position: Optional[int] = None
+    queue_depth: Optional[int] = None
+    wait_time: Optional[float] = None
+    reused_from: Optional[str] = None
+    devices: Optional[Dict[str, Optional[str]]] = None
 
 class RunTaskRequest(BaseModel):
     pkg: str
     app: str
     timestamp: str
+    force: bool = False  # 强制重新采集，不复用已有任务和相同 APK 之前的结果
 
 class MultipleTaskRequest(BaseModel):
     apps: List[TaskRequest]
 
 class MultipleRunTaskRequest(BaseModel):
     tasks: List[RunTaskRequest]
+
+class BulkStatusRequest(BaseModel):
+    task_ids: List[str] = []
+    pkgs: List[str] = []
+
+class CancelTasksRequest(BaseModel):
+    task_ids: List[str]
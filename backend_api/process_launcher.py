@@ -1,10 +1,17 @@
+import shutil
+import signal
 import subprocess
 import time
 import sys
 import os
+import uuid
 from logger import TaskLogger, logger
 from pathlib import Path
 from config import Config
+from metrics import TASKS_FINISHED, observe_stage, read_crawl_stats
+from crawl_pool import CrawlWorkerPool
+from fake_engine import fake_publish
+from adb_service import ADBAppManager
 
 
 CURRENT_PATH = Path(__file__).parent.parent
@@ -12,17 +19,80 @@ POKER_PATH = CURRENT_PATH / "poker"
 POKER_ENGINE_PATH = CURRENT_PATH / "poker" / "poker_engine.py"
 GKD_PATH = CURRENT_PATH / "GKD_subscription"
 GKD_ENGINE_PATH = CURRENT_PATH / "GKD_subscription" / "run_match_ele.py"
+FAKE_ENGINE_PATH = Path(__file__).parent / "fake_engine.py"  # 压测用的模拟引擎（Config.FAKE_ENGINE）
+GKD_APPS_DIR = "src/apps"  # GKD 仓库中各应用规则文件（<pkg>.ts）所在目录
 PYTHON_EXEC = "python3" if sys.platform != "win32" else "python"
 
+# 每台设备的常驻采集进程
+crawl_pool = CrawlWorkerPool(PYTHON_EXEC, POKER_PATH)
 
-def run_engine_process(task_id, pkg, app, tasks_dict):
-    """主入口函数：依次运行 Poker 和 GKD 任务"""
 
-    if Config.DEBUG_SKIP_POKER:
-        task_id = "99b624e3-e014-43b9-9a59-e68f1d4c5af5" # 固定任务ID用于调试
-    
+def _build_engine_env(serial=None):
+    """构建子进程环境变量，指定设备时通过 ANDROID_SERIAL 让 adb/uiautomator2 绑定到该设备"""
+    env = os.environ.copy()
+    if serial:
+        env["ANDROID_SERIAL"] = serial
+    return env
+
+
+def cancel_requested(task_id, tasks_dict):
+    """任务是否已被请求取消（由取消接口写入任务记录的 cancel_requested 字段）"""
+    return bool(tasks_dict[task_id].get("cancel_requested"))
+
+
+def kill_process_tree(pid):
+    """终止进程及其启动的所有子进程（引擎以新会话启动，进程组 ID 即其 PID）"""
+    try:
+        if sys.platform == "win32":
+            subprocess.run(["taskkill", "/T", "/F", "/PID", str(pid)], capture_output=True)
+        else:
+            os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _wait_engine(proc, task_id, tasks_dict):
+    """等待引擎子进程结束，期间定期检查取消请求，任务被取消时终止整个进程树"""
+    while True:
+        try:
+            proc.wait(timeout=Config.TASK_CANCEL_POLL_INTERVAL)
+            return
+        except subprocess.TimeoutExpired:
+            pass
+        if cancel_requested(task_id, tasks_dict):
+            logger.info(f"Task {task_id} - Cancel requested, killing engine process tree {proc.pid}")
+            kill_process_tree(proc.pid)
+            proc.wait()
+            return
+
+
+def _debug_task_id(task_id):
+    # 调试开关：跳过 Poker 时使用固定任务ID，复用已有的采集数据
+    return "99b624e3-e014-43b9-9a59-e68f1d4c5af5" if Config.DEBUG_SKIP_POKER else task_id
+
+
+def run_engine_process(task_id, pkg, app, tasks_dict, serial=None):
+    """在当前线程中依次运行 Poker、GKD 和 GitHub 三个阶段（调试用，正常流程由各阶段队列分别执行）"""
+    try:
+        if run_crawl_stage(task_id, pkg, app, tasks_dict, serial=serial) and \
+                run_match_stage(task_id, pkg, app, tasks_dict):
+            run_publish_stage([(_debug_task_id(task_id), pkg, app)], tasks_dict)
+    finally:
+        finish_task(task_id, tasks_dict)
+
+
+def run_crawl_stage(task_id, pkg, app, tasks_dict, serial=None):
+    """
+    采集阶段：在设备上运行 Poker 引擎
+
+    Returns:
+        是否需要继续执行 GKD 匹配阶段；返回 False 时调用方应结束任务（finish_task）
+    """
+    task_id = _debug_task_id(task_id)
+
     # 更新任务状态
     tasks_dict[task_id]["status"] = "running"
+    tasks_dict[task_id]["stage"] = "poker"
     tasks_dict[task_id]["message"] = "Engine started"
     tasks_dict[task_id]["progress"] = 0.0
 
@@ -38,62 +108,192 @@ def run_engine_process(task_id, pkg, app, tasks_dict):
             tasks_dict[task_id]["progress"] = 0.5
         else:
             # 执行 Poker 任务
-            poker_success = run_poker_task(task_id, pkg, app, tasks_dict)
-        
-        # Poker 任务成功后，执行 GKD 任务
-        gkd_success = False
-        if poker_success and GKD_ENGINE_PATH and GKD_ENGINE_PATH.exists():
-            logger.info(f"Task {task_id} - Poker task completed, starting GKD task")
-            try:
-                gkd_success = run_gkd_task(task_id, pkg, app, tasks_dict)
-            except Exception as e:
-                logger.error(f"Task {task_id} - GKD task failed: {str(e)}")
-                TaskLogger.append_task_log(task_id, f"[GKD] Error: {str(e)}")
-            
-        if poker_success and gkd_success:
-            logger.info(f"Task {task_id} - Poker and GKD completed, starting GitHub task")
-            TaskLogger.append_task_log(task_id, f"[GitHub] Starting GitHub task...")
-
-            try:
-                github_result = run_github_task(
-                    Config.GKD_REPO_PATH,
-                    Config.GITHUB_MAIN_BRANCH,
-                    Config.GITHUB_REMOTE_BRANCH_NAME
-                )
-                
-                if github_result["status"] == "completed":
-                    logger.info(f"Task {task_id} - GitHub task completed successfully")
-                    TaskLogger.append_task_log(task_id, f"[GitHub] Task completed successfully")
-                    TaskLogger.append_task_log(task_id, f"[GitHub] PR: {github_result.get('pr', {}).get('url', 'N/A')}")
-                    tasks_dict[task_id]["message"] = "All tasks completed (Poker + GKD + GitHub)"
-                    tasks_dict[task_id]["github_result"] = github_result
-                elif github_result["status"] == "skipped":
-                    logger.info(f"Task {task_id} - GitHub task skipped: {github_result.get('reason', 'unknown')}")
-                    TaskLogger.append_task_log(task_id, f"[GitHub] Skipped: {github_result.get('reason', 'unknown')}")
-                    tasks_dict[task_id]["message"] = "Poker and GKD completed (GitHub skipped)"
-                    
-            except Exception as e:
-                error_text = str(e)
-                logger.error(f"Task {task_id} - GitHub task failed: {error_text}")
-                TaskLogger.append_task_log(task_id, f"[GitHub] Error: {error_text}")
-                # GitHub 失败不影响整体任务状态，因为 Poker 和 GKD 已成功
-                tasks_dict[task_id]["message"] = f"Poker and GKD completed, but GitHub failed: {error_text}"
-        else:
-            logger.info(f"Task {task_id} - Skipping GitHub task (prerequisite tasks not successful)")
+            started = time.perf_counter()
+            poker_success = run_poker_task(task_id, pkg, app, tasks_dict, serial=serial)
+            observe_stage("poker", started, poker_success)
+            crawl_stats = read_crawl_stats(task_id)
+            if crawl_stats:
+                tasks_dict[task_id]["crawl_stats"] = crawl_stats
+
+        if poker_success and (Config.FAKE_ENGINE or GKD_ENGINE_PATH and GKD_ENGINE_PATH.exists()):
+            logger.info(f"Task {task_id} - Poker task completed, queued for GKD task")
+            tasks_dict[task_id]["stage"] = "gkd_queued"
+            return True
+        return False
+
+    except Exception as e:
+        _fail_task(task_id, tasks_dict, e)
+        return False
+
+
+def reuse_crawl_result(task_id, pkg, app, source, tasks_dict):
+    """
+    复用相同 APK 之前的完成结果，代替采集、匹配和发布三个阶段：
+    采集数据目录链接到来源任务的目录，规则已由来源任务生成并发布
+
+    Args:
+        source: 来源任务的结果记录 {"task_id", "version_code", "crawl_stats", "github_result"}
+
+    Returns:
+        是否复用成功；来源任务的采集数据已不存在时返回 False，调用方应正常采集
+    """
+    source_task_id = source["task_id"]
+    base_dir = Path(Config.COLLECTED_BASE_DIR)
+    source_dir = base_dir / source_task_id
+    if not source_dir.is_dir():
+        logger.info(f"Task {task_id} - Collected data of task {source_task_id} is gone, crawling again")
+        return False
+
+    target_dir = base_dir / task_id
+    if not target_dir.exists():
+        try:
+            # 使用相对路径的符号链接，采集数据目录整体移动后仍然有效
+            os.symlink(source_task_id, target_dir, target_is_directory=True)
+        except OSError:
+            # 不支持符号链接（如 Windows 未授权）时复制
+            shutil.copytree(source_dir, target_dir)
+
+    message = f"Reused results of task {source_task_id} (APK unchanged)"
+    log_path = TaskLogger.create_task_log_file(task_id, pkg, app, f"reuse {source_task_id}")
+    tasks_dict[task_id]["log_file"] = str(log_path)
+    TaskLogger.append_task_log(task_id, f"[REUSE] {message}, collected data linked to {source_dir}")
+    logger.info(f"Task {task_id} - {message}")
+
+    tasks_dict[task_id]["reused_from"] = source_task_id
+    if source.get("crawl_stats"):
+        tasks_dict[task_id]["crawl_stats"] = source["crawl_stats"]
+    if source.get("github_result"):
+        tasks_dict[task_id]["github_result"] = source["github_result"]
+    tasks_dict[task_id]["status"] = "completed"
+    tasks_dict[task_id]["progress"] = 1.0
+    tasks_dict[task_id]["message"] = message
+    return True
+
+
+def run_match_stage(task_id, pkg, app, tasks_dict):
+    """
+    匹配阶段：对采集数据运行 GKD 规则匹配
+
+    Returns:
+        是否需要继续执行 GitHub 发布阶段；返回 False 时调用方应结束任务（finish_task）
+    """
+    task_id = _debug_task_id(task_id)
+    tasks_dict[task_id]["stage"] = "gkd"
+    gkd_success = False
+    started = time.perf_counter()
+    try:
+        gkd_success = run_gkd_task(task_id, pkg, app, tasks_dict)
+    except Exception as e:
+        logger.error(f"Task {task_id} - GKD task failed: {str(e)}")
+        TaskLogger.append_task_log(task_id, f"[GKD] Error: {str(e)}")
+    observe_stage("gkd", started, gkd_success)
+    # 匹配结果记入任务，只有匹配成功的任务才会登记为可复用的 APK 结果
+    tasks_dict[task_id]["match_status"] = "completed" if gkd_success else "failed"
+
+    if gkd_success:
+        logger.info(f"Task {task_id} - Poker and GKD completed, queued for GitHub task")
+        tasks_dict[task_id]["stage"] = "github_queued"
+    else:
+        logger.info(f"Task {task_id} - Skipping GitHub task (prerequisite tasks not successful)")
+    return gkd_success
+
+
+def run_publish_stage(tasks, tasks_dict):
+    """
+    发布阶段：将一批任务在 GKD 仓库中生成的改动合并为一次提交/PR/工作流，推送到 GitHub 并合并
+
+    Args:
+        tasks: [(task_id, pkg, app), ...]，同一时间窗口内完成匹配的任务
+        tasks_dict: 按 task_id 访问各任务状态
+    """
+    task_ids = [task_id for task_id, _, _ in tasks]
+    logger.info(f"Tasks {task_ids} - Starting GitHub task")
+    for task_id in task_ids:
+        TaskLogger.append_task_log(task_id, f"[GitHub] Starting GitHub task ({len(tasks)} tasks in batch)...")
+        tasks_dict[task_id]["stage"] = "github"
 
+    started = time.perf_counter()
+    try:
+        if Config.FAKE_ENGINE:
+            github_result = fake_publish(tasks)
+        else:
+            github_result = run_github_task(
+                Config.GKD_REPO_PATH,
+                Config.GITHUB_MAIN_BRANCH,
+                Config.GITHUB_REMOTE_BRANCH_NAME,
+                tasks=tasks,
+            )
+        observe_stage("github", started, github_result["status"] != "failed")
     except Exception as e:
         error_text = str(e)
-        tasks_dict[task_id]["status"] = "failed"
-        tasks_dict[task_id]["message"] = error_text
-        TaskLogger.task_failed(task_id, error_text)
+        observe_stage("github", started, False)
+        logger.error(f"Tasks {task_ids} - GitHub task failed: {error_text}")
+        for task_id in task_ids:
+            TaskLogger.append_task_log(task_id, f"[GitHub] Error: {error_text}")
+            # GitHub 失败不影响整体任务状态，因为 Poker 和 GKD 已成功
+            tasks_dict[task_id]["message"] = f"Poker and GKD completed, but GitHub failed: {error_text}"
+            tasks_dict[task_id]["github_result"] = {"status": "failed", "error": error_text}
+        return
+
+    changed = github_result.get("tasks", {})
+    for task_id in task_ids:
+        if github_result["status"] == "completed" and changed.get(task_id):
+            pr_url = github_result.get("pr", {}).get("html_url", "N/A")
+            logger.info(f"Task {task_id} - GitHub task completed successfully")
+            TaskLogger.append_task_log(task_id, f"[GitHub] Task completed successfully")
+            TaskLogger.append_task_log(task_id, f"[GitHub] PR: {pr_url}")
+            tasks_dict[task_id]["message"] = "All tasks completed (Poker + GKD + GitHub)"
+            tasks_dict[task_id]["github_result"] = {**github_result, "tasks": task_ids}
+        else:
+            reason = github_result.get("reason") or "no changes for this app"
+            logger.info(f"Task {task_id} - GitHub task skipped: {reason}")
+            TaskLogger.append_task_log(task_id, f"[GitHub] Skipped: {reason}")
+            tasks_dict[task_id]["message"] = "Poker and GKD completed (GitHub skipped)"
+            if github_result["status"] == "failed":
+                tasks_dict[task_id]["github_result"] = {"status": "failed", "error": reason}
+            else:
+                tasks_dict[task_id]["github_result"] = {"status": "skipped", "reason": reason}
+
 
+def finish_task(task_id, tasks_dict):
+    """流水线结束（任一阶段失败或全部完成）时调用，由最后执行的阶段负责"""
+    task_id = _debug_task_id(task_id)
+    # 先写完日志再通知进度订阅者流程已结束，跟随日志的连接据此停止
+    TaskLogger.flush_task_log(task_id)
+    TASKS_FINISHED.labels(tasks_dict[task_id].get("status") or "unknown").inc()
+    tasks_dict[task_id]["stage"] = "done"
 
-def run_poker_task(task_id, pkg, app, tasks_dict):
+
+def _fail_task(task_id, tasks_dict, error):
+    error_text = str(error)
+    tasks_dict[task_id]["status"] = "failed"
+    tasks_dict[task_id]["message"] = error_text
+    TaskLogger.task_failed(task_id, error_text)
+
+
+def warm_crawl_worker(serial=None):
+    """设备接入时提前启动其常驻采集进程（调度器的 on_device_start）"""
+    if crawl_pool.supported() and not Config.FAKE_ENGINE and not Config.DEBUG_SKIP_POKER:
+        crawl_pool.warm([serial])
+
+
+def stop_crawl_worker(serial=None):
+    """设备断开后结束其常驻采集进程（调度器的 on_device_stop）"""
+    crawl_pool.stop(serial)
+
+
+def run_poker_task(task_id, pkg, app, tasks_dict, serial=None):
     """运行 Poker 引擎任务"""
     try:
+        engine_path, engine_cwd = POKER_ENGINE_PATH, POKER_PATH
+        if Config.FAKE_ENGINE:
+            engine_path, engine_cwd = FAKE_ENGINE_PATH, FAKE_ENGINE_PATH.parent
+        use_pool = crawl_pool.supported() and not Config.FAKE_ENGINE
+
         cmd = [
             PYTHON_EXEC,
-            str(POKER_ENGINE_PATH),
+            str(engine_path),
+            *(["crawl"] if Config.FAKE_ENGINE else []),
             "--pkg",
             pkg,
             "--app",
@@ -102,28 +302,49 @@ def run_poker_task(task_id, pkg, app, tasks_dict):
             task_id
         ]
 
-        cmd_str = ' '.join(cmd)
-        logger.info(f"Task {task_id} - Executing Poker: {cmd_str}")
+        if use_pool:
+            cmd_str = f"crawl_worker (device {serial or 'default'}) --pkg {pkg} --app {app} --task_id {task_id}"
+        else:
+            cmd_str = ' '.join(cmd)
+        logger.info(f"Task {task_id} - Executing Poker on device {serial or 'default'}: {cmd_str}")
         
         # 创建任务日志文件
         log_path = TaskLogger.create_task_log_file(task_id, pkg, app, cmd_str)
         tasks_dict[task_id]["log_file"] = str(log_path)
         logger.info(f"Task {task_id} - Log file: {log_path}")
 
-        # 启动进程，输出重定向到日志文件
-        with open(log_path, 'a', encoding='utf-8') as log_file:
-            proc = subprocess.Popen(
-                cmd,
-                cwd=str(POKER_PATH),
-                stdout=log_file,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
-            )
+        if use_pool:
+            # 交给设备的常驻采集进程执行，省去解释器启动、模块导入和模型加载
+            returncode = crawl_pool.run(serial, pkg, app, task_id, log_path,
+                                        cancelled=lambda: cancel_requested(task_id, tasks_dict))
+        else:
+            # 启动进程，输出重定向到日志文件；引擎以 shell 启动 run_task.py，
+            # 使用新会话使其所有子孙进程同属一个进程组，取消时可以一并终止
+            with open(log_path, 'a', encoding='utf-8') as log_file:
+                proc = subprocess.Popen(
+                    cmd,
+                    cwd=str(engine_cwd),
+                    stdout=log_file,
+                    stderr=subprocess.STDOUT,
+                    text=True,
+                    bufsize=1,
+                    env=_build_engine_env(serial),
+                    start_new_session=True,
+                )
+
+            _wait_engine(proc, task_id, tasks_dict)
+            returncode = proc.returncode
 
-        stdout, stderr = proc.communicate()
+        if cancel_requested(task_id, tasks_dict):
+            if not use_pool and not Config.FAKE_ENGINE:
+                # 常驻采集进程结束任务时会自行停止应用
+                ADBAppManager.force_stop_app(pkg, serial)
+            logger.info(f"Task {task_id} - Poker task cancelled")
+            TaskLogger.append_task_log(task_id, "[CANCEL] Poker task cancelled, engine terminated")
+            tasks_dict[task_id]["message"] = "Task cancelled"
+            return False
 
-        if proc.returncode == 0:
+        if returncode == 0:
             tasks_dict[task_id]["status"] = "completed"
             tasks_dict[task_id]["message"] = "Poker task finished"
             tasks_dict[task_id]["progress"] = 1.0
@@ -131,14 +352,14 @@ def run_poker_task(task_id, pkg, app, tasks_dict):
             # 记录任务完成
             result = {
                 "status": "completed",
-                "returncode": proc.returncode,
+                "returncode": returncode,
                 "message": tasks_dict[task_id]["message"],
             }
             TaskLogger.task_completed(task_id, result)
             return True
         else:
             tasks_dict[task_id]["status"] = "failed"
-            error_msg = (stderr.strip() if stderr else None) or "Poker process failed"
+            error_msg = "Poker process failed"
             tasks_dict[task_id]["message"] = error_msg
             tasks_dict[task_id]["progress"] = tasks_dict[task_id].get("progress", 0.0)
 
@@ -163,7 +384,7 @@ def run_gkd_task(task_id, pkg, app, tasks_dict):
     TaskLogger.append_task_log(task_id, f"[GKD] Message: Running GKD task...")
     
     try:
-        script_path = GKD_ENGINE_PATH
+        script_path = FAKE_ENGINE_PATH if Config.FAKE_ENGINE else GKD_ENGINE_PATH
         if not script_path or not script_path.exists():
             error_msg = f"GKD script not found: {script_path}"
             logger.error(f"Task {task_id} - {error_msg}")
@@ -173,11 +394,12 @@ def run_gkd_task(task_id, pkg, app, tasks_dict):
             TaskLogger.task_failed(task_id, error_msg)
             return False
         
-        working_dir = str(GKD_PATH) if GKD_PATH else str(script_path.parent)
+        working_dir = str(GKD_PATH) if GKD_PATH and not Config.FAKE_ENGINE else str(script_path.parent)
         
         cmd = [
             PYTHON_EXEC,
             str(script_path),
+            *(["match"] if Config.FAKE_ENGINE else []),
             task_id,
         ]
         
@@ -188,6 +410,8 @@ def run_gkd_task(task_id, pkg, app, tasks_dict):
         log_path = tasks_dict[task_id].get("log_file")
         if not log_path:
             log_path = TaskLogger.create_task_log_file(task_id, pkg, app, cmd_str)
+        # 子进程直接写日志文件，先写完缓冲区中的内容
+        TaskLogger.flush_task_log(task_id)
         
         with open(log_path, 'a', encoding='utf-8') as log_file:
             log_file.write(f"\n{'='*60}\n")
@@ -202,9 +426,15 @@ def run_gkd_task(task_id, pkg, app, tasks_dict):
                 stderr=subprocess.STDOUT,
                 text=True,
                 bufsize=1,
+                start_new_session=True,
             )
         
-        cli_stdout, cli_stderr = cli_proc.communicate()
+        _wait_engine(cli_proc, task_id, tasks_dict)
+        if cancel_requested(task_id, tasks_dict):
+            logger.info(f"Task {task_id} - GKD task cancelled")
+            TaskLogger.append_task_log(task_id, "[CANCEL] GKD task cancelled")
+            tasks_dict[task_id]["message"] = "Task cancelled"
+            return False
         
         with open(log_path, 'a', encoding='utf-8') as log_file:
             log_file.write(f"\n{'='*60}\n")
@@ -218,7 +448,7 @@ def run_gkd_task(task_id, pkg, app, tasks_dict):
             tasks_dict[task_id]["message"] = "Poker and GKD completed"
             return True
         else:
-            error_msg = (cli_stderr.strip() if cli_stderr else None) or f"GKD task failed with return code {cli_proc.returncode}"
+            error_msg = f"GKD task failed with return code {cli_proc.returncode}"
             logger.warning(f"Task {task_id} - GKD task failed: {error_msg}")
             TaskLogger.append_task_log(task_id, f"[GKD] Failed: {error_msg}")
             tasks_dict[task_id]["message"] = f"Poker completed, but GKD failed: {error_msg}"
@@ -234,42 +464,125 @@ def run_gkd_task(task_id, pkg, app, tasks_dict):
         return False
 
 
-def run_github_task(repo_path, base_branch, remote_branch):
+def _batch_paths(changed, tasks):
     """
-    GitHub任务：检查仓库状态 -> 有改动则提交到远端分支 -> 创建 PR -> 触发主分支流水线
+    本批次需要提交的文件：批次内各应用的规则文件，以及 src/apps 之外的共享文件；
+    其他任务（尚在匹配或排在下一批）生成的规则文件留给它们自己的批次
+
+    Returns:
+        (路径列表, {task_id: 该任务的规则文件是否有改动})
     """
-    from github_service import GitHubService
+    task_changed = {}
+    paths = [path for path in changed if not path.startswith(f"{GKD_APPS_DIR}/")]
+    for task_id, pkg, _ in tasks:
+        app_path = f"{GKD_APPS_DIR}/{pkg}.ts"
+        task_changed[task_id] = app_path in changed
+        if task_changed[task_id] and app_path not in paths:
+            paths.append(app_path)
+    return sorted(paths), task_changed
+
+
+def _batch_commit_message(remote_branch, tasks, task_changed):
+    lines = [f"chore: sync updates for {remote_branch} ({sum(task_changed.values())} apps)", ""]
+    for task_id, pkg, app in tasks:
+        if task_changed.get(task_id):
+            lines.append(f"- {pkg} {app} (task {task_id})")
+    return "\n".join(lines)
+
+
+def _published_blobs(worktree, paths):
+    """发布提交中各文件的 blob，已删除的文件为 None"""
+    blobs = {}
+    tree = worktree.head.commit.tree
+    for path in paths:
+        try:
+            blobs[path] = (tree / path).hexsha
+        except KeyError:
+            blobs[path] = None
+    return blobs
+
+
+def _copy_paths(source_dir, target_dir, paths):
+    """将主仓库工作区中的改动复制到发布工作树，源文件已删除时同样删除目标文件"""
+    for path in paths:
+        source = Path(source_dir) / path
+        target = Path(target_dir) / path
+        if source.exists():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(source, target)
+        else:
+            target.unlink(missing_ok=True)
+
+
+def run_github_task(repo_path, base_branch, remote_branch, tasks=None):
+    """
+    GitHub任务：检查仓库状态 -> 在独立工作树中提交改动并推送到远端分支 -> 创建 PR -> 触发主分支流水线
+
+    GKD 匹配生成的改动位于 repo_path 的工作区；每次发布先将主仓库同步到最新的 origin/<base_branch>
+    （保留尚未发布的改动，已合并的改动不再显示为改动），再基于它创建独立的工作树
+    （共享对象库，fetch 在多次发布间复用），只把本次要发布的文件复制进去提交，
+    推送到带时间戳的分支 <remote_branch>-<时间>，因此多次发布可以并行。
+
+    tasks 为 [(task_id, pkg, app), ...] 时只提交这批任务的规则文件（以及共享文件），
+    一次提交/PR/工作流覆盖整批任务，提交信息和 PR 描述中列出各任务；结果的 tasks 字段记录各任务是否有改动
+    """
+    from github_service import GitHubService, changed_paths
 
     service = GitHubService(repo_path)
     repo = service.repo
 
-    # 1) 无改动则直接返回
+    # 1) 主仓库同步到最新的基准分支，无改动则直接返回
+    service.fetch_base(base_branch)
+    service.sync_checkout(base_branch)
     if not repo.is_dirty(untracked_files=True):
         logger.info("GitHub task skipped: no changes in working tree")
         return {"status": "skipped", "reason": "no changes"}
 
+    changed = changed_paths(repo)
+    task_changed = {}
+    if tasks:
+        paths, task_changed = _batch_paths(changed, tasks)
+        if not paths:
+            logger.info("GitHub task skipped: no changes for this batch")
+            return {"status": "skipped", "reason": "no changes", "tasks": task_changed}
+    else:
+        paths = sorted(changed)
+
+    # 2) 基于最新的基准分支创建工作树
+    worktree = service.create_worktree(base_branch)
     try:
-        # 2) 切换/创建工作分支
-        branch_info = service.create_branch(remote_branch, base_branch)
-
-        # 3) 暂存并提交
-        logger.info("Staging all changes for commit")
-        repo.git.add(all=True)
-        logger.info("All changes staged")
-        staged_diff = repo.index.diff("HEAD")
-        logger.info(f"Staged changes: {staged_diff}")
-        if not staged_diff:
+        branch_name = f"{remote_branch}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        branch_info = {
+            "branch": branch_name,
+            "base_branch": base_branch,
+            "created": True,
+            "path": worktree.working_tree_dir,
+        }
+
+        # 3) 复制改动、暂存并提交
+        _copy_paths(repo_path, worktree.working_tree_dir, paths)
+        logger.info(f"Staging {len(paths)} changed files in worktree {worktree.working_tree_dir}")
+        worktree.git.add("--all", "--", *paths)
+        staged_paths = {diff.a_path for diff in worktree.index.diff("HEAD")}
+        logger.info(f"Staged changes: {sorted(staged_paths)}")
+        if tasks:
+            # 与远端相同（已经发布过）的规则文件不算本次改动
+            task_changed = {task_id: f"{GKD_APPS_DIR}/{pkg}.ts" in staged_paths for task_id, pkg, _ in tasks}
+        if not staged_paths:
             logger.info("GitHub task skipped: nothing to commit after add")
-            return {"status": "skipped", "reason": "nothing to commit"}
+            result = {"status": "skipped", "reason": "nothing to commit"}
+            if tasks:
+                result["tasks"] = task_changed
+            return result
 
-        commit_msg = f"chore: sync updates for {remote_branch}"
-        # repo.index.commit(commit_msg)
-        # logger.info(f"Committed changes with message: {commit_msg}")
+        if tasks:
+            commit_msg = _batch_commit_message(remote_branch, tasks, task_changed)
+        else:
+            commit_msg = f"chore: sync updates for {remote_branch}"
         try:
-            repo.index.commit(commit_msg)
+            worktree.index.commit(commit_msg)
             logger.info(f"Committed changes with message: {commit_msg}")
         except Exception as e:
-            # if 'UnicodeDecodeError' in str(e):
             # 如果遇到编码错误，使用 subprocess 直接调用 git
             logger.warning(f"GitPython commit failed with encoding error, trying subprocess")
             result = subprocess.run(
@@ -277,25 +590,24 @@ def run_github_task(repo_path, base_branch, remote_branch):
                 capture_output=True,
                 encoding='gbk',  # Windows 中文环境使用 GBK
                 errors='ignore',  # 忽略无法解码的字符
-                cwd=repo_path
+                cwd=worktree.working_tree_dir
             )
             if result.returncode != 0:
                 logger.error(f"Git commit failed: {result.stderr}")
                 raise Exception(f"Git commit failed: {result.stderr}")
             logger.info(f"Committed changes with subprocess: {commit_msg}")
-            # else:
-            #     raise
 
-        # 4) 推送分支（若远端不存在会创建）
-        push_info = service.push_branch(remote_branch)
-        logger.info(f"Pushed branch {remote_branch} to remote")
+        # 4) 推送分支
+        push_info = service.push_head(worktree, branch_name)
+        logger.info(f"Pushed branch {branch_name} to remote")
 
         # 5) 创建 PR
-        pr_title = f"{remote_branch} -> {base_branch}"
+        pr_title = f"{branch_name} -> {base_branch}"
         pr_info = service.create_pull_request(
-            branch_name=remote_branch,
+            branch_name=branch_name,
             base_branch=base_branch,
             title=pr_title,
+            body=commit_msg.partition("\n\n")[2] or None,
         )
         logger.info(f"Created PR: {pr_info}")
 
@@ -315,6 +627,13 @@ def run_github_task(repo_path, base_branch, remote_branch):
             
             if merge_info.get("merged"):
                 logger.info(f"Successfully merged PR #{pr_number}, SHA: {merge_info.get('sha')}")
+                # 下次同步主仓库时，这些文件的本地改动视为已发布
+                service.record_published(_published_blobs(worktree, staged_paths))
+                # 发布分支已合并，不再需要
+                try:
+                    merge_info["branch_deleted"] = service.delete_branch(branch_name)
+                except RuntimeError:
+                    merge_info["branch_deleted"] = False
             else:
                 logger.warning(f"PR #{pr_number} could not be merged: {merge_info.get('reason')}")
                 # 可以选择抛出异常或继续
@@ -331,9 +650,14 @@ def run_github_task(repo_path, base_branch, remote_branch):
             "workflow": workflow_info,
             "merge": merge_info,
         }
+        if tasks:
+            result["tasks"] = task_changed
         logger.info(f"GitHub task completed: {result}")
         return result
 
     except Exception as e:
         logger.error(f"GitHub task failed: {e}")
         raise
+
+    finally:
+        service.remove_worktree(worktree)
@@ -0,0 +1,77 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from config import Config
+
+
+class TaskRecordCache:
+    """
+    进程内的任务记录缓存（读穿透）
+
+    缓存项由 TaskEventHub 收到的变更事件就地更新，订阅连接中断后整体清空，
+    因此多个 API 进程各自缓存也能与 Redis 保持一致；所有方法都只在 API 事件循环中调用
+    """
+
+    def __init__(self, max_size: int = None, max_age: float = None):
+        """
+        Args:
+            max_size: 最多缓存的任务数，超出时淘汰最久未访问的任务
+            max_age: 缓存项的最长保存时间（秒），用于兜底清理已过期或被删除的任务
+        """
+        self.max_size = max_size or Config.TASK_STATUS_CACHE_SIZE
+        self.max_age = max_age or Config.TASK_STATUS_CACHE_TTL
+        self._records: "OrderedDict[str, tuple]" = OrderedDict()  # task_id -> (缓存时间, 任务记录)
+        self._seq = 0  # 收到的事件计数
+        self._cleared_seq = 0  # 最近一次整体清空时的事件计数
+        self._fetching: Dict[str, int] = {}  # 正在从 Redis 读取的任务 -> 并发读取数
+        self._touched: Dict[str, int] = {}  # 读取期间收到事件的任务 -> 最近事件计数
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        item = self._records.get(task_id)
+        if item is None:
+            return None
+        cached_at, task_data = item
+        if time.monotonic() - cached_at > self.max_age:
+            del self._records[task_id]
+            return None
+        self._records.move_to_end(task_id)
+        return task_data
+
+    def begin_fetch(self, task_id: str) -> int:
+        """从 Redis 读取任务记录前调用，返回值传给 end_fetch"""
+        self._fetching[task_id] = self._fetching.get(task_id, 0) + 1
+        return self._seq
+
+    def end_fetch(self, task_id: str, token: int, task_data: Optional[Dict[str, Any]]):
+        """
+        保存读取到的任务记录；读取期间收到过该任务的事件或缓存被清空时不保存，
+        避免旧数据覆盖事件带来的更新
+        """
+        count = self._fetching.pop(task_id) - 1
+        if count:
+            self._fetching[task_id] = count
+        touched = self._touched.get(task_id, 0) if count else self._touched.pop(task_id, 0)
+        if task_data is None or touched > token or self._cleared_seq > token:
+            return
+        self._records[task_id] = (time.monotonic(), task_data)
+        self._records.move_to_end(task_id)
+        if len(self._records) > self.max_size:
+            self._records.popitem(last=False)
+
+    def on_event(self, task_id: Optional[str], event: Optional[dict]):
+        """TaskEventHub 的监听回调；event 为 None 表示订阅连接曾中断"""
+        self._seq += 1
+        if event is None:
+            self._records.clear()
+            self._cleared_seq = self._seq
+            return
+        if task_id in self._fetching:
+            self._touched[task_id] = self._seq
+        item = self._records.get(task_id)
+        if item is not None:
+            item[1].update(event.get("fields", {}))
+
+    def clear(self):
+        self._records.clear()
+        self._seq += 1
+        self._cleared_seq = self._seq
@@ -0,0 +1,132 @@
+import asyncio
+import json
+from typing import Callable, Dict, List, Optional, Set
+import redis.asyncio as aioredis
+from logger import logger
+
+
+class TaskEventHub:
+    """
+    任务事件分发中心
+
+    每个 API 进程只占用一个 Redis 订阅连接（PSUBSCRIBE <prefix>*），收到的事件按任务 ID
+    分发给本进程内的各个推送连接；多个 API 副本各自订阅，即可同时向各自的客户端推送同一事件
+    """
+
+    def __init__(self, redis_client: aioredis.Redis, prefix: str, queue_size: int = 100):
+        """
+        Args:
+            redis_client: asyncio 客户端
+            prefix: 任务事件频道前缀，频道名为 <prefix><task_id>
+            queue_size: 每个订阅者缓存的最大事件数，消费过慢时丢弃最旧的事件
+        """
+        self.redis_client = redis_client
+        self.prefix = prefix
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._listeners: List[Callable[[Optional[str], Optional[dict]], None]] = []
+        self._listener: Optional[asyncio.Task] = None
+        self._ready: Optional[asyncio.Event] = None
+
+    async def subscribe(self, task_id: str, timeout: float = 5) -> asyncio.Queue:
+        """
+        订阅任务事件，返回接收事件的队列；返回时订阅连接已生效，之后发布的事件不会丢失。
+        队列中的 None 表示订阅连接曾经中断，期间的事件可能丢失，订阅者应重新读取完整状态
+        """
+        self._ensure_listener()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(task_id, set()).add(queue)
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+        except BaseException:
+            self.unsubscribe(task_id, queue)
+            raise
+        return queue
+
+    def unsubscribe(self, task_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(task_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[task_id]
+
+    def add_listener(self, callback: Callable[[Optional[str], Optional[dict]], None]):
+        """
+        注册接收所有任务事件的回调 callback(task_id, event)；
+        订阅连接中断后重新连上时以 (None, None) 调用，表示期间的事件可能丢失
+        """
+        self._listeners.append(callback)
+
+    @property
+    def connected(self) -> bool:
+        """订阅连接是否已生效"""
+        return self._ready is not None and self._ready.is_set()
+
+    def start(self):
+        """在当前事件循环中启动订阅（已启动时无操作）"""
+        self._ensure_listener()
+
+    def _ensure_listener(self):
+        # 监听任务绑定在首次订阅时的事件循环上
+        if self._listener is None or self._listener.done():
+            self._ready = asyncio.Event()
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        reconnected = False
+        while True:
+            pubsub = self.redis_client.pubsub()
+            try:
+                await pubsub.psubscribe(f"{self.prefix}*")
+                async for message in pubsub.listen():
+                    if message["type"] == "psubscribe":
+                        # redis-py 断线后会自动重连并重新订阅，再次收到订阅确认同样说明期间的事件可能丢失
+                        if reconnected or self._ready.is_set():
+                            self._broadcast(None)
+                        self._ready.set()
+                    elif message["type"] == "pmessage":
+                        self._dispatch(message["channel"], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Task event listener error, reconnecting: {str(e)}")
+                self._ready.clear()
+                self._notify_listeners(None, None)
+                reconnected = True
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    def _dispatch(self, channel: str, data: str):
+        task_id = channel[len(self.prefix):]
+        queues = self._subscribers.get(task_id)
+        if not queues and not self._listeners:
+            return
+        try:
+            event = json.loads(data)
+        except ValueError:
+            logger.warning(f"Dropping malformed event on {channel}")
+            return
+        self._notify_listeners(task_id, event)
+        for queue in queues or ():
+            self._put(queue, event)
+
+    def _notify_listeners(self, task_id: Optional[str], event: Optional[dict]):
+        for callback in self._listeners:
+            try:
+                callback(task_id, event)
+            except Exception as e:
+                logger.error(f"Task event listener callback error: {str(e)}")
+
+    def _broadcast(self, event):
+        self._notify_listeners(None, event)
+        for queues in self._subscribers.values():
+            for queue in queues:
+                self._put(queue, event)
+
+    @staticmethod
+    def _put(queue: asyncio.Queue, event):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
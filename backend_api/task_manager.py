@@ -1,16 +1,126 @@
-import tempfile
+import asyncio
+import time
 import uuid
 import os
 import json
-import threading
-from typing import Dict, Any, Optional
-from fastapi.responses import FileResponse
-from pydantic import FilePath
+from typing import Dict, Any, List, Optional, Tuple
+from pathlib import Path
+from urllib.parse import quote
+from fastapi.responses import StreamingResponse
 import redis
-from logger import logger, TaskLogger
-from process_launcher import run_engine_process
+import redis.asyncio as aioredis
+from logger import logger, TaskLogger, TASK_LOG_DIR
+from process_launcher import (
+    run_crawl_stage, run_match_stage, run_publish_stage, finish_task, reuse_crawl_result, cancel_requested,
+    warm_crawl_worker, stop_crawl_worker
+)
 from config import Config
-from file_utils import create_zip_from_folder, cleanup_tmp_files
+from file_utils import (
+    iter_zip_from_folder, scan_folder, manifest_cursor, parse_manifest_cursor, file_sha256,
+    read_file_range, tail_offset
+)
+from device_scheduler import DeviceScheduler, QueueFullError, StageWorkerPool
+from task_queue import RedisTaskQueue
+from task_events import TaskEventHub
+from task_cache import TaskRecordCache
+from adb_service import ADBAppManager
+from metrics import TASK_QUEUE_WAIT, TASKS_FINISHED, count_download, observe_redis
+
+
+# 仅当任务存在时更新字段并刷新 TTL，避免为已过期/删除的任务创建残缺记录；
+# 更新成功后向任务事件频道发布本次变更的字段
+UPDATE_TASK_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 3))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('PUBLISH', KEYS[2], ARGV[2])
+return 1
+"""
+
+# 批量查找包名对应的任务，同时清理指向已过期任务的索引
+LOOKUP_PKG_SCRIPT = """
+local result = {}
+for i, key in ipairs(KEYS) do
+    local task_id = redis.call('GET', key)
+    if task_id and redis.call('EXISTS', ARGV[1] .. task_id) == 1 then
+        result[i] = task_id
+    else
+        if task_id then
+            redis.call('DEL', key)
+        end
+        result[i] = false
+    end
+end
+return result
+"""
+# 批量读取任务记录：task_id 直接给出，或通过包名索引解析
+BULK_FETCH_SCRIPT = """
+local task_ids = {}
+local pkg_task_ids = {}
+for i = 2, #ARGV do
+    task_ids[#task_ids + 1] = ARGV[i]
+end
+for i, key in ipairs(KEYS) do
+    local task_id = redis.call('GET', key)
+    pkg_task_ids[i] = task_id
+    if task_id then
+        task_ids[#task_ids + 1] = task_id
+    end
+end
+local records = {}
+for i, task_id in ipairs(task_ids) do
+    records[i] = redis.call('HGETALL', ARGV[1] .. task_id)
+end
+return {pkg_task_ids, task_ids, records}
+"""
+
+# 取消任务：排队中的任务直接标记为已取消（采集队列中的条目同时删除）；
+# 执行中的任务只写入 cancel_requested，由执行它的 worker 终止进程后标记为已取消。
+# 返回 not_found / finished / cancelled / cancelling
+CANCEL_TASK_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 'not_found'
+end
+local record = redis.call('HMGET', KEYS[1], 'status', 'stage', 'stream_id')
+local status = record[1] and cjson.decode(record[1])
+local stage = record[2] and cjson.decode(record[2])
+if stage == 'done' or (not stage and (status == 'completed' or status == 'failed' or status == 'cancelled')) then
+    return 'finished'
+end
+local fields
+local result
+if status == 'queued' or stage == 'gkd_queued' or stage == 'github_queued' then
+    if status == 'queued' and record[3] then
+        redis.call('XDEL', KEYS[3], cjson.decode(record[3]))
+    end
+    fields = {status = 'cancelled', stage = 'done', message = 'Task cancelled', cancel_requested = true}
+    result = 'cancelled'
+else
+    fields = {cancel_requested = true, message = 'Cancelling...'}
+    result = 'cancelling'
+end
+for field, value in pairs(fields) do
+    redis.call('HSET', KEYS[1], field, cjson.encode(value))
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('PUBLISH', KEYS[2], cjson.encode({task_id = ARGV[2], fields = fields, ts = tonumber(ARGV[3])}))
+return result
+"""
+
+# 任务列表返回的字段
+TASK_LIST_FIELDS = ["pkg", "app", "status", "stage", "progress", "queued_at"]
+# 单页最多检查的索引项数量（带过滤条件时），保证单次请求的开销有上限
+TASK_LIST_MAX_SCAN = 1000
+
+
+def parse_task_cursor(cursor: str) -> Tuple[float, str]:
+    """解析任务列表游标（"queued_at:task_id"），格式错误时抛出 ValueError"""
+    score, sep, task_id = cursor.partition(":")
+    if not sep or not task_id:
+        raise ValueError(f"Invalid task list cursor: {cursor}")
+    return float(score), task_id
 
 
 class TaskManager:
@@ -26,8 +136,48 @@ class TaskManager:
                 retry_on_timeout=True
             )
             self.redis_client.ping()
+            # asyncio 客户端供 API 事件循环使用，连接池满时排队等待而不是报错
+            self.async_redis = aioredis.Redis(
+                connection_pool=aioredis.BlockingConnectionPool.from_url(
+                    self.redis_url,
+                    decode_responses=True,
+                    socket_timeout=5,
+                    socket_connect_timeout=5,
+                    retry_on_timeout=True,
+                    max_connections=Config.REDIS_MAX_CONNECTIONS,
+                    timeout=5
+                )
+            )
             self.task_prefix = "task:"
             self.pkg_index_prefix = "pkg_index:"  # 用于包名到task_id的映射
+            self.events_prefix = "task_events:"  # 任务进度发布频道
+            self.task_index_key = "task_index"  # 按提交时间排序的任务索引（ZSET，score 为 queued_at）
+            self.apk_result_prefix = "apk_result:"  # (包名, APK 内容哈希) 到完成结果的映射，用于跳过重复采集
+            self._update_script = self.redis_client.register_script(UPDATE_TASK_SCRIPT)
+            self._lookup_pkg_script = self.async_redis.register_script(LOOKUP_PKG_SCRIPT)
+            self._bulk_fetch_script = self.async_redis.register_script(BULK_FETCH_SCRIPT)
+            self._cancel_script = self.async_redis.register_script(CANCEL_TASK_SCRIPT)
+            self.task_queue = RedisTaskQueue(self.redis_client, self.async_redis)
+            self.scheduler = DeviceScheduler(
+            self._run_task_wrapper, self.task_queue,
+            on_device_start=warm_crawl_worker, on_device_stop=stop_crawl_worker,
+        )
+            # 采集完成后依次转入 GKD 匹配和 GitHub 发布队列，各阶段独立并发
+            self.match_queue = RedisTaskQueue(self.redis_client, self.async_redis, stream=Config.MATCH_STREAM)
+            self.publish_queue = RedisTaskQueue(self.redis_client, self.async_redis, stream=Config.PUBLISH_STREAM)
+            self.stage_pools = {
+                "match": StageWorkerPool("match", self._run_match_wrapper, self.match_queue, Config.MATCH_WORKERS),
+                # 时间窗口内完成匹配的任务合并为一次提交/PR/工作流
+                "publish": StageWorkerPool("publish", self._run_publish_batch, self.publish_queue,
+                                           Config.PUBLISH_WORKERS, batch_size=Config.PUBLISH_BATCH_SIZE,
+                                           batch_window=Config.PUBLISH_BATCH_WINDOW),
+            }
+            self.event_hub = TaskEventHub(self.async_redis, self.events_prefix)
+            # 状态查询优先读取进程内缓存，缓存由任务事件就地更新
+            self.record_cache = TaskRecordCache()
+            self.event_hub.add_listener(self.record_cache.on_event)
+            self._stats_cache = None  # (缓存时间, 队列统计信息, {stream_id: 排队位置})
+            self._backfill_task_index()
             logger.info(f"TaskManager initialized with Redis at {self.redis_url}")
         except redis.ConnectionError as e:
             logger.error(f"Failed to connect to Redis: {str(e)}")
@@ -37,31 +187,147 @@ class TaskManager:
             logger.error(f"Error initializing TaskManager: {str(e)}")
             raise
         
-    def get_task_collected_data(self, task_id):
-        collect_data_path = FilePath(Config.COLLECTED_BASE_DIR) / task_id
-        if not collect_data_path.exists():
+    def _collected_data_path(self, task_id) -> Optional[Path]:
+        base_dir = Path(Config.COLLECTED_BASE_DIR).resolve()
+        collect_data_path = (base_dir / task_id).resolve()
+        # task_id 只能指向基础目录下的一级子目录
+        if collect_data_path.parent != base_dir or not collect_data_path.is_dir():
             logger.error(f"Task collected data not found for task ID: {task_id}")
-        
-        if not collect_data_path.is_dir():
-            logger.error(f"Task collected data is not a directory for task ID: {task_id}")
-        
-        if not any(collect_data_path.iterdir()):
-            logger.error(f"Task collected data is empty for task ID: {task_id}")
+            return None
+        return collect_data_path
 
-        tmp_dir = tempfile.mkdtemp()
-        zip_filename = f"task_{task_id}.zip"
-        zip_path = os.path.join(tmp_dir, zip_filename)
+    def get_task_collected_data(self, task_id, cursor: str = None):
+        """
+        以流式 ZIP 返回任务收集的数据，边压缩边发送，不落地临时文件
 
-        try:
-            create_zip_from_folder(str(collect_data_path), zip_path)
-            return FileResponse(
-                path=zip_path,
-                filename=zip_filename,
-                media_type="application/zip",
-                background=cleanup_tmp_files(zip_path, tmp_dir)
-            )
-        except Exception as e:
-            logger.error(f"Error creating zip file for task {task_id}: {str(e)}")
+        Args:
+            cursor: 清单游标，指定时只打包游标之后新增或修改的文件
+
+        Returns:
+            StreamingResponse，响应头 X-Manifest-Cursor 为下次增量下载使用的游标；
+            数据目录不存在时返回 None
+        """
+        collect_data_path = self._collected_data_path(task_id)
+        if collect_data_path is None:
+            return None
+
+        if cursor:
+            entries = scan_folder(collect_data_path, parse_manifest_cursor(cursor))
+            paths = [entry["path"] for entry in entries]
+            next_cursor = manifest_cursor(entries[-1]) if entries else cursor
+        else:
+            entries = scan_folder(collect_data_path)
+            paths = None
+            next_cursor = manifest_cursor(entries[-1]) if entries else ""
+
+        suffix = "_delta" if cursor else ""
+        zip_filename = f"task_{task_id}{suffix}.zip"
+        return StreamingResponse(
+            count_download(iter_zip_from_folder(str(collect_data_path), paths)),
+            media_type="application/zip",
+            headers={
+                "Content-Disposition": f'attachment; filename="{zip_filename}"',
+                "X-Manifest-Cursor": quote(next_cursor),
+            }
+        )
+
+    def get_collected_manifest(self, task_id, cursor: str = None, limit: int = 1000):
+        """
+        列出任务收集的文件清单（路径、大小、sha256、修改时间），按修改时间排序分页
+
+        Args:
+            cursor: 上一页或上次同步返回的游标，只列出其后新增或修改的文件
+            limit: 本页最多返回的文件数
+
+        Returns:
+            {"task_id", "entries", "cursor", "has_more"}，数据目录不存在时返回 None
+        """
+        collect_data_path = self._collected_data_path(task_id)
+        if collect_data_path is None:
+            return None
+
+        entries = scan_folder(collect_data_path, parse_manifest_cursor(cursor) if cursor else None)
+        page = entries[:limit]
+        for entry in page:
+            entry["sha256"] = file_sha256(collect_data_path / entry["path"], entry["size"], entry["mtime_ns"])
+
+        return {
+            "task_id": task_id,
+            "entries": page,
+            "cursor": manifest_cursor(page[-1]) if page else cursor,
+            "has_more": len(entries) > limit
+        }
+
+    def _task_log_path(self, task_id) -> Optional[Path]:
+        log_path = TaskLogger.get_task_log_path(task_id).resolve()
+        # task_id 不能指向日志目录之外的文件
+        if log_path.parent != TASK_LOG_DIR.resolve() or not log_path.is_file():
+            return None
+        return log_path
+
+    def get_task_log(self, task_id, offset: int = None, length: int = None, tail: int = 100):
+        """
+        读取任务日志的一段内容，只读取所需范围，不加载整个文件
+
+        Args:
+            offset: 起始字节位置；未指定时返回最后 tail 行
+            length: 最多读取的字节数；未指定 offset 时读取最后 tail 行中末尾的 length 字节
+
+        Returns:
+            {"task_id", "offset", "next_offset", "size", "content"}，next_offset 用于继续读取；
+            日志文件不存在时返回 None
+        """
+        log_path = self._task_log_path(task_id)
+        if log_path is None:
+            return None
+        length = length or Config.TASK_LOG_MAX_RANGE
+        size = log_path.stat().st_size
+        if offset is None:
+            # 行数范围超过 length 时保留末尾部分，不返回中间一段过期内容
+            offset = max(size - length, tail_offset(log_path, tail))
+        data, next_offset = read_file_range(log_path, offset, length)
+        return {
+            "task_id": task_id,
+            "offset": offset,
+            "next_offset": next_offset,
+            "size": log_path.stat().st_size,
+            "content": data.decode("utf-8", "replace")
+        }
+
+    async def afollow_task_log(self, task_id, offset: int):
+        """
+        从 offset 开始持续产出任务日志的新增内容，任务结束且内容读完后停止
+
+        Yields:
+            日志内容（bytes）
+        """
+        log_path = self._task_log_path(task_id)
+        if log_path is None:
+            # 日志文件在读取首段内容后被删除（如任务被清理），直接结束流
+            return
+
+        async def read_next(offset):
+            try:
+                return await asyncio.to_thread(read_file_range, log_path, offset, Config.TASK_LOG_MAX_RANGE)
+            except FileNotFoundError:
+                return None, offset
+
+        while True:
+            data, offset = await read_next(offset)
+            if data is None:
+                return
+            if data:
+                yield data
+                continue
+            # 引擎结束时会先写完日志再将阶段置为 done，此后不会再有新内容
+            status = await self.aget_status(task_id)
+            if status.get("status") in ("not_found", "error") or status.get("stage") == "done":
+                data, offset = await read_next(offset)
+                if data:
+                    yield data
+                    continue
+                return
+            await asyncio.sleep(Config.TASK_LOG_POLL_INTERVAL)
 
     def find_task_by_package(self, pkg: str) -> Optional[str]:
         """
@@ -79,8 +345,7 @@ class TaskManager:
             
             if task_id:
                 # 验证任务是否仍然存在
-                task_data = self._get_task(task_id)
-                if task_data:
+                if self.redis_client.exists(f"{self.task_prefix}{task_id}"):
                     logger.debug(f"Found task {task_id} for package {pkg}")
                     return task_id
                 else:
@@ -94,6 +359,26 @@ class TaskManager:
             logger.error(f"Error finding task by package {pkg}: {str(e)}")
             return None
 
+    async def afind_task_by_package(self, pkg: str) -> Optional[str]:
+        """find_task_by_package 的异步版本"""
+        try:
+            index_key = f"{self.pkg_index_prefix}{pkg}"
+            task_id = await self.async_redis.get(index_key)
+            
+            if task_id:
+                if await self.async_redis.exists(f"{self.task_prefix}{task_id}"):
+                    logger.debug(f"Found task {task_id} for package {pkg}")
+                    return task_id
+                else:
+                    await self.async_redis.delete(index_key)
+                    logger.warning(f"Task {task_id} expired for package {pkg}, cleaned up index")
+            
+            return None
+            
+        except Exception as e:
+            logger.error(f"Error finding task by package {pkg}: {str(e)}")
+            return None
+
     def _save_pkg_index(self, pkg: str, task_id: str):
         """
         保存包名到 task_id 的映射索引
@@ -105,108 +390,676 @@ class TaskManager:
         try:
             index_key = f"{self.pkg_index_prefix}{pkg}"
             # 使用与任务相同的 TTL
-            self.redis_client.setex(index_key, self.task_ttl, task_id)
+            self.redis_client.set(index_key, task_id, ex=self.task_ttl)
             logger.debug(f"Saved package index: {pkg} -> {task_id}")
             return True
         except Exception as e:
             logger.error(f"Error saving package index for {pkg}: {str(e)}")
             return False
 
-    def submit_task(self, pkg, app, timestamp: str = None):
-        """提交任务：生成 task_id，初始化任务状态并启动后台线程"""
+    def _add_index_commands(self, pipe, task_data: Dict[str, Any]):
+        """向 pipeline 追加新任务的包名索引和时间索引"""
+        pipe.set(f"{self.pkg_index_prefix}{task_data['pkg']}", task_data["task_id"], ex=self.task_ttl)
+        pipe.zadd(self.task_index_key, {task_data["task_id"]: task_data["queued_at"]})
+        # 任务记录在最后一次更新后 TTL 过期，任务运行时间远小于 TTL，更早的索引项必然已失效
+        pipe.zremrangebyscore(self.task_index_key, "-inf", f"({task_data['queued_at'] - 2 * self.task_ttl}")
+
+    def _backfill_task_index(self):
+        """为时间索引建立之前提交的任务补充索引项；使用 SCAN 分批遍历，不会阻塞 Redis"""
+        if self.redis_client.exists(self.task_index_key):
+            return
+        count = 0
+        cursor = 0
+        while True:
+            cursor, keys = self.redis_client.scan(cursor, match=f"{self.task_prefix}*", count=1000, _type="hash")
+            if keys:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for key in keys:
+                    pipe.hget(key, "queued_at")
+                scores = {
+                    key[len(self.task_prefix):]: json.loads(queued_at) if queued_at else time.time()
+                    for key, queued_at in zip(keys, pipe.execute())
+                }
+                self.redis_client.zadd(self.task_index_key, scores)
+                count += len(scores)
+            if cursor == 0:
+                break
+        if count:
+            logger.info(f"Backfilled task index with {count} existing tasks")
+
+    def _new_task_data(self, pkg, app, timestamp: str = None, force: bool = False) -> Dict[str, Any]:
+        task_id = str(uuid.uuid4())
+        task_data = {
+            "task_id": task_id,
+            "pkg": pkg,
+            "app": app,
+            "status": "queued",
+            "stage": "queued",
+            "progress": 0.0,
+            "message": "Waiting...",
+            "log_file": None,
+            "queued_at": time.time()
+        }
+        
+        # 如果提供了时间戳，也保存
+        if timestamp:
+            task_data["timestamp"] = timestamp
+        # 强制重新采集，不复用相同 APK 之前的结果
+        if force:
+            task_data["force"] = True
+        return task_data
+
+    def submit_task(self, pkg, app, timestamp: str = None, force: bool = False):
+        """提交任务：生成 task_id，初始化任务状态并加入设备调度队列"""
         try:
-            task_id = str(uuid.uuid4())
-            task_data = {
-                "task_id": task_id,
-                "pkg": pkg,
-                "app": app,
-                "status": "queued",
-                "progress": 0.0,
-                "message": "Waiting...",
-                "log_file": None
-            }
-            
-            # 如果提供了时间戳，也保存
-            if timestamp:
-                task_data["timestamp"] = timestamp
+            task_data = self._new_task_data(pkg, app, timestamp, force)
+            task_id = task_data["task_id"]
 
-            self._save_task(task_id, task_data)
-            # 保存包名索引
-            self._save_pkg_index(pkg, task_id)
+            # 入队的同时保存任务记录
+            key = f"{self.task_prefix}{task_id}"
+            self.scheduler.submit(task_id, pkg, app, key, encode_task_fields(task_data), self.task_ttl)
+            # 保存包名索引和时间索引
+            pipe = self.redis_client.pipeline(transaction=False)
+            self._add_index_commands(pipe, task_data)
+            pipe.execute()
             
             # 使用 TaskLogger 记录任务提交
             TaskLogger.task_submitted(task_id, pkg, app)
 
-            t = threading.Thread(
-                target=self._run_task_wrapper,
-                args=(task_id, pkg, app),
-                daemon=True,
-            )
-            t.start()
             logger.info(f"Task {task_id} submitted and saved to Redis")
             return task_id
 
+        except QueueFullError as e:
+            logger.warning(f"Task rejected for package {pkg}: {str(e)}")
+            raise
+        except Exception as e:
+            logger.error(f"Error in submit_task: {str(e)}")
+            TaskLogger.task_failed("unknown", str(e))
+            raise
+
+    async def asubmit_task(self, pkg, app, timestamp: str = None, force: bool = False):
+        """submit_task 的异步版本，供 API 事件循环使用"""
+        try:
+            task_data = self._new_task_data(pkg, app, timestamp, force)
+            task_id = task_data["task_id"]
+
+            key = f"{self.task_prefix}{task_id}"
+            await self.scheduler.asubmit(task_id, pkg, app, key, encode_task_fields(task_data), self.task_ttl)
+            pipe = self.async_redis.pipeline(transaction=False)
+            self._add_index_commands(pipe, task_data)
+            await pipe.execute()
+            
+            TaskLogger.task_submitted(task_id, pkg, app)
+
+            logger.info(f"Task {task_id} submitted and saved to Redis")
+            return task_id
+
+        except QueueFullError as e:
+            logger.warning(f"Task rejected for package {pkg}: {str(e)}")
+            raise
         except Exception as e:
             logger.error(f"Error in submit_task: {str(e)}")
             TaskLogger.task_failed("unknown", str(e))
             raise
 
+    async def asubmit_tasks(self, tasks: List[Tuple[str, str, Optional[str], bool]]) -> List[Dict[str, Any]]:
+        """
+        批量提交任务：已有任务的包名直接复用（force 为 True 时除外），其余任务入队；
+        查重和入队各只需一次 Redis 往返，耗时与批量大小基本无关
+
+        Args:
+            tasks: [(pkg, app, timestamp, force)]
+
+        Returns:
+            与 tasks 顺序一致的 [{"task_id", "is_new", "error"}]，error 为 None 表示成功
+        """
+        pkgs = list(dict.fromkeys(pkg for pkg, _, _, _ in tasks))
+        pipe = self.async_redis.pipeline(transaction=False)
+        await self._lookup_pkg_script(
+            keys=[f"{self.pkg_index_prefix}{pkg}" for pkg in pkgs],
+            args=[self.task_prefix],
+            client=pipe
+        )
+        self.task_queue.add_stats_commands(pipe)
+        with observe_redis("submit_lookup"):
+            found, *stats_results = await pipe.execute()
+        task_by_pkg = {pkg: task_id for pkg, task_id in zip(pkgs, found) if task_id}
+        capacity = self.scheduler.maxsize - self.task_queue.parse_stats(stats_results)["queue_depth"]
+
+        results = []
+        new_tasks = []  # (task_data, results 中引用该任务的下标)
+        new_task_index = {}
+        pipe = self.async_redis.pipeline(transaction=False)
+        for pkg, app, timestamp, force in tasks:
+            task_id = task_by_pkg.get(pkg)
+            if force and task_id not in new_task_index:
+                # 强制重新采集时不复用已有任务，同一批次中重复的包名仍共用本批次创建的任务
+                task_id = None
+            if task_id:
+                # 同一批次中重复的包名复用本批次创建的任务
+                if task_id in new_task_index:
+                    new_tasks[new_task_index[task_id]][1].append(len(results))
+                results.append({"task_id": task_id, "is_new": False, "error": None})
+                continue
+            if len(new_tasks) >= capacity:
+                results.append({
+                    "task_id": None,
+                    "is_new": False,
+                    "error": f"Task queue is full ({self.scheduler.maxsize} tasks waiting)"
+                })
+                continue
+
+            task_data = self._new_task_data(pkg, app, timestamp, force)
+            task_id = task_data["task_id"]
+            key = f"{self.task_prefix}{task_id}"
+            await self.task_queue.aadd_enqueue_command(
+                pipe, task_id, pkg, app, key, encode_task_fields(task_data), self.task_ttl
+            )
+            self._add_index_commands(pipe, task_data)
+            task_by_pkg[pkg] = task_id
+            new_task_index[task_id] = len(new_tasks)
+            new_tasks.append((task_data, [len(results)]))
+            results.append({"task_id": task_id, "is_new": True, "error": None})
+
+        if new_tasks:
+            with observe_redis("submit_enqueue"):
+                replies = await pipe.execute(raise_on_error=False)
+            commands_per_task = len(replies) // len(new_tasks)
+            for i, (task_data, result_indexes) in enumerate(new_tasks):
+                task_replies = replies[commands_per_task * i:commands_per_task * (i + 1)]
+                error = next((r for r in task_replies if isinstance(r, Exception)), None)
+                if error is None:
+                    TaskLogger.task_submitted(task_data["task_id"], task_data["pkg"], task_data["app"])
+                    continue
+                logger.error(f"Error submitting task for package {task_data['pkg']}: {str(error)}")
+                for index in result_indexes:
+                    results[index] = {"task_id": None, "is_new": False, "error": str(error)}
+
+        logger.info(f"Bulk submitted {len(tasks)} tasks, {len(new_tasks)} new")
+        return results
+
+    async def acancel_tasks(self, task_ids: List[str]) -> Dict[str, str]:
+        """
+        取消任务，整批只需一次 Redis 往返：排队中的任务立即取消，不再占用设备；
+        执行中的任务由 worker 在 Config.TASK_CANCEL_POLL_INTERVAL 内终止引擎进程树、停止应用并释放设备
+
+        Returns:
+            {task_id: "cancelled" | "cancelling" | "finished" | "not_found"}
+        """
+        task_ids = list(dict.fromkeys(task_ids))
+        pipe = self.async_redis.pipeline(transaction=False)
+        now = time.time()
+        for task_id in task_ids:
+            await self._cancel_script(
+                keys=[f"{self.task_prefix}{task_id}", f"{self.events_prefix}{task_id}", self.task_queue.stream],
+                args=[self.task_ttl, task_id, now],
+                client=pipe
+            )
+        with observe_redis("cancel"):
+            results = await pipe.execute()
+        results = dict(zip(task_ids, results))
+        cancelled = [task_id for task_id, result in results.items() if result == "cancelled"]
+        if cancelled:
+            TASKS_FINISHED.labels("cancelled").inc(len(cancelled))
+        for task_id in cancelled:
+            TaskLogger.append_task_log(task_id, "[CANCEL] Task cancelled before execution")
+        logger.info(f"Cancel requested for {len(task_ids)} tasks: {results}")
+        return results
+
     def get_status(self, task_id):
         """查询任务状态"""
         try:
-            task_data = self._get_task(task_id)
+            # 任务记录和队列统计信息在一次往返中取回
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.hgetall(f"{self.task_prefix}{task_id}")
+            self.task_queue.add_stats_commands(pipe)
+            fields, *stats_results = pipe.execute()
 
-            if task_data is None:
+            if not fields:
                 logger.warning(f"Task {task_id} not found in Redis")
-                return {
-                    "status": "not_found",
-                    "progress": 0,
-                    "message": "Unknown task"
-                }
+                return self._not_found_status()
             
+            task_data = decode_task_fields(fields)
+            stats = self.task_queue.parse_stats(stats_results)
+            status = self._build_status(task_data, stats)
+
+            # 排队中的任务额外查询排队位置
+            id_range = self._position_range(task_data, stats)
+            if id_range:
+                entries = self.redis_client.xrange(
+                    self.task_queue.stream, min=id_range[0], max=id_range[1],
+                    count=Config.TASK_QUEUE_MAXSIZE
+                )
+                status["queue_position"] = len(entries)
+
             TaskLogger.status_queried(task_id)
-            return {
-                "task_id": task_data.get("task_id"),
-                "pkg": task_data.get("pkg"),
-                "app": task_data.get("app"),
-                "status": task_data.get("status"),
-                "progress": task_data.get("progress", 0),
-                "message": task_data.get("message", ""),
-                "log_file": task_data.get("log_file")
-            }
+            return status
         
         except Exception as e:
             logger.error(f"Error getting status for task {task_id}: {str(e)}")
-            return {
-                "status": "error",
-                "progress": 0,
-                "message": f"Error retrieving task status: {str(e)}"
-            }
-        
-    def _run_task_wrapper(self, task_id, pkg, app):
+            return self._error_status(e)
+
+    async def aget_status(self, task_id):
+        """
+        get_status 的异步版本，供 API 事件循环使用；
+        任务记录读自进程内缓存，队列统计信息最多缓存 TASK_STATS_CACHE_TTL 秒，热点轮询不访问 Redis
+        """
         try:
-            task_proxy = RedisTaskDict(self, task_id)
-            run_engine_process(task_id, pkg, app, task_proxy)
+            task_data = await self._aget_task_record(task_id)
+            if task_data is None:
+                logger.warning(f"Task {task_id} not found in Redis")
+                return self._not_found_status()
 
+            stats, positions = await self._aget_queue_stats()
+            status = self._build_status(task_data, stats)
+
+            id_range = self._position_range(task_data, stats)
+            if id_range:
+                stream_id = task_data["stream_id"]
+                if stream_id not in positions:
+                    entries = await self.async_redis.xrange(
+                        self.task_queue.stream, min=id_range[0], max=id_range[1],
+                        count=Config.TASK_QUEUE_MAXSIZE
+                    )
+                    positions[stream_id] = len(entries)
+                status["queue_position"] = positions[stream_id]
+
+            TaskLogger.status_queried(task_id)
+            return status
+        
         except Exception as e:
-            logger.error(f"Error in task wrapper for {task_id}: {str(e)}")
+            logger.error(f"Error getting status for task {task_id}: {str(e)}")
+            return self._error_status(e)
+
+    async def _aget_task_record(self, task_id) -> Optional[Dict[str, Any]]:
+        """读取任务记录，订阅连接生效时经过进程内缓存"""
+        self.event_hub.start()
+        if not self.event_hub.connected:
+            with observe_redis("get_task"):
+                fields = await self.async_redis.hgetall(f"{self.task_prefix}{task_id}")
+            return decode_task_fields(fields) if fields else None
+
+        task_data = self.record_cache.get(task_id)
+        if task_data is None:
+            token = self.record_cache.begin_fetch(task_id)
+            try:
+                with observe_redis("get_task"):
+                    fields = await self.async_redis.hgetall(f"{self.task_prefix}{task_id}")
+                task_data = decode_task_fields(fields) if fields else None
+            finally:
+                self.record_cache.end_fetch(task_id, token, task_data)
+        # 调用方会修改返回值，缓存中的记录只能由事件更新
+        return dict(task_data) if task_data is not None else None
+
+    async def _aget_queue_stats(self):
+        """返回 (队列统计信息, 排队位置缓存)，两者在 TASK_STATS_CACHE_TTL 内共用"""
+        now = time.monotonic()
+        if self._stats_cache is None or now - self._stats_cache[0] > Config.TASK_STATS_CACHE_TTL:
+            pipe = self.async_redis.pipeline(transaction=False)
+            self.task_queue.add_stats_commands(pipe)
+            with observe_redis("queue_stats"):
+                stats = self.task_queue.parse_stats(await pipe.execute())
+            self._stats_cache = (now, stats, {})
+        return self._stats_cache[1], self._stats_cache[2]
+
+    async def aget_statuses(self, task_ids: List[str] = None, pkgs: List[str] = None) -> Dict[str, Any]:
+        """
+        批量查询任务状态：任务记录、包名索引和队列统计信息在一次 Redis 往返中取回，
+        仅当其中有排队中的任务时再用一次 XRANGE 计算所有排队位置
+
+        Args:
+            task_ids: 任务ID列表
+            pkgs: 包名列表，按包名索引查询对应的任务
+
+        Returns:
+            {"tasks": {task_id: 状态}, "packages": {pkg: task_id，没有任务时为 None}}；
+            不存在的任务状态为 not_found
+        """
+        task_ids = list(dict.fromkeys(task_ids or []))
+        pkgs = list(dict.fromkeys(pkgs or []))
+        pipe = self.async_redis.pipeline(transaction=False)
+        await self._bulk_fetch_script(
+            keys=[f"{self.pkg_index_prefix}{pkg}" for pkg in pkgs],
+            args=[self.task_prefix, *task_ids],
+            client=pipe
+        )
+        self.task_queue.add_stats_commands(pipe)
+        with observe_redis("bulk_status"):
+            (pkg_task_ids, fetched_ids, records), *stats_results = await pipe.execute()
+        stats = self.task_queue.parse_stats(stats_results)
+
+        tasks = {}
+        stream_ids = {}
+        for task_id, record in zip(fetched_ids, records):
+            if task_id in tasks:
+                continue
+            if not record:
+                tasks[task_id] = self._not_found_status()
+                continue
+            task_data = decode_task_fields(dict(zip(record[::2], record[1::2])))
+            tasks[task_id] = self._build_status(task_data, stats)
+            if self._position_range(task_data, stats):
+                stream_ids[task_data["stream_id"]] = task_id
+
+        if stream_ids:
+            positions = await self.task_queue.aqueue_positions(list(stream_ids), stats["last_delivered"])
+            for stream_id, position in positions.items():
+                tasks[stream_ids[stream_id]]["queue_position"] = position
+
+        logger.debug(f"Bulk status query - Tasks: {len(task_ids)}, Packages: {len(pkgs)}")
+        return {
+            "tasks": tasks,
+            "packages": {pkg: task_id or None for pkg, task_id in zip(pkgs, pkg_task_ids)},
+        }
+
+    async def astream_events(self, task_id, keepalive: float = None):
+        """
+        订阅任务进度：先产出一次完整状态，之后逐条产出字段变更，任务结束后停止；
+        长时间没有事件时产出 ping 用于保持连接
+
+        Yields:
+            (event, data)，event 为 status（完整状态）、update（变更字段）或 ping
+        """
+        keepalive = keepalive or Config.TASK_EVENT_KEEPALIVE
+        # 先订阅再读取状态，保证两者之间发生的变更不会丢失
+        queue = await self.event_hub.subscribe(task_id)
+        try:
+            status = await self.aget_status(task_id)
+            yield "status", status
+            if status.get("status") in ("not_found", "error") or self._is_finished(status):
+                return
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield "ping", None
+                    continue
+
+                if event is None:
+                    # 订阅连接中断过，重新推送完整状态
+                    status = await self.aget_status(task_id)
+                    yield "status", status
+                    if self._is_finished(status):
+                        return
+                    continue
+
+                yield "update", event
+                if event["fields"].get("stage") == "done":
+                    return
+        finally:
+            self.event_hub.unsubscribe(task_id, queue)
+
+    @staticmethod
+    def _is_finished(status: Dict[str, Any]) -> bool:
+        stage = status.get("stage")
+        if stage is not None:
+            return stage == "done"
+        # 早期创建的任务没有 stage 字段
+        return status.get("status") in ("completed", "failed")
+
+    @staticmethod
+    def _not_found_status():
+        return {
+            "status": "not_found",
+            "progress": 0,
+            "message": "Unknown task"
+        }
+
+    @staticmethod
+    def _error_status(e: Exception):
+        return {
+            "status": "error",
+            "progress": 0,
+            "message": f"Error retrieving task status: {str(e)}"
+        }
+
+    @staticmethod
+    def _build_status(task_data: Dict[str, Any], stats: dict) -> Dict[str, Any]:
+        """由任务记录和队列统计信息组装状态响应"""
+        status = {
+            "task_id": task_data.get("task_id"),
+            "pkg": task_data.get("pkg"),
+            "app": task_data.get("app"),
+            "status": task_data.get("status"),
+            "stage": task_data.get("stage"),
+            "progress": task_data.get("progress", 0),
+            "message": task_data.get("message", ""),
+            "log_file": task_data.get("log_file"),
+            "device": task_data.get("device"),
+            "wait_time": task_data.get("wait_time"),
+            "reused_from": task_data.get("reused_from"),
+            "queue_depth": stats["queue_depth"],
+            "devices": stats["devices"]
+        }
+        if status["status"] == "queued" and task_data.get("queued_at"):
+            status["wait_time"] = time.time() - task_data["queued_at"]
+        return status
+
+    def _position_range(self, task_data: Dict[str, Any], stats: dict):
+        if task_data.get("status") != "queued" or not task_data.get("stream_id"):
+            return None
+        return self.task_queue.position_range(task_data["stream_id"], stats["last_delivered"])
+        
+    def start_stage_workers(self, stages=("match", "publish")):
+        """启动本进程的 GKD 匹配/GitHub 发布线程池；采集阶段由 scheduler.refresh_devices 按设备启动"""
+        for stage in stages:
+            self.stage_pools[stage].start()
+
+    def _run_task_wrapper(self, task_id, pkg, app, serial=None, job=None):
+        """采集阶段（设备 worker）：运行 Poker，成功后转入 GKD 匹配队列，设备随即可以领取下一个任务"""
+        try:
+            task_data = self._get_task(task_id)
+            if task_data is None:
+                logger.warning(f"Task {task_id} no longer exists, skipping")
+                return
+            if task_data.get("cancel_requested"):
+                logger.info(f"Task {task_id} was cancelled, skipping")
+                if task_data.get("stage") != "done":
+                    self._finish_task(task_id, RedisTaskDict(self, task_id))
+                return
+
+            deliveries = int((job or {}).get("deliveries", 1))
+            if deliveries > 1:
+                # worker 异常退出后被回收的任务
+                if task_data.get("status") == "completed" and task_data.get("stage") in ("poker", "gkd_queued"):
+                    # 采集已完成，但未能转入匹配队列
+                    logger.info(f"Task {task_id} crawl finished before worker failure, handing off to GKD")
+                    self._hand_off(task_id, pkg, app, self.match_queue, "gkd_queued")
+                    return
+                if task_data.get("status") in ("completed", "failed"):
+                    logger.info(f"Task {task_id} already finished before worker failure, skipping")
+                    return
+                if deliveries > Config.TASK_MAX_DELIVERIES:
+                    self._abandon_task(task_id, deliveries)
+                    return
+                logger.warning(f"Task {task_id} recovered from failed worker, delivery #{deliveries}")
+
+            queued_at = task_data.get("queued_at")
+            wait_time = (time.time() - queued_at) if queued_at else None
+            if wait_time is not None:
+                TASK_QUEUE_WAIT.observe(wait_time)
             self.update_task_status(
                 task_id,
-                status="failed",
-                progress=0,
-                message=f"Task execution error: {str(e)}"
+                status="running",
+                device=serial,
+                started_at=time.time(),
+                wait_time=wait_time
             )
-    
+
+            task_proxy = RedisTaskDict(self, task_id)
+            if self._reuse_apk_result(task_id, pkg, app, serial, task_data, task_proxy):
+                self._finish_task(task_id, task_proxy)
+            elif run_crawl_stage(task_id, pkg, app, task_proxy, serial=serial) and \
+                    not cancel_requested(task_id, task_proxy):
+                self.match_queue.push(task_id, pkg, app)
+            else:
+                self._finish_task(task_id, task_proxy)
+
+        except Exception as e:
+            self._fail_task_execution(task_id, e)
+
+    def _run_match_wrapper(self, task_id, pkg, app, job=None):
+        """GKD 匹配阶段：成功后转入 GitHub 发布队列"""
+        try:
+            if not self._claim_stage(task_id, job, "gkd_queued", "gkd"):
+                return
+            task_proxy = RedisTaskDict(self, task_id)
+            if run_match_stage(task_id, pkg, app, task_proxy) and not cancel_requested(task_id, task_proxy):
+                self.publish_queue.push(task_id, pkg, app)
+            else:
+                self._finish_task(task_id, task_proxy)
+        except Exception as e:
+            self._fail_task_execution(task_id, e)
+
+    def _run_publish_batch(self, jobs: List[dict]):
+        """GitHub 发布阶段（流水线的最后一步），一批任务共用一次发布"""
+        tasks = {}
+        for job in jobs:
+            task_id = job["task_id"]
+            try:
+                if task_id not in tasks and self._claim_stage(task_id, job, "github_queued", "github"):
+                    tasks[task_id] = (task_id, job["pkg"], job["app"])
+            except Exception as e:
+                self._fail_task_execution(task_id, e)
+        if not tasks:
+            return
+
+        tasks_dict = {task_id: RedisTaskFields(self, task_id) for task_id in tasks}
+        try:
+            run_publish_stage(list(tasks.values()), tasks_dict)
+        except Exception as e:
+            logger.error(f"Error publishing tasks {list(tasks)}: {str(e)}")
+        finally:
+            for task_id in tasks:
+                try:
+                    self._finish_task(task_id, tasks_dict)
+                except Exception as e:
+                    self._fail_task_execution(task_id, e)
+
+    def _reuse_apk_result(self, task_id, pkg, app, serial, task_data: Dict[str, Any], task_proxy) -> bool:
+        """
+        计算设备上 APK 的内容指纹并记入任务；未指定 force 且相同 APK 已有完成的结果时直接复用，返回 True
+        """
+        if Config.DEBUG_SKIP_POKER or Config.FAKE_ENGINE or not Config.APK_RESULT_REUSE:
+            return False
+        fingerprint = ADBAppManager.get_apk_fingerprint(pkg, serial)
+        if fingerprint is None:
+            return False
+        self.update_task_status(task_id, apk_sha256=fingerprint["sha256"], apk_version_code=fingerprint["version_code"])
+        if task_data.get("force"):
+            logger.info(f"Task {task_id} is forced, crawling {pkg} regardless of previous results")
+            return False
+
+        source = self.redis_client.get(f"{self.apk_result_prefix}{pkg}:{fingerprint['sha256']}")
+        if not source:
+            return False
+        return reuse_crawl_result(task_id, pkg, app, json.loads(source), task_proxy)
+
+    def _finish_task(self, task_id, tasks_dict):
+        """
+        结束任务：执行期间被请求取消的任务记为已取消；
+        采集、匹配成功且发布完成（或无改动而跳过）的任务按 APK 指纹登记结果，供之后提交的相同 APK 复用
+        """
+        if self.get_task_field(task_id, "cancel_requested"):
+            self.update_task_status(task_id, status="cancelled", message="Task cancelled")
+            TaskLogger.append_task_log(task_id, "[CANCEL] Task cancelled")
+        finish_task(task_id, tasks_dict)
+        if Config.DEBUG_SKIP_POKER or not Config.APK_RESULT_REUSE:
+            return
+        task_data = self._get_task(task_id)
+        if not task_data or task_data.get("status") != "completed" or not task_data.get("apk_sha256"):
+            return
+        if task_data.get("reused_from"):
+            # 复用的结果只指向最初采集的任务
+            return
+        github_result = task_data.get("github_result") or {}
+        published = github_result.get("status") == "skipped" or \
+            (github_result.get("status") == "completed" and (github_result.get("merge") or {}).get("merged"))
+        if task_data.get("match_status") != "completed" or not published:
+            # 采集或匹配未成功、发布失败、PR 未合并或未执行：没有可复用的规则，之后的任务需要重新采集
+            return
+        result = {
+            "task_id": task_id,
+            "version_code": task_data.get("apk_version_code"),
+            "crawl_stats": task_data.get("crawl_stats"),
+            "github_result": task_data.get("github_result"),
+            "finished_at": time.time(),
+        }
+        self.redis_client.set(
+            f"{self.apk_result_prefix}{task_data['pkg']}:{task_data['apk_sha256']}",
+            json.dumps(result, ensure_ascii=False),
+            ex=Config.APK_RESULT_TTL
+        )
+        logger.info(f"Task {task_id} result registered for APK {task_data['apk_sha256'][:12]} of {task_data['pkg']}")
+
+    def _claim_stage(self, task_id, job, queued_stage: str, running_stage: str) -> bool:
+        """
+        判断阶段队列中的条目是否需要执行：任务须处于该阶段的排队状态；
+        回收的条目在任务仍停留在该阶段（上一个 worker 执行中途退出）时重新执行
+        """
+        if Config.DEBUG_SKIP_POKER:
+            # 调试模式下各阶段都作用于固定的调试任务，不检查当前任务的阶段
+            return True
+        task_data = self._get_task(task_id)
+        if task_data is None:
+            logger.warning(f"Task {task_id} no longer exists, skipping")
+            return False
+        stage = task_data.get("stage")
+        deliveries = int((job or {}).get("deliveries", 1))
+        if deliveries > 1 and stage == running_stage:
+            if deliveries > Config.TASK_MAX_DELIVERIES:
+                self._abandon_task(task_id, deliveries)
+                return False
+            logger.warning(f"Task {task_id} recovered from failed {running_stage} worker, delivery #{deliveries}")
+            return True
+        if stage != queued_stage:
+            logger.info(f"Task {task_id} is at stage {stage}, skipping {running_stage} entry")
+            return False
+        return True
+
+    def _hand_off(self, task_id, pkg, app, queue: RedisTaskQueue, stage: str):
+        self.update_task_status(task_id, stage=stage)
+        queue.push(task_id, pkg, app)
+
+    def _abandon_task(self, task_id, deliveries: int):
+        self.update_task_status(
+            task_id,
+            status="failed",
+            stage="done",
+            message=f"Task abandoned after {deliveries - 1} failed deliveries"
+        )
+        TaskLogger.task_failed(task_id, "exceeded max deliveries")
+
+    def _fail_task_execution(self, task_id, e: Exception):
+        logger.error(f"Error in task wrapper for {task_id}: {str(e)}")
+        TASKS_FINISHED.labels("failed").inc()
+        self.update_task_status(
+            task_id,
+            status="failed",
+            stage="done",
+            progress=0,
+            message=f"Task execution error: {str(e)}"
+        )
+
     def update_task_status(self, task_id, **kwargs):
+        """原子地更新任务的若干字段并刷新 TTL，只需一次 Redis 往返"""
         try:
-            task_data = self._get_task(task_id)
+            if not kwargs:
+                return True
 
-            if task_data is None:
+            key = f"{self.task_prefix}{task_id}"
+            event = json.dumps({"task_id": task_id, "fields": kwargs, "ts": time.time()}, ensure_ascii=False)
+            with observe_redis("update_task"):
+                updated = self._update_script(
+                    keys=[key, f"{self.events_prefix}{task_id}"],
+                    args=[self.task_ttl, event, *encode_task_fields(kwargs)],
+                )
+
+            if not updated:
                 logger.warning(f"Cannot update non-existent task {task_id}")
                 return False
             
-            task_data.update(kwargs)
-            self._save_task(task_id, task_data)
             logger.debug(f"Task {task_id} updated in Redis: {kwargs}")
             return True
         
@@ -214,30 +1067,29 @@ class TaskManager:
             logger.error(f"Error updating task {task_id}: {str(e)}")
             return False
     
-    def _save_task(self, task_id, task_data):
-        try:
-            key = f"{self.task_prefix}{task_id}"
-            value = json.dumps(task_data, ensure_ascii=False)
-            self.redis_client.setex(key, self.task_ttl, value)
-            return True
-        except Exception as e:
-            logger.error(f"Error saving task {task_id} to Redis: {str(e)}")
-            return False
-    
     def _get_task(self, task_id):
         try:
             key = f"{self.task_prefix}{task_id}"
-            value = self.redis_client.get(key)
+            fields = self.redis_client.hgetall(key)
 
-            if value is None:
+            if not fields:
                 return None
-            return json.loads(value)
+            return decode_task_fields(fields)
         except json.JSONDecodeError as e:
             logger.error(f"Error decoding task {task_id} data: {str(e)}")
             return None
         except Exception as e:
             logger.error(f"Error getting task {task_id} from Redis: {str(e)}")
             return None
+
+    def get_task_field(self, task_id, field, default=None):
+        """读取任务的单个字段"""
+        try:
+            value = self.redis_client.hget(f"{self.task_prefix}{task_id}", field)
+            return default if value is None else json.loads(value)
+        except Exception as e:
+            logger.error(f"Error getting field {field} of task {task_id}: {str(e)}")
+            return default
         
     def health_check(self):
         try:
@@ -247,18 +1099,28 @@ class TaskManager:
             logger.error(f"Redis health check failed: {str(e)}")
             return False
     
+    async def ahealth_check(self):
+        """health_check 的异步版本"""
+        try:
+            await self.async_redis.ping()
+            return True
+        except Exception as e:
+            logger.error(f"Redis health check failed: {str(e)}")
+            return False
+    
     def delete_task(self, task_id: str) -> bool:
         try:
-            # 获取任务数据以便删除包名索引
-            task_data = self._get_task(task_id)
+            # 获取包名以便删除包名索引
+            pkg = self.get_task_field(task_id, "pkg")
             
             # 删除任务数据
             key = f"{self.task_prefix}{task_id}"
             self.redis_client.delete(key)
+            self.redis_client.zrem(self.task_index_key, task_id)
             
             # 删除包名索引
-            if task_data and "pkg" in task_data:
-                index_key = f"{self.pkg_index_prefix}{task_data['pkg']}"
+            if pkg:
+                index_key = f"{self.pkg_index_prefix}{pkg}"
                 self.redis_client.delete(index_key)
             
             logger.info(f"Task {task_id} deleted from Redis")
@@ -267,18 +1129,128 @@ class TaskManager:
             logger.error(f"Error deleting task {task_id}: {str(e)}")
             return False
     
-    def list_all_tasks(self) -> list:
-        try:
-            pattern = f"{self.task_prefix}*"
-            keys = self.redis_client.keys(pattern)
-            task_ids = [key.replace(self.task_prefix, "") for key in keys]
-            return task_ids
-        except Exception as e:
-            logger.error(f"Error listing tasks: {str(e)}")
-            return []
+    def _list_batch_size(self, limit: int, filtered: bool) -> int:
+        # 有过滤条件时多取一些，减少往返次数
+        return min(limit * 4, TASK_LIST_MAX_SCAN) if filtered else limit
+
+    def _index_range_args(self, after: Optional[Tuple[float, str]], offset: int, num: int) -> dict:
+        return {
+            "max": "+inf" if after is None else repr(after[0]),
+            "min": "-inf",
+            "start": offset,
+            "num": num,
+            "withscores": True,
+        }
+
+    def _collect_list_page(self, page: dict, entries, records, after, limit, status, pkg) -> bool:
+        """
+        将一批索引项并入当前页，返回 True 表示本页已满
+
+        Args:
+            page: {"tasks", "stale", "scanned", "last"}，在多批之间累积
+            entries: [(task_id, queued_at)]，按 queued_at 从新到旧
+            records: 与 entries 对应的 HMGET 结果
+        """
+        for (task_id, score), values in zip(entries, records):
+            # 同一 score 的索引项按 task_id 逆序排列，跳过游标及其之前的项
+            if after is not None and score == after[0] and task_id >= after[1]:
+                continue
+            page["scanned"] += 1
+            page["last"] = (score, task_id)
+            if all(value is None for value in values):
+                # 任务记录已过期
+                page["stale"].append(task_id)
+                continue
+            task = {
+                field: None if value is None else json.loads(value)
+                for field, value in zip(TASK_LIST_FIELDS, values)
+            }
+            task["task_id"] = task_id
+            if (status is None or task["status"] == status) and (pkg is None or task["pkg"] == pkg):
+                page["tasks"].append(task)
+                if len(page["tasks"]) >= limit:
+                    return True
+            if page["scanned"] >= TASK_LIST_MAX_SCAN:
+                return True
+        return False
+
+    def _list_result(self, page: dict, exhausted: bool) -> Dict[str, Any]:
+        last = page["last"]
+        return {
+            "tasks": page["tasks"],
+            "next_cursor": None if exhausted or last is None else f"{last[0]!r}:{last[1]}",
+        }
+
+    def list_all_tasks(self, cursor: str = None, limit: int = 50, status: str = None, pkg: str = None) -> Dict[str, Any]:
+        """
+        按提交时间从新到旧分页列出任务，开销只与页大小有关
+
+        Args:
+            cursor: 上一页返回的 next_cursor
+            limit: 每页最多返回的任务数
+            status: 只返回该状态的任务
+            pkg: 只返回该包名的任务
+
+        Returns:
+            {"tasks": [任务摘要], "next_cursor": 下一页游标，没有更多任务时为 None}；
+            有过滤条件时单页最多检查 TASK_LIST_MAX_SCAN 个任务，可能返回不足 limit 个任务和非空游标
+        """
+        after = parse_task_cursor(cursor) if cursor else None
+        page = {"tasks": [], "stale": [], "scanned": 0, "last": None}
+        batch_size = self._list_batch_size(limit, status is not None or pkg is not None)
+        offset = 0
+        exhausted = False
+        while True:
+            entries = self.redis_client.zrevrangebyscore(
+                self.task_index_key, **self._index_range_args(after, offset, batch_size)
+            )
+            pipe = self.redis_client.pipeline(transaction=False)
+            for task_id, _ in entries:
+                pipe.hmget(f"{self.task_prefix}{task_id}", TASK_LIST_FIELDS)
+            records = pipe.execute() if entries else []
+            offset += len(entries)
+            if self._collect_list_page(page, entries, records, after, limit, status, pkg):
+                break
+            if len(entries) < batch_size:
+                exhausted = True
+                break
+        if page["stale"]:
+            self.redis_client.zrem(self.task_index_key, *page["stale"])
+        return self._list_result(page, exhausted)
+
+    async def alist_all_tasks(self, cursor: str = None, limit: int = 50, status: str = None,
+                              pkg: str = None) -> Dict[str, Any]:
+        """list_all_tasks 的异步版本"""
+        after = parse_task_cursor(cursor) if cursor else None
+        page = {"tasks": [], "stale": [], "scanned": 0, "last": None}
+        batch_size = self._list_batch_size(limit, status is not None or pkg is not None)
+        offset = 0
+        exhausted = False
+        while True:
+            entries = await self.async_redis.zrevrangebyscore(
+                self.task_index_key, **self._index_range_args(after, offset, batch_size)
+            )
+            pipe = self.async_redis.pipeline(transaction=False)
+            for task_id, _ in entries:
+                pipe.hmget(f"{self.task_prefix}{task_id}", TASK_LIST_FIELDS)
+            records = await pipe.execute() if entries else []
+            offset += len(entries)
+            if self._collect_list_page(page, entries, records, after, limit, status, pkg):
+                break
+            if len(entries) < batch_size:
+                exhausted = True
+                break
+        if page["stale"]:
+            await self.async_redis.zrem(self.task_index_key, *page["stale"])
+        return self._list_result(page, exhausted)
 
 
 class RedisTaskDict:
+    """
+    以 dict 形式访问 Redis 中的任务状态，供 process_launcher 使用：
+    tasks_dict[task_id]["status"] = "running" 会直接写入对应字段
+    """
+
     def __init__(self, manager: TaskManager, task_id: str):
         self.manager = manager
         self.task_id = task_id
@@ -287,14 +1259,49 @@ class RedisTaskDict:
         if key == self.task_id:
             self.manager.update_task_status(self.task_id, **value)
     
-    def __getitem__(self, key: str) -> Dict[str, Any]:
+    def __getitem__(self, key: str) -> "RedisTaskFields":
         if key == self.task_id:
-            task_data = self.manager._get_task(self.task_id)
-            return task_data if task_data else {}
-        return {}
+            return RedisTaskFields(self.manager, self.task_id)
+        raise KeyError(key)
     
-    def get(self, key: str, default=None) -> Dict[str, Any]:
+    def get(self, key: str, default=None):
         try:
             return self[key]
-        except:
-            return default if default is not None else {}
+        except KeyError:
+            return default
+
+
+class RedisTaskFields:
+    """单个任务的字段代理，读写均直接作用于 Redis Hash 字段"""
+
+    def __init__(self, manager: TaskManager, task_id: str):
+        self.manager = manager
+        self.task_id = task_id
+
+    def __setitem__(self, field: str, value: Any):
+        self.manager.update_task_status(self.task_id, **{field: value})
+
+    def __getitem__(self, field: str) -> Any:
+        value = self.manager.get_task_field(self.task_id, field, _MISSING)
+        if value is _MISSING:
+            raise KeyError(field)
+        return value
+
+    def get(self, field: str, default=None) -> Any:
+        return self.manager.get_task_field(self.task_id, field, default)
+
+
+_MISSING = object()
+
+
+def encode_task_fields(task_data: Dict[str, Any]) -> list:
+    """将任务字段编码为 HSET 参数列表，字段值统一序列化为 JSON 以保留类型"""
+    args = []
+    for field, value in task_data.items():
+        args.append(field)
+        args.append(json.dumps(value, ensure_ascii=False))
+    return args
+
+
+def decode_task_fields(fields: Dict[str, str]) -> Dict[str, Any]:
+    return {field: json.loads(value) for field, value in fields.items()}
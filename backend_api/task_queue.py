@@ -0,0 +1,261 @@
+import os
+import socket
+import time
+from typing import Dict, List, Optional, Tuple
+import redis
+import redis.asyncio as aioredis
+from config import Config
+from logger import logger
+from metrics import observe_redis
+
+
+# 入队并写入任务记录（附带条目 ID），保证 worker 领取任务时记录一定存在
+ENQUEUE_SCRIPT = """
+local entry_id = redis.call('XADD', KEYS[1], '*', 'task_id', ARGV[1], 'pkg', ARGV[2], 'app', ARGV[3], 'queued_at', ARGV[4])
+redis.call('HSET', KEYS[2], 'stream_id', cjson.encode(entry_id), unpack(ARGV, 6))
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+return entry_id
+"""
+
+
+class RedisTaskQueue:
+    """
+    基于 Redis Stream 的持久化任务队列
+
+    任务通过 XADD 入队，由消费者组中的 worker 通过 XREADGROUP 领取；
+    worker 异常退出后，其挂起条目超过空闲阈值会被其他 worker 回收重新执行
+    """
+
+    def __init__(self, redis_client: redis.Redis, async_client: aioredis.Redis = None,
+                 stream: str = None, group: str = None):
+        """
+        Args:
+            redis_client: 同步客户端，供 worker 线程使用
+            async_client: asyncio 客户端，供 API 事件循环使用（a 前缀的方法）
+        """
+        self.redis_client = redis_client
+        self.async_client = async_client
+        self.stream = stream or Config.TASK_STREAM
+        self.group = group or Config.TASK_CONSUMER_GROUP
+        # 同一主机/进程内的消费者名前缀，每个设备 worker 再追加设备序列号
+        self.consumer_prefix = f"{socket.gethostname()}-{os.getpid()}"
+        self.slots_key = f"{self.stream}:slots"
+        self._enqueue_script = redis_client.register_script(ENQUEUE_SCRIPT)
+        if async_client is not None:
+            self._async_enqueue_script = async_client.register_script(ENQUEUE_SCRIPT)
+        self._ensure_group()
+
+    def _ensure_group(self):
+        try:
+            self.redis_client.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+            logger.info(f"Created consumer group {self.group} on stream {self.stream}")
+        except redis.ResponseError as e:
+            # 消费者组已存在
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def enqueue(self, task_id: str, pkg: str, app: str, task_key: str, task_fields: list, ttl: int) -> str:
+        """
+        将任务写入 Stream，同时原子地保存任务记录
+
+        Args:
+            task_key: 任务记录的 Redis 键
+            task_fields: 已编码的任务字段（HSET 参数列表），会额外写入 stream_id 字段
+            ttl: 任务记录过期时间（秒）
+
+        Returns:
+            Stream 条目 ID
+        """
+        with observe_redis("enqueue"):
+            entry_id = self._enqueue_script(
+                keys=[self.stream, task_key],
+                args=[task_id, pkg, app, str(time.time()), ttl, *task_fields],
+            )
+        logger.debug(f"Task {task_id} enqueued to {self.stream} as {entry_id}")
+        return entry_id
+
+    async def aenqueue(self, task_id: str, pkg: str, app: str, task_key: str, task_fields: list, ttl: int) -> str:
+        """enqueue 的异步版本，供 API 事件循环使用"""
+        with observe_redis("enqueue"):
+            entry_id = await self._async_enqueue_script(
+                keys=[self.stream, task_key],
+                args=[task_id, pkg, app, str(time.time()), ttl, *task_fields],
+            )
+        logger.debug(f"Task {task_id} enqueued to {self.stream} as {entry_id}")
+        return entry_id
+
+    async def aadd_enqueue_command(self, pipe, task_id: str, pkg: str, app: str, task_key: str,
+                                   task_fields: list, ttl: int):
+        """向异步 pipeline 追加一次入队（同 aenqueue），批量提交时与其他命令一起发送"""
+        await self._async_enqueue_script(
+            keys=[self.stream, task_key],
+            args=[task_id, pkg, app, str(time.time()), ttl, *task_fields],
+            client=pipe,
+        )
+
+    def push(self, task_id: str, pkg: str, app: str) -> str:
+        """只写入 Stream 条目，用于流水线阶段之间转交已有任务记录的任务"""
+        with observe_redis("enqueue"):
+            entry_id = self.redis_client.xadd(
+                self.stream, {"task_id": task_id, "pkg": pkg, "app": app, "queued_at": str(time.time())}
+            )
+        logger.debug(f"Task {task_id} pushed to {self.stream} as {entry_id}")
+        return entry_id
+
+    def claim(self, consumer: str, block_ms: int = None) -> Optional[Tuple[str, Dict[str, str]]]:
+        """
+        领取一个任务：优先回收超时未确认的挂起条目，其次读取新条目
+
+        Returns:
+            (entry_id, fields) 或 None（超时无任务）
+        """
+        reclaimed = self._reclaim(consumer)
+        if reclaimed:
+            return reclaimed
+
+        block_ms = block_ms if block_ms is not None else Config.TASK_QUEUE_BLOCK_MS
+        resp = self.redis_client.xreadgroup(
+            self.group, consumer, {self.stream: ">"}, count=1, block=block_ms
+        )
+        if not resp:
+            return None
+        _, entries = resp[0]
+        if not entries:
+            return None
+        entry_id, fields = entries[0]
+        fields["deliveries"] = "1"
+        return entry_id, fields
+
+    def _reclaim(self, consumer: str) -> Optional[Tuple[str, Dict[str, str]]]:
+        """回收其他 worker 超时未确认（心跳停止）的挂起条目"""
+        idle_entries = self.redis_client.xpending_range(
+            self.stream, self.group, min="-", max="+", count=1,
+            idle=Config.TASK_CLAIM_IDLE_MS,
+        )
+        for pending in idle_entries:
+            entry_id = pending["message_id"]
+            claimed = self.redis_client.xclaim(
+                self.stream, self.group, consumer,
+                min_idle_time=Config.TASK_CLAIM_IDLE_MS,
+                message_ids=[entry_id],
+            )
+            # 并发回收时可能已被其他 worker 抢先领取；条目被删除时内容为空
+            if not claimed:
+                continue
+            _, fields = claimed[0]
+            if not fields:
+                self.ack(entry_id)
+                continue
+            fields["deliveries"] = str(pending["times_delivered"] + 1)
+            logger.warning(
+                f"Reclaimed task {fields.get('task_id')} ({entry_id}) from {pending['consumer']}, "
+                f"delivery #{fields['deliveries']}"
+            )
+            return entry_id, fields
+        return None
+
+    def heartbeat(self, consumer: str, entry_ids):
+        """重置运行中条目的空闲时间，避免长时间采集被误判为 worker 失效"""
+        if not entry_ids:
+            return
+        with observe_redis("heartbeat"):
+            self.redis_client.xclaim(
+                self.stream, self.group, consumer,
+                min_idle_time=0, message_ids=list(entry_ids), justid=True,
+            )
+
+    def ack(self, entry_id: str):
+        """确认并删除条目，Stream 中只保留排队中和执行中的任务"""
+        pipe = self.redis_client.pipeline()
+        pipe.xack(self.stream, self.group, entry_id)
+        pipe.xdel(self.stream, entry_id)
+        with observe_redis("ack"):
+            pipe.execute()
+
+    def depth(self) -> int:
+        """排队中（尚未被领取）的任务数"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.xlen(self.stream)
+        pipe.xpending(self.stream, self.group)
+        length, pending = pipe.execute()
+        return max(length - pending.get("pending", 0), 0)
+
+    async def adepth(self) -> int:
+        """depth 的异步版本"""
+        pipe = self.async_client.pipeline(transaction=False)
+        pipe.xlen(self.stream)
+        pipe.xpending(self.stream, self.group)
+        length, pending = await pipe.execute()
+        return max(length - pending.get("pending", 0), 0)
+
+    def add_stats_commands(self, pipe):
+        """向 pipeline 追加查询队列统计信息的命令，结果交由 parse_stats 解析"""
+        pipe.xlen(self.stream)
+        pipe.xpending(self.stream, self.group)
+        pipe.xinfo_groups(self.stream)
+        pipe.hgetall(self.slots_key)
+        return 4
+
+    def parse_stats(self, results) -> dict:
+        """
+        解析 add_stats_commands 的执行结果
+
+        Returns:
+            {"queue_depth": 排队任务数, "last_delivered": 最近领取的条目 ID, "devices": 设备占用}
+        """
+        length, pending, groups, slots = results
+        last_delivered = "0-0"
+        for group in groups:
+            if group["name"] == self.group:
+                last_delivered = group["last-delivered-id"]
+                break
+        return {
+            "queue_depth": max(length - pending.get("pending", 0), 0),
+            "last_delivered": last_delivered,
+            "devices": self._parse_slots(slots),
+        }
+
+    def position_range(self, entry_id: str, last_delivered: str) -> Optional[Tuple[str, str]]:
+        """
+        计算任务之前（含自身）尚未被领取的条目区间，用于 XRANGE 统计排队位置；
+        任务已被领取时返回 None
+        """
+        if _stream_id_key(entry_id) <= _stream_id_key(last_delivered):
+            return None
+        return f"({last_delivered}", entry_id
+
+    async def aqueue_positions(self, entry_ids: List[str], last_delivered: str) -> Dict[str, int]:
+        """
+        用一次 XRANGE 计算多个排队中条目的排队位置（从 1 开始）；已被领取的条目不在结果中
+        """
+        waiting = [entry_id for entry_id in entry_ids
+                   if _stream_id_key(entry_id) > _stream_id_key(last_delivered)]
+        if not waiting:
+            return {}
+        last = max(waiting, key=_stream_id_key)
+        entries = await self.async_client.xrange(
+            self.stream, min=f"({last_delivered}", max=last, count=Config.TASK_QUEUE_MAXSIZE
+        )
+        positions = {entry_id: index for index, (entry_id, _) in enumerate(entries, 1)}
+        return {entry_id: positions[entry_id] for entry_id in waiting if entry_id in positions}
+
+    def set_slot(self, serial: str, task_id: Optional[str]):
+        """记录设备占用情况，供所有 API 进程查询"""
+        self.redis_client.hset(self.slots_key, serial, f"{task_id or ''}|{time.time()}")
+
+    def remove_slot(self, serial: str):
+        self.redis_client.hdel(self.slots_key, serial)
+
+    def _parse_slots(self, raw_slots: Dict[str, str]) -> Dict[str, Optional[str]]:
+        slots = {}
+        expire_before = time.time() - Config.TASK_CLAIM_IDLE_MS / 1000
+        for serial, value in raw_slots.items():
+            task_id, _, updated_at = value.rpartition("|")
+            if float(updated_at or 0) >= expire_before:
+                slots[serial] = task_id or None
+        return slots
+
+
+def _stream_id_key(entry_id: str) -> Tuple[int, int]:
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+后端压测脚本：批量提交任务、轮询状态直到全部结束、下载采集数据，统计吞吐量和延迟分位数
+
+不需要手机：后端和 worker 使用模拟引擎（fake_engine.py）代替 Poker、GKD 和 GitHub 发布，例如
+
+    FAKE_ENGINE=true FAKE_DEVICES=50 FAKE_CRAWL_SECONDS=2 PUBLISH_BATCH_WINDOW=5 uvicorn app_main:app
+    python test/bench_load.py --tasks 500 --batch-size 50
+
+也可以另外启动 EMBEDDED_WORKER=false 的 API 和多个 FAKE_ENGINE=true 的 worker_main.py，测试分布式部署
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+import httpx
+
+BASE_URL = "http://localhost:8000"
+# 单次批量状态查询的任务数，需不超过后端的 TASK_QUEUE_MAXSIZE
+STATUS_CHUNK = 500
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(int(len(sorted_values) * pct / 100), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def report(name, latencies, unit="ms", scale=1000):
+    latencies = sorted(latencies)
+    if not latencies:
+        print(f"{name}: 无数据")
+        return
+    values = ", ".join(f"p{pct} {percentile(latencies, pct) * scale:.1f}" for pct in (50, 90, 99))
+    print(f"{name}: {len(latencies)} 次, {values}, max {latencies[-1] * scale:.1f} ({unit})")
+
+
+async def submit(client, args, run_id, submitted, latencies, errors):
+    """分批提交任务，submitted 记录 task_id -> 提交完成时间"""
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def submit_batch(start):
+        tasks = [{"pkg": f"com.bench.load.{run_id}.{i}", "app": f"Bench{i}", "timestamp": str(time.time())}
+                 for i in range(start, min(start + args.batch_size, args.tasks))]
+        async with semaphore:
+            begin = time.perf_counter()
+            try:
+                resp = await client.post("/api/run_task", json={"tasks": tasks})
+            except httpx.HTTPError as e:
+                errors.append(type(e).__name__)
+                return
+            latencies.append(time.perf_counter() - begin)
+        if resp.status_code != 200:
+            errors.append(resp.status_code)
+            return
+        now = time.perf_counter()
+        for result in resp.json()["results"]:
+            if result["success"]:
+                submitted[result["task_id"]] = now
+            else:
+                errors.append(result["message"])
+
+    await asyncio.gather(*[submit_batch(start) for start in range(0, args.tasks, args.batch_size)])
+
+
+async def poll(client, args, submitted, finished, latencies, errors):
+    """轮询批量状态接口直到所有任务结束或超时，finished 记录 task_id -> (结束时间, 最终状态)"""
+    deadline = time.perf_counter() + args.timeout
+    while len(finished) < len(submitted) and time.perf_counter() < deadline:
+        pending = [task_id for task_id in submitted if task_id not in finished]
+        for start in range(0, len(pending), STATUS_CHUNK):
+            begin = time.perf_counter()
+            try:
+                resp = await client.post("/api/tasks/status", json={"task_ids": pending[start:start + STATUS_CHUNK]})
+            except httpx.HTTPError as e:
+                errors.append(type(e).__name__)
+                continue
+            latencies.append(time.perf_counter() - begin)
+            if resp.status_code != 200:
+                errors.append(resp.status_code)
+                continue
+            now = time.perf_counter()
+            for task_id, status in resp.json()["tasks"].items():
+                if status.get("stage") == "done" or status.get("status") == "not_found":
+                    finished[task_id] = (now, status.get("status"))
+        await asyncio.sleep(args.poll_interval)
+
+
+async def download(client, args, task_ids, latencies, errors):
+    """下载任务的采集数据，返回下载的总字节数"""
+    semaphore = asyncio.Semaphore(args.download_concurrency)
+    total = 0
+
+    async def download_one(task_id):
+        nonlocal total
+        async with semaphore:
+            begin = time.perf_counter()
+            try:
+                async with client.stream("GET", f"/api/download/{task_id}") as resp:
+                    if resp.status_code != 200:
+                        errors.append(resp.status_code)
+                        return
+                    async for chunk in resp.aiter_bytes():
+                        total += len(chunk)
+            except httpx.HTTPError as e:
+                errors.append(type(e).__name__)
+                return
+            latencies.append(time.perf_counter() - begin)
+
+    await asyncio.gather(*[download_one(task_id) for task_id in task_ids])
+    return total
+
+
+async def main(args):
+    run_id = uuid.uuid4().hex[:8]
+    connections = max(args.concurrency, args.download_concurrency) + 1
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    submitted, finished = {}, {}
+    submit_latencies, status_latencies, download_latencies = [], [], []
+    submit_errors, status_errors, download_errors = [], [], []
+
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        print(f"压测批次: {run_id}, 任务数: {args.tasks}, 每批: {args.batch_size}, 并发: {args.concurrency}")
+        started = time.perf_counter()
+        await submit(client, args, run_id, submitted, submit_latencies, submit_errors)
+        submit_elapsed = time.perf_counter() - started
+
+        await poll(client, args, submitted, finished, status_latencies, status_errors)
+        pipeline_elapsed = time.perf_counter() - started
+
+        completed = [task_id for task_id, (_, status) in finished.items() if status == "completed"]
+        downloaded = 0
+        download_elapsed = 0.0
+        if args.download and completed:
+            begin = time.perf_counter()
+            downloaded = await download(client, args, completed[:args.download], download_latencies, download_errors)
+            download_elapsed = time.perf_counter() - begin
+
+    statuses = {}
+    for _, status in finished.values():
+        statuses[status] = statuses.get(status, 0) + 1
+    print(f"\n提交: {len(submitted)} 个任务, 耗时 {submit_elapsed:.2f}s, "
+          f"{len(submitted) / submit_elapsed if submit_elapsed else 0:.1f} tasks/s, 错误 {len(submit_errors)}")
+    report("提交请求延迟", submit_latencies)
+    print(f"\n结束: {len(finished)}/{len(submitted)} 个任务 {statuses}, 未结束 {len(submitted) - len(finished)}")
+    print(f"流水线吞吐量: {len(finished) / pipeline_elapsed if pipeline_elapsed else 0:.2f} tasks/s "
+          f"(总耗时 {pipeline_elapsed:.1f}s)")
+    report("任务端到端耗时", [finished[task_id][0] - submitted[task_id] for task_id in finished], unit="s", scale=1)
+    report("状态查询延迟", status_latencies)
+    if status_errors:
+        print(f"状态查询错误: {len(status_errors)}")
+    if args.download:
+        print(f"\n下载: {len(download_latencies)} 个任务, {downloaded / 1024 / 1024:.1f} MB, "
+              f"{downloaded / 1024 / 1024 / download_elapsed if download_elapsed else 0:.1f} MB/s, "
+              f"错误 {len(download_errors)}")
+        report("下载耗时", download_latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="后端负载压测")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--tasks", type=int, default=200, help="提交的任务总数")
+    parser.add_argument("--batch-size", type=int, default=20, help="每次 /api/run_task 请求包含的任务数")
+    parser.add_argument("--concurrency", type=int, default=10, help="并发提交的请求数")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="状态轮询间隔（秒）")
+    parser.add_argument("--timeout", type=float, default=1800, help="等待所有任务结束的最长时间（秒）")
+    parser.add_argument("--download", type=int, default=50, help="下载采集数据的已完成任务数，0 表示不下载")
+    parser.add_argument("--download-concurrency", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
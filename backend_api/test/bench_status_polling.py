@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+状态轮询压测脚本：模拟大量看板并发轮询 /api/task/{id}/status，统计吞吐量和延迟分位数
+
+先启动 Redis 和后端（uvicorn app_main:app），再运行：
+
+    python test/bench_status_polling.py --concurrency 200 --duration 20
+
+压测端与后端共用 CPU 时，测得的尾延迟主要是两者争抢 CPU 的排队时间，应分开到不同的核（或主机）上，例如
+
+    taskset -c 0 uvicorn app_main:app
+    python test/bench_status_polling.py --cpus 1
+"""
+
+import argparse
+import asyncio
+import os
+import time
+import httpx
+
+BASE_URL = "http://localhost:8000"
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(int(len(sorted_values) * pct / 100), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+async def poller(client, task_id, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            resp = await client.get(f"/api/task/{task_id}/status")
+            if resp.status_code != 200:
+                errors.append(resp.status_code)
+                continue
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+async def main(args):
+    if args.cpus:
+        os.sched_setaffinity(0, {int(cpu) for cpu in args.cpus.split(",")})
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=30) as client:
+        task_id = args.task_id
+        if not task_id:
+            resp = await client.post("/api/run", json={"pkg": "com.bench.polling", "app": "BenchApp"})
+            task_id = resp.json()["task_id"]
+        print(f"轮询任务: {task_id}, 并发: {args.concurrency}, 时长: {args.duration}s")
+
+        latencies, errors = [], []
+        deadline = time.perf_counter() + args.duration
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            poller(client, task_id, deadline, latencies, errors)
+            for _ in range(args.concurrency)
+        ])
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"请求数: {len(latencies)}, 错误数: {len(errors)}")
+    print(f"吞吐量: {len(latencies) / elapsed:.1f} req/s")
+    for pct in (50, 90, 99):
+        print(f"p{pct}: {percentile(latencies, pct) * 1000:.2f} ms")
+    if latencies:
+        print(f"max: {latencies[-1] * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="并发状态轮询压测")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--task-id", default=None, help="轮询的任务 ID，不指定时提交一个新任务")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--cpus", default=None, help="压测端绑定的 CPU 编号（逗号分隔），与后端所在的核分开")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,173 @@
+#! /usr/bin/env python3
+"""
+adb_client 测试：用本地的伪 adb 服务（实现 host:devices / host:transport / exec: 协议，
+exec: 服务在本机 sh 中执行）代替真实设备，离线验证常驻会话、并发、截止时间等行为
+"""
+
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+CURRENT_PATH = Path(__file__).parent  # test/
+PROJECT_ROOT = CURRENT_PATH.parent    # 项目根目录
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from adb_client import AdbClient, AdbError, AdbTimeoutError
+
+SERIAL = "emulator-5554"
+
+
+class FakeAdbServer:
+    """最小化的 adb 服务端，运行在独立线程的事件循环中"""
+
+    def __init__(self):
+        self.port = None
+        self.connections = 0
+        self._loop = asyncio.new_event_loop()
+        started = threading.Event()
+        threading.Thread(target=self._run, args=(started,), daemon=True).start()
+        started.wait()
+
+    def _run(self, started):
+        asyncio.set_event_loop(self._loop)
+        server = self._loop.run_until_complete(asyncio.start_server(self._handle, "127.0.0.1", 0))
+        self.port = server.sockets[0].getsockname()[1]
+        started.set()
+        self._loop.run_forever()
+
+    @staticmethod
+    async def _read_request(reader):
+        length = int(await reader.readexactly(4), 16)
+        return (await reader.readexactly(length)).decode()
+
+    @staticmethod
+    def _fail(writer, message):
+        data = message.encode()
+        writer.write(b"FAIL" + f"{len(data):04x}".encode() + data)
+        writer.close()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        request = await self._read_request(reader)
+        if request == "host:devices":
+            body = f"{SERIAL}\tdevice\n".encode()
+            writer.write(b"OKAY" + f"{len(body):04x}".encode() + body)
+            writer.close()
+            return
+        if request not in (f"host:transport:{SERIAL}", "host:transport-any"):
+            self._fail(writer, f"device '{request.rpartition(':')[2]}' not found")
+            return
+        writer.write(b"OKAY")
+
+        request = await self._read_request(reader)
+        if not request.startswith("exec:"):
+            self._fail(writer, f"unsupported service {request}")
+            return
+        writer.write(b"OKAY")
+        proc = await asyncio.create_subprocess_exec(
+            "/bin/sh", "-c", request[5:],
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+        )
+
+        async def pump_stdin():
+            while data := await reader.read(65536):
+                proc.stdin.write(data)
+                await proc.stdin.drain()
+            proc.stdin.close()
+
+        async def pump_stdout():
+            while data := await proc.stdout.read(65536):
+                writer.write(data)
+                await writer.drain()
+
+        stdin_task = asyncio.ensure_future(pump_stdin())
+        await pump_stdout()
+        # 客户端断开时结束进程（对应设备端会话被关闭）
+        if proc.returncode is None and stdin_task.done():
+            proc.kill()
+        stdin_task.cancel()
+        await proc.wait()
+        writer.close()
+
+
+server = FakeAdbServer()
+
+
+def _client(**kwargs):
+    return AdbClient(host="127.0.0.1", port=server.port, **kwargs)
+
+
+def test_devices():
+    assert _client().devices() == [(SERIAL, "device")]
+
+
+def test_shell_output_and_exit_code():
+    client = _client()
+    output, code = client.shell(SERIAL, "echo hello; echo oops >&2; exit 3")
+    assert output == "hello\noops\n"
+    assert code == 3
+    # 没有结尾换行的输出也能正确切分
+    assert client.shell(SERIAL, "printf abc") == ("abc", 0)
+
+
+def test_session_is_reused():
+    client = _client()
+    first, _ = client.shell(SERIAL, "echo $$")
+    connections = server.connections
+    for _ in range(20):
+        assert client.shell(SERIAL, "echo $$")[0] == first
+    assert server.connections == connections
+
+    start = time.perf_counter()
+    for _ in range(200):
+        client.shell(SERIAL, "true")
+    per_command = (time.perf_counter() - start) / 200 * 1000
+    print(f"每条命令耗时: {per_command:.2f} ms")
+
+
+def test_concurrent_commands():
+    client = _client(max_sessions=4)
+
+    async def run():
+        return await asyncio.gather(*[client.ashell(SERIAL, f"sleep 0.3; echo {i}") for i in range(4)])
+
+    start = time.perf_counter()
+    results = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    assert [output for output, _ in results] == [f"{i}\n" for i in range(4)]
+    assert elapsed < 0.9, elapsed
+
+
+def test_deadline_discards_session():
+    client = _client(max_sessions=1)
+    try:
+        client.shell(SERIAL, "sleep 5", timeout=0.3)
+        assert False, "expected timeout"
+    except AdbTimeoutError:
+        pass
+    # 超时的会话被丢弃，后续命令不受影响
+    assert client.shell(SERIAL, "echo ok", timeout=2) == ("ok\n", 0)
+
+
+def test_unknown_device():
+    try:
+        _client().shell("missing-device", "true")
+        assert False, "expected AdbError"
+    except AdbError as e:
+        assert "not found" in str(e)
+
+
+def test_exec_out_binary():
+    assert _client().exec_out(SERIAL, "printf '\\000\\001\\377'") == b"\x00\x01\xff"
+
+
+if __name__ == "__main__":
+    test_devices()
+    test_shell_output_and_exit_code()
+    test_session_is_reused()
+    test_concurrent_commands()
+    test_deadline_discards_session()
+    test_unknown_device()
+    test_exec_out_binary()
@@ -0,0 +1,163 @@
+#! /usr/bin/env python3
+"""
+apk_label 测试：构造包含二进制清单和资源表的 APK，分别通过本地读取和伪造的 adb 读取解析应用名称
+"""
+
+import os
+import stat
+import struct
+import sys
+import tempfile
+import zipfile
+from pathlib import Path
+
+CURRENT_PATH = Path(__file__).parent  # test/
+PROJECT_ROOT = CURRENT_PATH.parent    # 项目根目录
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from apk_label import LocalFileReader, AdbFileReader, read_apk_label, read_device_apk_label
+
+ANDROID_NS = "http://schemas.android.com/apk/res/android"
+LABEL_RES_ID = 0x7f010000
+
+
+def _string_pool(strings, utf8=False):
+    data = b""
+    offsets = []
+    for s in strings:
+        offsets.append(len(data))
+        if utf8:
+            encoded = s.encode("utf-8")
+            data += bytes([len(s), len(encoded)]) + encoded + b"\0"
+        else:
+            data += struct.pack("<H", len(s)) + s.encode("utf-16-le") + b"\0\0"
+    data += b"\0" * (-len(data) % 4)
+    strings_start = 28 + 4 * len(strings)
+    flags = 0x100 if utf8 else 0
+    header = struct.pack("<HHIIIIII", 0x0001, 28, strings_start + len(data),
+                         len(strings), 0, flags, strings_start, 0)
+    return header + struct.pack(f"<{len(strings)}I", *offsets) + data
+
+
+def build_manifest(label):
+    """label 为 str 时直接写入清单，为 int 时作为资源引用"""
+    strings = ["label", "android", ANDROID_NS, "manifest", "application", "package", "com.demo.app"]
+    if isinstance(label, str):
+        strings.append(label)
+    idx = {s: i for i, s in enumerate(strings)}
+
+    def element(name, attrs):
+        body = struct.pack("<IIHHHHHH", 0xFFFFFFFF, idx[name], 20, 20, len(attrs), 0, 0, 0)
+        for ns, attr, raw, data_type, value in attrs:
+            body += struct.pack("<IIIHBBI", ns, attr, raw, 8, 0, data_type, value)
+        return struct.pack("<HHIII", 0x0102, 16, 16 + len(body), 1, 0xFFFFFFFF) + body
+
+    def end_element(name):
+        return struct.pack("<HHIIIII", 0x0103, 16, 24, 1, 0xFFFFFFFF, 0xFFFFFFFF, idx[name])
+
+    if isinstance(label, str):
+        label_attr = (idx[ANDROID_NS], idx["label"], idx[label], 0x03, idx[label])
+    else:
+        label_attr = (idx[ANDROID_NS], idx["label"], 0xFFFFFFFF, 0x01, label)
+
+    chunks = _string_pool(strings)
+    chunks += struct.pack("<HHII", 0x0180, 8, 12, 0x01010001)
+    chunks += struct.pack("<HHIIIII", 0x0100, 16, 24, 1, 0xFFFFFFFF, idx["android"], idx[ANDROID_NS])
+    chunks += element("manifest", [(0xFFFFFFFF, idx["package"], idx["com.demo.app"], 0x03, idx["com.demo.app"])])
+    chunks += element("application", [label_attr])
+    chunks += end_element("application") + end_element("manifest")
+    chunks += struct.pack("<HHIIIII", 0x0101, 16, 24, 1, 0xFFFFFFFF, idx["android"], idx[ANDROID_NS])
+    return struct.pack("<HHI", 0x0003, 8, 8 + len(chunks)) + chunks
+
+
+def build_resources(labels):
+    """labels: {(language, country): 名称}，生成只含 string/app_name 一个资源的资源表"""
+    values = list(labels.values())
+    global_pool = _string_pool(values, utf8=True)
+
+    type_strings = _string_pool(["string"])
+    key_strings = _string_pool(["app_name"])
+    type_spec = struct.pack("<HHIBBHII", 0x0202, 16, 20, 1, 0, 0, 1, 0)
+    type_chunks = b""
+    for i, (language, country) in enumerate(labels):
+        config = struct.pack("<IHH2s2s", 64, 0, 0, language.encode(), country.encode()).ljust(64, b"\0")
+        entry = struct.pack("<HHI", 8, 0, 0) + struct.pack("<HBBI", 8, 0, 0x03, i)
+        header_size = 20 + len(config)
+        entries_start = header_size + 4
+        type_chunks += struct.pack("<HHIBBHII", 0x0201, header_size, entries_start + len(entry), 1, 0, 0, 1,
+                                   entries_start) + config + struct.pack("<I", 0) + entry
+
+    name = "com.demo.app".encode("utf-16-le").ljust(256, b"\0")
+    header_size = 288
+    package_body = type_strings + key_strings + type_spec + type_chunks
+    package = struct.pack("<HHII", 0x0200, header_size, header_size + len(package_body), 0x7f) + name
+    package += struct.pack("<IIIII", header_size, 0, header_size + len(type_strings), 0, 0) + package_body
+
+    body = global_pool + package
+    return struct.pack("<HHII", 0x0002, 12, 12 + len(body), 1) + body
+
+
+def build_apk(path, label, labels=None, padding=2 * 1024 * 1024):
+    with zipfile.ZipFile(path, "w") as apk:
+        apk.writestr("AndroidManifest.xml", build_manifest(label), zipfile.ZIP_DEFLATED)
+        if labels:
+            apk.writestr("resources.arsc", build_resources(labels), zipfile.ZIP_STORED)
+        # 模拟体积很大的 dex/资源文件
+        apk.writestr("classes.dex", os.urandom(padding), zipfile.ZIP_STORED)
+
+
+def _fake_adb(bin_dir):
+    """伪造的 adb：忽略 -s 参数，exec-out 直接在本机执行命令（设备路径即本地路径）"""
+    adb = Path(bin_dir) / "adb"
+    adb.write_text('#!/bin/sh\n[ "$1" = "-s" ] && shift 2\n[ "$1" = "exec-out" ] && shift && exec "$@"\nexit 1\n')
+    adb.chmod(adb.stat().st_mode | stat.S_IEXEC)
+
+
+def test_resource_label_prefers_zh_cn():
+    with tempfile.TemporaryDirectory() as tmp:
+        apk_path = os.path.join(tmp, "demo.apk")
+        build_apk(apk_path, LABEL_RES_ID, {("", ""): "Demo App", ("zh", "CN"): "演示应用", ("en", ""): "Demo"})
+        reader = LocalFileReader(apk_path)
+        label = read_apk_label(reader)
+        print("label:", label, "bytes read:", reader.bytes_read, "/", reader.size)
+        assert label == "演示应用"
+        assert reader.bytes_read < reader.size / 10
+
+
+def test_resource_label_default_locale():
+    with tempfile.TemporaryDirectory() as tmp:
+        apk_path = os.path.join(tmp, "demo.apk")
+        build_apk(apk_path, LABEL_RES_ID, {("en", ""): "Demo", ("", ""): "Demo App"})
+        assert read_apk_label(LocalFileReader(apk_path)) == "Demo App"
+
+
+def test_literal_label():
+    with tempfile.TemporaryDirectory() as tmp:
+        apk_path = os.path.join(tmp, "demo.apk")
+        build_apk(apk_path, "Plain Label")
+        assert read_apk_label(LocalFileReader(apk_path)) == "Plain Label"
+
+
+def test_device_reader_with_fake_adb():
+    with tempfile.TemporaryDirectory() as tmp:
+        apk_path = os.path.join(tmp, "base.apk")
+        build_apk(apk_path, LABEL_RES_ID, {("", ""): "Demo App"})
+        _fake_adb(tmp)
+        old_path = os.environ["PATH"]
+        os.environ["PATH"] = f"{tmp}{os.pathsep}{old_path}"
+        try:
+            reader = AdbFileReader(apk_path, serial="emulator-5554")
+            assert read_apk_label(reader) == "Demo App"
+            print("bytes transferred:", reader.bytes_read, "/", reader.size)
+            assert reader.bytes_read < reader.size / 10
+            # 文件不存在时返回 None，由调用方回退
+            assert read_device_apk_label(os.path.join(tmp, "missing.apk")) is None
+        finally:
+            os.environ["PATH"] = old_path
+
+
+if __name__ == "__main__":
+    test_resource_label_prefers_zh_cn()
+    test_resource_label_default_locale()
+    test_literal_label()
+    test_device_reader_with_fake_adb()
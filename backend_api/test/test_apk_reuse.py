@@ -0,0 +1,145 @@
+#! /usr/bin/env python3
+"""
+相同 APK 结果复用测试（需要本地 Redis）：设备上的 APK 指纹和采集过程用桩函数代替，
+验证相同 APK 的任务跳过采集并链接来源任务的采集数据，force 和来源数据缺失时重新采集，
+匹配失败或 PR 未合并的任务不登记结果
+"""
+
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+CURRENT_PATH = Path(__file__).parent  # test/
+PROJECT_ROOT = CURRENT_PATH.parent    # 项目根目录
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import process_launcher
+import task_manager as task_manager_module
+from adb_service import ADBAppManager
+from config import Config
+from logger import TaskLogger
+from task_manager import TaskManager, encode_task_fields
+
+PKG = f"com.test.reuse{uuid.uuid4().hex[:8]}"
+SHA256 = "ab" * 32
+
+
+def test_apk_result_reuse():
+    manager = TaskManager()
+    crawled = []
+
+    def fake_crawl_stage(task_id, pkg, app, tasks_dict, serial=None):
+        crawled.append(task_id)
+        (Path(Config.COLLECTED_BASE_DIR) / task_id).mkdir()
+        (Path(Config.COLLECTED_BASE_DIR) / task_id / "page.json").write_text("{}")
+        tasks_dict[task_id]["status"] = "completed"
+        tasks_dict[task_id]["crawl_stats"] = {"steps": 3}
+        # 模拟完整跑完流水线的结果：匹配成功，发布时该应用无改动而跳过
+        tasks_dict[task_id]["match_status"] = "completed"
+        tasks_dict[task_id]["github_result"] = {"status": "skipped", "reason": "no changes"}
+        return False
+
+    def run_task(force=False):
+        task_data = manager._new_task_data(PKG, "Reuse", force=force)
+        task_id = task_data["task_id"]
+        manager.redis_client.execute_command("HSET", f"{manager.task_prefix}{task_id}", *encode_task_fields(task_data))
+        task_ids.append(task_id)
+        manager._run_task_wrapper(task_id, PKG, "Reuse", serial="emulator-5554")
+        return task_id, manager._get_task(task_id)
+
+    task_ids = []
+    saved = (Config.COLLECTED_BASE_DIR, ADBAppManager.get_apk_fingerprint, task_manager_module.run_crawl_stage)
+    tmp = tempfile.TemporaryDirectory()
+    Config.COLLECTED_BASE_DIR = tmp.name
+    ADBAppManager.get_apk_fingerprint = staticmethod(lambda pkg, serial=None: {"sha256": SHA256, "version_code": "7"})
+    task_manager_module.run_crawl_stage = fake_crawl_stage
+    try:
+        first, record = run_task()
+        assert crawled == [first] and record["status"] == "completed" and record["apk_sha256"] == SHA256
+
+        # 相同 APK：不占用设备采集，采集数据链接到第一个任务
+        second, record = run_task()
+        assert crawled == [first]
+        assert record["status"] == "completed" and record["stage"] == "done"
+        assert record["reused_from"] == first and record["crawl_stats"] == {"steps": 3}
+        assert manager._collected_data_path(second) == manager._collected_data_path(first)
+
+        # force 总是重新采集；来源数据被删除后也重新采集
+        third, record = run_task(force=True)
+        assert crawled == [first, third] and "reused_from" not in record
+        (Path(tmp.name) / second).unlink()
+        for name in (first, third):
+            (Path(tmp.name) / name / "page.json").unlink()
+            (Path(tmp.name) / name).rmdir()
+        fourth, record = run_task()
+        assert crawled == [first, third, fourth]
+    finally:
+        Config.COLLECTED_BASE_DIR, ADBAppManager.get_apk_fingerprint, task_manager_module.run_crawl_stage = saved
+        manager.redis_client.delete(f"{manager.apk_result_prefix}{PKG}:{SHA256}",
+                                    *[f"{manager.task_prefix}{task_id}" for task_id in task_ids])
+        for task_id in task_ids:
+            TaskLogger.flush_task_log(task_id)
+            TaskLogger.get_task_log_path(task_id).unlink(missing_ok=True)
+        tmp.cleanup()
+
+
+def test_failed_match_not_registered():
+    """匹配失败时任务状态仍为 completed，但没有生成规则，不能登记为可复用的结果"""
+    manager = TaskManager()
+    pkg = f"com.test.reuse{uuid.uuid4().hex[:8]}"
+    task_data = manager._new_task_data(pkg, "Reuse")
+    task_id = task_data["task_id"]
+    task_data.update(status="completed", stage="gkd_queued", apk_sha256=SHA256)
+    manager.redis_client.execute_command("HSET", f"{manager.task_prefix}{task_id}", *encode_task_fields(task_data))
+
+    saved = process_launcher.run_gkd_task
+    process_launcher.run_gkd_task = lambda task_id, pkg, app, tasks_dict: False
+    try:
+        manager._run_match_wrapper(task_id, pkg, "Reuse")
+        record = manager._get_task(task_id)
+        assert record["stage"] == "done" and record["match_status"] == "failed", record
+        assert manager.redis_client.get(f"{manager.apk_result_prefix}{pkg}:{SHA256}") is None
+    finally:
+        process_launcher.run_gkd_task = saved
+        manager.redis_client.delete(f"{manager.apk_result_prefix}{pkg}:{SHA256}", f"{manager.task_prefix}{task_id}")
+        TaskLogger.flush_task_log(task_id)
+        TaskLogger.get_task_log_path(task_id).unlink(missing_ok=True)
+
+
+def test_unmerged_pr_not_registered():
+    """发布完成但 PR 未合并（不可合并或缺少 PR 编号）时规则未进入仓库，不能登记；合并后才登记"""
+    manager = TaskManager()
+    pkg = f"com.test.reuse{uuid.uuid4().hex[:8]}"
+    result_key = f"{manager.apk_result_prefix}{pkg}:{SHA256}"
+    task_ids = []
+    try:
+        for merge in ({"merged": False, "reason": "not_mergeable"}, {"merged": False, "reason": "no_pr_number"}):
+            task_data = manager._new_task_data(pkg, "Reuse")
+            task_data.update(status="completed", stage="done", apk_sha256=SHA256, match_status="completed",
+                             github_result={"status": "completed", "merge": merge})
+            task_ids.append(task_data["task_id"])
+            manager.redis_client.execute_command("HSET", f"{manager.task_prefix}{task_data['task_id']}",
+                                                 *encode_task_fields(task_data))
+            manager._finish_task(task_data["task_id"], task_manager_module.RedisTaskDict(manager, task_data["task_id"]))
+            assert manager.redis_client.get(result_key) is None, merge
+
+        task_data = manager._new_task_data(pkg, "Reuse")
+        task_data.update(status="completed", stage="done", apk_sha256=SHA256, match_status="completed",
+                         github_result={"status": "completed", "merge": {"merged": True}})
+        task_ids.append(task_data["task_id"])
+        manager.redis_client.execute_command("HSET", f"{manager.task_prefix}{task_data['task_id']}",
+                                             *encode_task_fields(task_data))
+        manager._finish_task(task_data["task_id"], task_manager_module.RedisTaskDict(manager, task_data["task_id"]))
+        assert manager.redis_client.get(result_key) is not None
+    finally:
+        manager.redis_client.delete(result_key, *[f"{manager.task_prefix}{task_id}" for task_id in task_ids])
+        for task_id in task_ids:
+            TaskLogger.flush_task_log(task_id)
+            TaskLogger.get_task_log_path(task_id).unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    test_apk_result_reuse()
+    test_failed_match_not_registered()
+    test_unmerged_pr_not_registered()
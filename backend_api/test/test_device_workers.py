@@ -0,0 +1,68 @@
+#! /usr/bin/env python3
+"""
+设备常驻进程生命周期测试（需要本地 Redis）：设备接入时调度器预热其常驻采集进程，
+设备断开后结束该进程，不再为已移除的设备保留模型
+"""
+
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+CURRENT_PATH = Path(__file__).parent  # test/
+PROJECT_ROOT = CURRENT_PATH.parent    # 项目根目录
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import redis
+from config import Config
+from crawl_pool import CrawlWorkerPool
+from device_scheduler import DeviceScheduler
+from task_queue import RedisTaskQueue
+
+
+STUB_CRAWL_WORKER = """
+import time
+time.sleep(120)
+"""
+
+
+def _wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.1)
+    return True
+
+
+def test_workers_follow_devices():
+    tmp = tempfile.TemporaryDirectory()
+    (Path(tmp.name) / "crawl_worker.py").write_text(STUB_CRAWL_WORKER, encoding="utf-8")
+    pool = CrawlWorkerPool(sys.executable, Path(tmp.name))
+    client = redis.from_url(Config.get_redis_url(), decode_responses=True)
+    stream = f"test:device_workers:{uuid.uuid4().hex}"
+    task_queue = RedisTaskQueue(client, stream=stream)
+    scheduler = DeviceScheduler(lambda *args: None, task_queue,
+                                on_device_start=lambda serial: pool.warm([serial]),
+                                on_device_stop=pool.stop)
+    try:
+        scheduler.refresh_devices(["dev-a"])
+        assert _wait_for(lambda: "dev-a" in pool._workers), "worker not warmed on discovery"
+        worker = pool._workers["dev-a"]
+        assert worker.alive()
+
+        # dev-a 断开：claim 阻塞结束后线程退出并结束常驻进程
+        scheduler.refresh_devices(["dev-b"])
+        assert _wait_for(lambda: not worker.alive(), timeout=Config.TASK_QUEUE_BLOCK_MS / 1000 + 10), \
+            "worker of removed device still running"
+        assert "dev-a" not in pool._workers
+        assert _wait_for(lambda: "dev-b" in pool._workers)
+    finally:
+        pool.close()
+        client.delete(stream, task_queue.slots_key)
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    test_workers_follow_devices()
@@ -19,26 +19,18 @@ def test_init():
     except Exception as e:
         print("初始化失败:", e)
 
-def test_create_branch():
-    print("=== test_create_branch ===")
+def test_push_worktree():
+    print("=== test_push_worktree ===")
     branch_name = "test/console-branch"
 
     try:
         svc = GitHubService(repo_path=str(PROJECT_ROOT.parent / "GKD_subscription"))
-        result = svc.create_branch(branch_name)
-        print("创建/切换分支成功")
-        print(result)
-        print("当前分支:", svc.repo.active_branch)
-    except Exception as e:
-        print("创建分支失败:", e)
-
-def test_push_branch():
-    print("=== test_push_branch ===")
-    branch_name = "test/console-branch"
-
-    try:
-        svc = GitHubService(repo_path=str(PROJECT_ROOT.parent / "GKD_subscription"))
-        result = svc.push_branch(branch_name)
+        svc.fetch_base()
+        worktree = svc.create_worktree()
+        try:
+            result = svc.push_head(worktree, branch_name)
+        finally:
+            svc.remove_worktree(worktree)
         print("推送成功")
         print(result)
     except Exception as e:
@@ -73,7 +65,6 @@ def test_trigger_workflow():
 
 if __name__ == "__main__":
     test_init()
-    test_create_branch()
-    test_push_branch()
+    test_push_worktree()
     test_create_pr()
     test_trigger_workflow()
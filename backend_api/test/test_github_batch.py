@@ -0,0 +1,249 @@
+#! /usr/bin/env python3
+"""
+GitHub 批量发布测试：本地裸仓库作为 origin，本地 HTTP 服务模拟 GitHub API，
+验证一批任务只产生一次提交/PR/工作流、各任务的归属信息正确，多个批次可在各自的工作树中并行发布，
+合并 PR 后下一批重新拉取基准分支，以及主仓库随基准分支更新、不会回退远端的改动
+"""
+
+import json
+import subprocess
+import sys
+import tempfile
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+CURRENT_PATH = Path(__file__).parent  # test/
+PROJECT_ROOT = CURRENT_PATH.parent    # 项目根目录
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from config import Config
+from github_service import GitHubService
+from logger import TaskLogger
+from process_launcher import run_github_task, run_publish_stage
+
+
+class FakeGitHubHandler(BaseHTTPRequestHandler):
+    """记录请求并按 GitHub API 的格式返回：创建 PR、触发工作流、合并 PR、删除分支"""
+
+    requests = []
+    lock = threading.Lock()
+
+    def _reply(self, status, body=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        with self.lock:
+            self.requests.append((self.command, self.path, payload))
+            number = len(self.requests)
+        if self.command == "POST" and self.path.endswith("/pulls"):
+            self._reply(201, {"number": number, "html_url": f"http://stub/pull/{number}", "state": "open",
+                              "title": payload.get("title")})
+        elif self.command == "POST" and self.path.endswith("/dispatches"):
+            self._reply(204)
+        elif self.command == "PUT" and self.path.endswith("/merge"):
+            self._reply(200, {"sha": "abc123", "message": "merged"})
+        elif self.command == "DELETE" and "/git/refs/heads/" in self.path:
+            self._reply(204)
+        else:
+            self._reply(404, {"message": "Not Found"})
+
+    do_POST = do_PUT = do_DELETE = _handle
+
+    def log_message(self, *args):
+        pass
+
+
+def _git(cwd, *args):
+    return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True).stdout
+
+
+def _setup_repos(root: Path) -> Path:
+    origin = root / "origin.git"
+    work = root / "GKD_subscription"
+    _git(root, "init", "--bare", "-b", "main", str(origin))
+    _git(root, "clone", str(origin), str(work))
+    _git(work, "config", "user.name", "tester")
+    _git(work, "config", "user.email", "tester@example.com")
+    _git(work, "checkout", "-b", "main")
+    (work / "src" / "apps").mkdir(parents=True)
+    (work / "src" / "apps" / "com.existing.ts").write_text("export default {};\n")
+    _git(work, "add", "-A")
+    _git(work, "commit", "-m", "init")
+    _git(work, "push", "origin", "main")
+    return work
+
+
+class _GitHubEnv:
+    """临时的 origin 裸仓库、本地工作仓库和 GitHub API 模拟服务"""
+
+    def __enter__(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGitHubHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        FakeGitHubHandler.requests.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved = (Config.GITHUB_TOKEN, Config.GITHUB_API_BASE, Config.GKD_REPO_PATH)
+        self.work = _setup_repos(Path(self.tmp.name))
+        Config.GITHUB_TOKEN = "test-token"
+        Config.GITHUB_API_BASE = f"http://127.0.0.1:{self.server.server_port}"
+        Config.GKD_REPO_PATH = str(self.work)
+        return self
+
+    def __exit__(self, *exc):
+        Config.GITHUB_TOKEN, Config.GITHUB_API_BASE, Config.GKD_REPO_PATH = self.saved
+        self.server.shutdown()
+        self.tmp.cleanup()
+
+    def write_rules(self, *pkgs):
+        for pkg in pkgs:
+            (self.work / "src" / "apps" / f"{pkg}.ts").write_text(f"// rules for {pkg}\n")
+
+    def pushed_files(self, branch):
+        return sorted(_git(self.work, "show", "--name-only", "--format=", f"origin/{branch}").split())
+
+
+def _pr_branches():
+    return [payload["head"].split(":", 1)[1] for method, path, payload in FakeGitHubHandler.requests
+            if method == "POST" and path.endswith("/pulls")]
+
+
+def test_batch_publication():
+    tasks = [(f"test-{uuid.uuid4()}", pkg, app) for pkg, app in
+             [("com.a", "A"), ("com.b", "B"), ("com.c", "C")]]
+    try:
+        with _GitHubEnv() as env:
+            work = env.work
+            # com.a、com.b 生成了规则，com.c 没有改动；com.d 属于下一批，不应被提交
+            env.write_rules("com.a", "com.b", "com.d")
+            tasks_dict = {task_id: {} for task_id, _, _ in tasks}
+            run_publish_stage(tasks, tasks_dict)
+
+            kinds = [(method, path.rsplit("/", 1)[-1]) for method, path, _ in FakeGitHubHandler.requests]
+            branch = _pr_branches()[0]
+            assert kinds[:3] == [("POST", "pulls"), ("POST", "dispatches"), ("PUT", "merge")], kinds
+            # 合并后删除发布分支
+            assert FakeGitHubHandler.requests[3][:2] == ("DELETE", f"/repos/{Config.GITHUB_OWNER}/"
+                                                                   f"{Config.GITHUB_REPO}/git/refs/heads/{branch}")
+            assert len(FakeGitHubHandler.requests) == 4
+
+            _git(work, "fetch", "origin")
+            assert branch.startswith("test/api-")
+            assert env.pushed_files(branch) == ["src/apps/com.a.ts", "src/apps/com.b.ts"]
+            message = _git(work, "log", "-1", "--format=%B", f"origin/{branch}")
+            assert tasks[0][0] in message and tasks[1][0] in message and tasks[2][0] not in message
+            assert tasks[0][0] in FakeGitHubHandler.requests[0][2]["body"]
+
+            # 主仓库的工作区和分支保持不变，发布用的工作树已清理
+            assert _git(work, "rev-parse", "--abbrev-ref", "HEAD").strip() == "main"
+            assert "com.d.ts" in _git(work, "status", "--porcelain", "-uall")
+            assert len(_git(work, "worktree", "list").splitlines()) == 1
+
+            for task_id, _, _ in tasks[:2]:
+                assert tasks_dict[task_id]["message"] == "All tasks completed (Poker + GKD + GitHub)"
+                assert tasks_dict[task_id]["github_result"]["pr"]["number"] == 1
+            assert tasks_dict[tasks[2][0]]["message"] == "Poker and GKD completed (GitHub skipped)"
+    finally:
+        for task_id, _, _ in tasks:
+            TaskLogger.flush_task_log(task_id)
+            TaskLogger.get_task_log_path(task_id).unlink(missing_ok=True)
+
+
+def test_parallel_publication():
+    fetches = []
+    original_fetch = GitHubService.fetch_base
+
+    def counting_fetch(self, *args, **kwargs):
+        fetched = original_fetch(self, *args, **kwargs)
+        fetches.append(fetched)
+        return fetched
+
+    GitHubService.fetch_base = counting_fetch
+    try:
+        with _GitHubEnv() as env:
+            batches = [[("task-x", "com.x", "X")], [("task-y", "com.y", "Y")], [("task-z", "com.z", "Z")]]
+            env.write_rules("com.x", "com.y", "com.z")
+            results = [None] * len(batches)
+
+            def publish(index):
+                results[index] = run_github_task(str(env.work), "main", "test/api", tasks=batches[index])
+
+            threads = [threading.Thread(target=publish, args=(i,)) for i in range(len(batches))]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+            assert [r["status"] for r in results] == ["completed"] * 3, results
+            assert fetches.count(True) == 1, fetches
+            _git(env.work, "fetch", "origin")
+            for batch, result in zip(batches, results):
+                assert env.pushed_files(result["branch"]["branch"]) == [f"src/apps/{batch[0][1]}.ts"]
+            assert len(set(_pr_branches())) == 3
+
+            # 已发布且与远端一致的文件不会再次提交
+            _git(env.work, "push", "origin", f"origin/{results[0]['branch']['branch']}:refs/heads/main")
+            GitHubService(str(env.work)).fetch_base("main", max_age=0)
+            again = run_github_task(str(env.work), "main", "test/api", tasks=batches[0])
+            assert again["status"] == "skipped" and again["tasks"] == {"task-x": False}, again
+    finally:
+        GitHubService.fetch_base = original_fetch
+
+
+def test_fetch_after_merge():
+    with _GitHubEnv():
+        service = GitHubService(Config.GKD_REPO_PATH)
+        assert service.fetch_base("main", max_age=600)
+        assert not service.fetch_base("main", max_age=600)
+        # 合并 PR 后远端基准分支已变化，下一批不能复用合并前的 fetch
+        assert service.merge_pull_request(1)["merged"]
+        assert service.fetch_base("main", max_age=600)
+        assert not service.fetch_base("main", max_age=600)
+
+
+def test_main_checkout_follows_base():
+    with _GitHubEnv() as env:
+        work = env.work
+        shared = work / "src" / "globalGroups.ts"
+        shared.write_text("v0\n")
+        _git(work, "add", "-A")
+        _git(work, "commit", "-m", "shared")
+        _git(work, "push", "origin", "main")
+
+        # 第一批发布规则文件和共享文件的改动，合并到远端（模拟服务只返回合并成功，这里手动推送）
+        shared.write_text("v1\n")
+        env.write_rules("com.a", "com.d")
+        first = run_github_task(str(work), "main", "test/api", tasks=[("task-a", "com.a", "A")])
+        assert first["merge"]["merged"]
+        _git(work, "push", "origin", f"origin/{first['branch']['branch']}:refs/heads/main")
+
+        # 其他人随后修改了共享文件
+        other = Path(env.tmp.name) / "other"
+        _git(env.tmp.name, "clone", str(Path(env.tmp.name) / "origin.git"), str(other))
+        (other / "src" / "globalGroups.ts").write_text("v2\n")
+        _git(other, "-c", "user.name=other", "-c", "user.email=other@example.com", "commit", "-am", "v2")
+        _git(other, "push", "origin", "main")
+
+        # 第二批不能用主仓库中已发布的旧版本覆盖远端的修改；主仓库同步到远端，未发布的规则保留
+        env.write_rules("com.b")
+        second = run_github_task(str(work), "main", "test/api", tasks=[("task-b", "com.b", "B")])
+        _git(work, "fetch", "origin")
+        assert env.pushed_files(second["branch"]["branch"]) == ["src/apps/com.b.ts"]
+        assert shared.read_text() == "v2\n"
+        assert _git(work, "rev-parse", "HEAD") == _git(work, "rev-parse", "origin/main")
+        status = _git(work, "status", "--porcelain", "-uall")
+        assert "com.d.ts" in status and "com.a.ts" not in status and "globalGroups" not in status, status
+
+
+if __name__ == "__main__":
+    test_batch_publication()
+    test_parallel_publication()
+    test_fetch_after_merge()
+    test_main_checkout_follows_base()
@@ -0,0 +1,153 @@
+#! /usr/bin/env python3
+"""
+GitHubClient 测试：本地 HTTP 服务模拟 GitHub API，验证连接复用、失败重试、
+Retry-After 限流等待、非幂等请求不重发和 ETag 条件请求
+"""
+
+import json
+import sys
+import requests
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+CURRENT_PATH = Path(__file__).parent  # test/
+PROJECT_ROOT = CURRENT_PATH.parent    # 项目根目录
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from github_service import GitHubClient
+
+
+class FakeGitHubHandler(BaseHTTPRequestHandler):
+    """按 responses 中预设的顺序返回 (状态码, 响应头, 响应体)，预设用完后返回 200；delay 秒后才响应"""
+
+    protocol_version = "HTTP/1.1"  # 支持 keep-alive
+    connections = 0
+    delay = 0
+    requests = []
+    responses = []
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+
+    def _handle(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        self.requests.append((self.command, self.path, dict(self.headers)))
+        status, headers, body = self.responses.pop(0) if self.responses else (200, {}, {"ok": True})
+        time.sleep(self.delay)
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = _handle
+
+    def log_message(self, *args):
+        pass
+
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGitHubHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+
+
+def _client(**kwargs):
+    FakeGitHubHandler.requests.clear()
+    FakeGitHubHandler.responses.clear()
+    FakeGitHubHandler.connections = 0
+    FakeGitHubHandler.delay = 0
+    return GitHubClient("test-token", f"http://127.0.0.1:{server.server_port}",
+                        backoff=kwargs.pop("backoff", 0.01), **kwargs)
+
+
+def test_connection_reuse():
+    client = _client()
+    for _ in range(20):
+        assert client.request("POST", "/repos/o/r/pulls", json={}).status_code == 200
+    assert FakeGitHubHandler.connections == 1
+    assert FakeGitHubHandler.requests[0][2]["Authorization"] == "Bearer test-token"
+
+
+def test_retry_on_server_error():
+    client = _client(max_retries=3)
+    FakeGitHubHandler.responses.extend([(502, {}, {"message": "Bad Gateway"}),
+                                        (503, {}, None),
+                                        (201, {}, {"number": 1})])
+    resp = client.request("GET", "/repos/o/r/pulls/1")
+    assert resp.status_code == 201 and resp.json() == {"number": 1}
+    assert len(FakeGitHubHandler.requests) == 3
+
+    # 重试次数用完后返回最后一次响应，客户端错误不重试
+    FakeGitHubHandler.responses.extend([(502, {}, None)] * 4)
+    assert client.request("GET", "/repos/o/r/pulls/1").status_code == 502
+    FakeGitHubHandler.responses.append((404, {}, {"message": "Not Found"}))
+    assert client.request("GET", "/repos/o/r/pulls/1").status_code == 404
+    assert len(FakeGitHubHandler.requests) == 8
+
+
+def test_rate_limit_wait():
+    client = _client(max_wait=5)
+    FakeGitHubHandler.responses.append((429, {"Retry-After": "0.3"}, {"message": "secondary rate limit"}))
+    start = time.perf_counter()
+    assert client.request("PUT", "/repos/o/r/pulls/1/merge").status_code == 200
+    assert time.perf_counter() - start >= 0.3
+
+    FakeGitHubHandler.responses.append(
+        (403, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(int(time.time()))},
+         {"message": "API rate limit exceeded"})
+    )
+    assert client.request("GET", "/repos/o/r/pulls").status_code == 200
+
+    # 需要等待的时间超过上限时直接返回限流响应
+    FakeGitHubHandler.responses.append((429, {"Retry-After": "600"}, None))
+    start = time.perf_counter()
+    assert client.request("POST", "/repos/o/r/pulls").status_code == 429
+    assert time.perf_counter() - start < 1
+
+
+def test_non_idempotent_not_resent():
+    client = _client(max_retries=3)
+    # 超时的 POST 可能已被 GitHub 执行（如触发工作流），不能重发
+    FakeGitHubHandler.delay = 0.5
+    try:
+        client.request("POST", "/repos/o/r/actions/workflows/w.yml/dispatches", json={}, timeout=0.2)
+        assert False, "timeout not raised"
+    except requests.Timeout:
+        pass
+    time.sleep(0.5)
+    assert len(FakeGitHubHandler.requests) == 1
+    FakeGitHubHandler.delay = 0
+
+    # 服务端错误和不带 Retry-After 的限流响应直接返回
+    FakeGitHubHandler.responses.extend([
+        (502, {}, None),
+        (403, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(int(time.time()))}, None),
+    ])
+    assert client.request("PUT", "/repos/o/r/pulls/1/merge").status_code == 502
+    assert client.request("POST", "/repos/o/r/pulls", json={}).status_code == 403
+    assert len(FakeGitHubHandler.requests) == 3
+
+
+def test_etag_conditional_get():
+    client = _client()
+    FakeGitHubHandler.responses.extend([(200, {"ETag": '"v1"'}, [{"number": 3}]),
+                                        (304, {"ETag": '"v1"'}, None)])
+    first = client.request("GET", "/repos/o/r/pulls", params={"state": "open"})
+    second = client.request("GET", "/repos/o/r/pulls", params={"state": "open"})
+    assert first.json() == second.json() == [{"number": 3}]
+    assert "If-None-Match" not in FakeGitHubHandler.requests[0][2]
+    assert FakeGitHubHandler.requests[1][2]["If-None-Match"] == '"v1"'
+
+
+if __name__ == "__main__":
+    test_connection_reuse()
+    test_retry_on_server_error()
+    test_rate_limit_wait()
+    test_non_idempotent_not_resent()
+    test_etag_conditional_get()
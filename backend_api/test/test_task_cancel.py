@@ -0,0 +1,155 @@
+#! /usr/bin/env python3
+"""
+任务取消测试（需要本地 Redis）：排队中的任务立即取消并移出队列；
+执行中的任务（模拟引擎）在轮询间隔内终止引擎进程、记为已取消并释放设备 worker；
+常驻采集进程刚派发任务就取消时同样终止采集子进程
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+CURRENT_PATH = Path(__file__).parent  # test/
+PROJECT_ROOT = CURRENT_PATH.parent    # 项目根目录
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from config import Config
+from logger import TaskLogger
+from task_manager import TaskManager, encode_task_fields
+
+
+def _cleanup(manager, task_ids):
+    manager.redis_client.delete(*[f"{manager.task_prefix}{task_id}" for task_id in task_ids])
+    manager.redis_client.zrem(manager.task_index_key, *task_ids)
+    for task_id in task_ids:
+        TaskLogger.flush_task_log(task_id)
+        TaskLogger.get_task_log_path(task_id).unlink(missing_ok=True)
+
+
+def _engine_running(task_id):
+    return subprocess.run(["pgrep", "-f", task_id], capture_output=True).returncode == 0
+
+
+def test_cancel_queued_task():
+    manager = TaskManager()
+    task_id = manager.submit_task(f"com.test.cancel{uuid.uuid4().hex[:8]}", "Cancel")
+    stream_id = manager.get_task_field(task_id, "stream_id")
+    try:
+        async def cancel():
+            first = await manager.acancel_tasks([task_id, "missing-task"])
+            second = await manager.acancel_tasks([task_id])
+            return first, second
+
+        first, second = asyncio.run(cancel())
+        assert first == {task_id: "cancelled", "missing-task": "not_found"}, first
+        assert second == {task_id: "finished"}, second
+
+        record = manager._get_task(task_id)
+        assert record["status"] == "cancelled" and record["stage"] == "done"
+        assert manager.redis_client.xrange(manager.task_queue.stream, stream_id, stream_id) == []
+
+        # 队列条目已被领取的情况：worker 跳过已取消的任务
+        manager._run_task_wrapper(task_id, record["pkg"], record["app"], serial="emulator-5554")
+        assert manager._get_task(task_id)["status"] == "cancelled"
+    finally:
+        _cleanup(manager, [task_id])
+
+
+def test_cancel_running_task():
+    manager = TaskManager()
+    task_data = manager._new_task_data(f"com.test.cancel{uuid.uuid4().hex[:8]}", "Cancel")
+    task_id = task_data["task_id"]
+    manager.redis_client.execute_command("HSET", f"{manager.task_prefix}{task_id}", *encode_task_fields(task_data))
+
+    saved = (Config.FAKE_ENGINE, Config.TASK_CANCEL_POLL_INTERVAL, Config.COLLECTED_BASE_DIR,
+             os.environ.get("FAKE_CRAWL_SECONDS"))
+    tmp = tempfile.TemporaryDirectory()
+    Config.FAKE_ENGINE = True
+    Config.TASK_CANCEL_POLL_INTERVAL = 0.2
+    Config.COLLECTED_BASE_DIR = tmp.name
+    os.environ["FAKE_CRAWL_SECONDS"] = "120"  # 模拟引擎子进程从环境变量读取
+    try:
+        worker = threading.Thread(target=manager._run_task_wrapper,
+                                  args=(task_id, task_data["pkg"], task_data["app"], "fake-1"))
+        worker.start()
+        deadline = time.time() + 10
+        while not _engine_running(task_id):
+            assert time.time() < deadline, "fake engine did not start"
+            time.sleep(0.1)
+
+        start = time.perf_counter()
+        assert asyncio.run(manager.acancel_tasks([task_id])) == {task_id: "cancelling"}
+        worker.join(timeout=10)
+        assert not worker.is_alive()
+        print(f"取消到释放设备耗时: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+        record = manager._get_task(task_id)
+        assert record["status"] == "cancelled" and record["stage"] == "done", record
+        assert not _engine_running(task_id)
+        assert "[CANCEL]" in TaskLogger.get_task_log_path(task_id).read_text(encoding="utf-8")
+    finally:
+        Config.FAKE_ENGINE, Config.TASK_CANCEL_POLL_INTERVAL, Config.COLLECTED_BASE_DIR, crawl_seconds = saved
+        if crawl_seconds is None:
+            os.environ.pop("FAKE_CRAWL_SECONDS", None)
+        else:
+            os.environ["FAKE_CRAWL_SECONDS"] = crawl_seconds
+        _cleanup(manager, [task_id])
+        tmp.cleanup()
+
+
+# 模拟常驻采集进程：fork 出的采集子进程在 PID 上报之后才建立新会话，覆盖刚派发就取消的时间窗口
+STUB_CRAWL_WORKER = """
+import argparse, os, time
+from multiprocessing.connection import Listener
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--address", required=True)
+args = parser.parse_args()
+with Listener(args.address, family="AF_UNIX", authkey=bytes.fromhex(os.environ["CRAWL_WORKER_AUTHKEY"])) as listener:
+    while True:
+        with listener.accept() as conn:
+            request = conn.recv()
+            pid = os.fork()
+            if pid == 0:
+                time.sleep(2)
+                os.setsid()
+                time.sleep(120)
+                os._exit(0)
+            conn.send({"pid": pid})
+            _, status = os.waitpid(pid, 0)
+            conn.send({"returncode": 0, "crawl_exit": os.waitstatus_to_exitcode(status)})
+"""
+
+
+def test_cancel_right_after_dispatch():
+    from crawl_pool import CrawlWorkerPool
+
+    saved = Config.TASK_CANCEL_POLL_INTERVAL
+    Config.TASK_CANCEL_POLL_INTERVAL = 0.1
+    tmp = tempfile.TemporaryDirectory()
+    (Path(tmp.name) / "crawl_worker.py").write_text(STUB_CRAWL_WORKER, encoding="utf-8")
+    pool = CrawlWorkerPool(sys.executable, Path(tmp.name))
+    try:
+        start = time.perf_counter()
+        returncode = pool.run("stub-device", "com.test.cancel", "Cancel", "task-stub",
+                              str(Path(tmp.name) / "task.log"), cancelled=lambda: True)
+        elapsed = time.perf_counter() - start
+        assert returncode == 0
+        # 进程组尚不存在时直接结束子进程，不会等采集跑完
+        assert elapsed < 10, f"crawl was not killed, took {elapsed:.1f}s"
+    finally:
+        Config.TASK_CANCEL_POLL_INTERVAL = saved
+        pool.close()
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    test_cancel_queued_task()
+    test_cancel_running_task()
+    test_cancel_right_after_dispatch()
@@ -0,0 +1,136 @@
+#! /usr/bin/env python3
+"""
+任务日志写入器测试：内容顺序、flush 语义，磁盘过慢时调用方不阻塞、缓冲区有上限，
+按行数和字节数读取日志末尾，日志文件不存在或被删除时跟随读取正常结束（需要本地 Redis）
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+CURRENT_PATH = Path(__file__).parent  # test/
+PROJECT_ROOT = CURRENT_PATH.parent    # 项目根目录
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from logger import TaskLogger, TaskLogWriter
+from task_manager import TaskManager
+
+
+def _new_task_id():
+    return f"test-{uuid.uuid4()}"
+
+
+def test_append_and_flush():
+    task_id = _new_task_id()
+    log_path = TaskLogger.get_task_log_path(task_id)
+    try:
+        threads = [
+            threading.Thread(target=lambda n=n: [TaskLogger.append_task_log(task_id, f"t{n} line {i}")
+                                                 for i in range(1000)])
+            for n in range(4)
+        ]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        print(f"4000 次追加耗时: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        assert TaskLogger.flush_task_log(task_id)
+        lines = log_path.read_text(encoding="utf-8").splitlines()
+        assert len(lines) == 4000
+        # 同一线程写入的内容保持顺序
+        for n in range(4):
+            assert [line for line in lines if line.startswith(f"t{n} ")] == [f"t{n} line {i}" for i in range(1000)]
+
+        # flush 后子进程直接追加的内容位于其后
+        with open(log_path, "a", encoding="utf-8") as f:
+            f.write("child output\n")
+        TaskLogger.append_task_log(task_id, "after child")
+        TaskLogger.finalize_task_log(task_id, 0, "completed")
+        content = log_path.read_text(encoding="utf-8")
+        assert content.index("child output") < content.index("after child") < content.index("Status: completed")
+    finally:
+        log_path.unlink(missing_ok=True)
+
+
+def test_slow_disk_does_not_block():
+    task_id = _new_task_id()
+    log_path = TaskLogger.get_task_log_path(task_id)
+    writer = TaskLogWriter(flush_interval=0.05, flush_size=1024, max_buffered=10000)
+    original_write = writer._write
+
+    def slow_write(tid, data):
+        time.sleep(0.5)
+        original_write(tid, data)
+
+    writer._write = slow_write
+    try:
+        start = time.perf_counter()
+        for i in range(2000):
+            writer.write(task_id, f"line {i:05d}\n")
+        elapsed = time.perf_counter() - start
+        assert elapsed < 0.5, elapsed
+        assert writer._buffered <= writer.max_buffered
+
+        assert writer.flush(task_id, close=True)
+        content = log_path.read_text(encoding="utf-8")
+        assert "bytes dropped" in content
+        assert "line 00000" in content
+    finally:
+        log_path.unlink(missing_ok=True)
+
+
+
+def test_tail_with_length():
+    task_id = _new_task_id()
+    log_path = TaskLogger.get_task_log_path(task_id)
+    try:
+        log_path.write_text("".join(f"line {i:03d}\n" for i in range(200)), encoding="utf-8")
+        size = log_path.stat().st_size
+        manager = TaskManager()
+
+        result = manager.get_task_log(task_id, tail=3)
+        assert result["content"] == "line 197\nline 198\nline 199\n"
+        # 同时指定 length 时返回末尾的 length 字节，而不是 tail 范围的开头
+        result = manager.get_task_log(task_id, tail=100, length=18)
+        assert result["content"] == "line 198\nline 199\n", result
+        assert result["offset"] == size - 18 and result["next_offset"] == size
+        result = manager.get_task_log(task_id, tail=1, length=1000)
+        assert result["content"] == "line 199\n"
+    finally:
+        log_path.unlink(missing_ok=True)
+
+
+def test_follow_missing_log():
+    manager = TaskManager()
+
+    async def follow(task_id, offset=0, delete_after_first=None):
+        chunks = []
+        async for data in manager.afollow_task_log(task_id, offset):
+            chunks.append(data)
+            if delete_after_first is not None:
+                delete_after_first.unlink()
+        return chunks
+
+    # 日志文件不存在：流直接结束，而不是在读取 None 路径时抛出 TypeError
+    assert asyncio.run(follow(_new_task_id())) == []
+
+    # 跟随过程中日志文件被删除：读完已有内容后结束
+    task_id = _new_task_id()
+    log_path = TaskLogger.get_task_log_path(task_id)
+    try:
+        log_path.write_text("line 1\n", encoding="utf-8")
+        assert asyncio.run(follow(task_id, delete_after_first=log_path)) == [b"line 1\n"]
+    finally:
+        log_path.unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    test_append_and_flush()
+    test_slow_disk_does_not_block()
+    test_tail_with_length()
+    test_follow_missing_log()
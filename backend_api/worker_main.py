@@ -0,0 +1,52 @@
+"""
+独立的任务 worker 进程：消费 Redis Stream 中的任务并在本机连接的设备上执行。
+
+可在多台主机上运行以横向扩展采集能力，所有 worker 与 API 共享 Config.REDIS_URL 指向的 Redis：
+
+    python worker_main.py
+
+流水线的三个阶段可以分别部署，通过 WORKER_STAGES 指定本进程执行的阶段，例如连接设备的主机只执行采集，
+另一台多核主机执行 GKD 匹配：
+
+    WORKER_STAGES=crawl python worker_main.py
+    WORKER_STAGES=match MATCH_WORKERS=16 python worker_main.py
+
+不连接手机压测后端时使用模拟引擎（见 fake_engine.py 和 test/bench_load.py）：
+
+    FAKE_ENGINE=true FAKE_DEVICES=50 python worker_main.py
+"""
+import time
+from prometheus_client import start_http_server
+from adb_service import ADBAppManager
+from fake_engine import fake_devices
+from config import Config
+from logger import logger
+from task_manager import TaskManager
+
+
+def main():
+    task_manager = TaskManager(redis_url=Config.get_redis_url(), task_ttl=Config.TASK_TTL)
+    logger.info(f"Worker started, consuming {Config.TASK_STREAM} as group {Config.TASK_CONSUMER_GROUP}")
+    if Config.WORKER_METRICS_PORT:
+        # worker 进程没有 API，单独暴露 Prometheus 指标
+        start_http_server(Config.WORKER_METRICS_PORT)
+        logger.info(f"Worker metrics available on port {Config.WORKER_METRICS_PORT}")
+
+    stages = [stage.strip() for stage in Config.WORKER_STAGES.split(",") if stage.strip()]
+    task_manager.start_stage_workers([stage for stage in stages if stage in task_manager.stage_pools])
+    logger.info(f"Worker stages: {stages}")
+
+    # 定期同步设备列表，设备插拔后自动增删设备 worker
+    while True:
+        if "crawl" in stages:
+            task_manager.scheduler.refresh_devices(
+                fake_devices() if Config.FAKE_ENGINE else ADBAppManager.get_connected_devices()
+            )
+        time.sleep(Config.DEVICE_REFRESH_INTERVAL)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        logger.info("Worker stopped")
@@ -193,6 +193,7 @@ class FSM(threading.Thread):
                                                                                                   popup_widget_info[0][
                                                                                                       'bounds']):
                     popup = popup_widget_info[0]
+                    StatRecorder.get_instance().inc_popup_cnt()
                     xywh = popup["bounds"]
                     ltrb = get_4corner_coord_withnotpercent(xywh)
                     content["ltrb"] = ltrb
@@ -280,6 +281,7 @@ class FSM(threading.Thread):
         LogUtils.log_info(popup_widget_info)
         if popup_widget_info is not None and len(popup_widget_info) > 0 and detect_shadow(screenshot_path, popup_widget_info[0]['bounds']):
             popup = popup_widget_info[0]
+            StatRecorder.get_instance().inc_popup_cnt()
             xywh = popup["bounds"]
             ltrb = get_4corner_coord_withnotpercent(xywh)
             content["ltrb"] = ltrb
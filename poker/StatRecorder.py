@@ -1,3 +1,5 @@
+import json
+import os
 import time
 
 from myutils.LogUtils import *
@@ -11,6 +13,7 @@ class StatRecorder(object):
         self.start_time = -1
         self.end_time = -1
         self.restart_cnt = 0
+        self.popup_cnt = 0
         self.webview_set = set()
 
     def __new__(cls, *args, **kwargs):
@@ -51,6 +54,33 @@ class StatRecorder(object):
         # LogUtils.log_info(f"总共触发的WebView个数: {len(self.webview_set)}")
         self.end_time = time.time()
         LogUtils.log_info(f"时间为 {self.end_time - self.start_time}")
+        self.dump_stats()
+
+    def dump_stats(self):
+        """
+        将爬取计数写入 collectData/<task_id>/crawl_stats.json，供后端汇总到监控指标；
+        先写临时文件再替换，后端不会读到写了一半的文件
+        """
+        task_id = Config.get_instance().get_task_id()
+        if not task_id:
+            return
+        stats = {
+            "steps": self.total_eles_cnt,
+            "screens": len(self.stat_screen_set),
+            "activities": len(self.stat_activity_set),
+            "popups": self.popup_cnt,
+            "restarts": self.restart_cnt,
+            "elapsed": round(time.time() - self.start_time, 2),
+        }
+        stats_dir = os.path.join(Config.get_instance().root_path, str(task_id))
+        try:
+            os.makedirs(stats_dir, exist_ok=True)
+            tmp_path = os.path.join(stats_dir, "crawl_stats.json.tmp")
+            with open(tmp_path, "w", encoding="utf8") as f:
+                json.dump(stats, f)
+            os.replace(tmp_path, os.path.join(stats_dir, "crawl_stats.json"))
+        except OSError as e:
+            LogUtils.log_info(f"写入爬取统计失败: {e}")
 
     def get_total_coverage(self):
         screen_depth_map = RuntimeContent.get_instance().screen_depth_map
@@ -145,6 +175,9 @@ class StatRecorder(object):
     def inc_restart_cnt(self):
         self.restart_cnt +=1
 
+    def inc_popup_cnt(self):
+        self.popup_cnt +=1
+
     def get_webview_set(self):
         return self.webview_set
 
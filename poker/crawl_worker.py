@@ -0,0 +1,178 @@
+"""
+常驻采集进程：每台设备一个，由后端的 CrawlWorkerPool 启动
+
+启动时导入 torch/cv2/uiautomator2 等重量级模块并加载 YOLO 模型，之后通过本地连接
+（multiprocessing.connection，监听后端指定的 Unix 套接字并校验 authkey）接收采集任务。
+每个任务在 fork 出的子进程中运行：子进程继承已加载的模块和模型，采集状态（Config、RuntimeContent、
+StatRecorder 等单例）在子进程中创建，任务结束随子进程一起销毁，任务之间互不影响。
+常驻进程不初始化 CUDA（fork 之后子进程无法再初始化），模型在 CPU 上预加载，由子进程移到 GPU。
+
+    ANDROID_SERIAL=<设备> CRAWL_WORKER_AUTHKEY=<hex> python crawl_worker.py --address /tmp/crawl_worker_x/worker.sock
+"""
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+from multiprocessing.connection import Listener
+
+from poker_engine import task_config_path, write_task_config
+from run_config import get_config_settings, clear_app_cache, execute_cmd_with_timeout
+from stop_and_run_uiautomator import rerun_uiautomator2
+
+# 超时后先发送 SIGINT 让采集写出结果，超过该时间仍未退出则强制结束
+INTERRUPT_GRACE_SECONDS = 60
+
+
+def warm_up(config_settings):
+    """导入采集代码并在 CPU 上加载模型，使 fork 出的任务子进程无需重复加载"""
+    start = time.time()
+    import run_task  # noqa: F401  导入 FSM、uiautomator2、torch、cv2 等
+    from detect_popup import preload_models
+    preload_models()
+    if config_settings['rerun_uiautomator2'] == 'true':
+        rerun_uiautomator2()
+    print(f"[WORKER] Warmed up in {time.time() - start:.1f}s", flush=True)
+
+
+def run_child(request, config_settings, ready_fd):
+    """在子进程中运行一次采集（对应 poker_engine 启动的 run_task.py），不返回"""
+    code = 1
+    try:
+        # 新会话：采集过程中启动的 adb/shell 子进程与本进程同属一个进程组，取消或超时时一并终止
+        os.setsid()
+        # 通知常驻进程新会话已建立，此后上报的 PID 可以作为进程组 ID 终止
+        os.write(ready_fd, b"1")
+        os.close(ready_fd)
+        # 子进程输出写入任务日志，与 poker_engine 子进程的输出方式一致
+        fd = os.open(request["log_path"], os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        os.dup2(fd, 1)
+        os.dup2(fd, 2)
+        os.close(fd)
+        # 与超时处理配合：SIGINT 触发 run_task 中 KeyboardInterrupt 的收尾逻辑
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+
+        import run_task
+        pkgName, appName, task_id = request["pkg"], request["app"], request["task_id"]
+        print(f'{pkgName}, {appName}')
+        print(f"[ENGINE] Start processing {pkgName} | {appName} (warm worker {os.getppid()})")
+        if config_settings['clear_cache'] == 'true':
+            clear_app_cache(pkgName)
+
+        task_config_file = task_config_path(task_id)
+        write_task_config(task_config_file, config_settings, pkgName, appName, task_id)
+        try:
+            sys.argv = ["run_task.py", task_config_file]
+            run_task.load_task_config(task_config_file)
+        finally:
+            os.remove(task_config_file)
+        run_task.run_crawl()
+        code = 0
+    except KeyboardInterrupt:
+        # 交给 run_task 设置的 excepthook 写出已采集的结果
+        sys.excepthook(*sys.exc_info())
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+def wait_child(pid, timeout):
+    """等待子进程结束，超时先中断再强制结束，返回退出码"""
+    deadline = time.time() + timeout
+    interrupted = False
+    while True:
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done:
+            return os.waitstatus_to_exitcode(status)
+        now = time.time()
+        if now > deadline and not interrupted:
+            print(f"[WORKER] Task process {pid} timed out, interrupting", flush=True)
+            os.kill(pid, signal.SIGINT)
+            interrupted = True
+            deadline = now + INTERRUPT_GRACE_SECONDS
+        elif now > deadline:
+            print(f"[WORKER] Task process {pid} did not exit, killing", flush=True)
+            try:
+                os.killpg(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        time.sleep(0.5)
+
+
+def handle_task(request, config_settings, conn):
+    """运行一个任务，返回采集子进程的退出码；子进程启动后先把其 PID 发给后端，供取消任务时终止"""
+    timeout = int(config_settings['dynamic_run_time']) + 120
+    sys.stdout.flush()
+    sys.stderr.flush()
+    ready_r, ready_w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        conn.close()
+        os.close(ready_r)
+        run_child(request, config_settings, ready_w)
+    os.close(ready_w)
+    try:
+        # 等子进程建立新会话后再上报 PID，否则此时取消会找不到进程组；子进程提前退出时读到 EOF
+        os.read(ready_r, 1)
+    finally:
+        os.close(ready_r)
+    try:
+        try:
+            conn.send({"pid": pid})
+        except OSError:
+            pass
+        return wait_child(pid, timeout)
+    finally:
+        execute_cmd_with_timeout(f"adb shell am force-stop {request['pkg']}")
+        with open(request["log_path"], "a", encoding="utf-8") as log_file:
+            log_file.write(f"[ENGINE] Completed {request['pkg']}\n")
+
+
+def watch_parent(parent_pid):
+    """后端进程退出后随之退出，避免遗留常驻进程"""
+    while True:
+        time.sleep(2)
+        if os.getppid() != parent_pid:
+            os._exit(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm crawl worker")
+    parser.add_argument("--address", required=True, help="Unix socket path to listen on")
+    parser.add_argument("--config", default="config.ini")
+    args = parser.parse_args()
+
+    threading.Thread(target=watch_parent, args=(os.getppid(),), daemon=True).start()
+    authkey = bytes.fromhex(os.environ["CRAWL_WORKER_AUTHKEY"])
+    config_settings = get_config_settings(args.config)
+    warm_up(config_settings)
+
+    # 预热完成后才创建套接字，后端在连接成功之前一直等待
+    with Listener(args.address, family="AF_UNIX", authkey=authkey) as listener:
+        print(f"[WORKER] Listening on {args.address}", flush=True)
+        while True:
+            with listener.accept() as conn:
+                request = conn.recv()
+                # 每个任务重新读取配置，修改 config.ini 无需重启常驻进程
+                config_settings = get_config_settings(args.config)
+                print(f"[WORKER] Task {request['task_id']} received", flush=True)
+                crawl_exit = handle_task(request, config_settings, conn)
+                print(f"[WORKER] Task {request['task_id']} finished with exit code {crawl_exit}", flush=True)
+                try:
+                    # 与 poker_engine 一致：采集子进程的退出码不影响任务结果，只有常驻进程本身出错才算失败
+                    conn.send({"returncode": 0, "crawl_exit": crawl_exit})
+                except OSError:
+                    print(f"[WORKER] Task {request['task_id']} client disconnected", flush=True)
+            if crawl_exit != 0 and config_settings['rerun_uiautomator2'] == 'true':
+                # 任务异常结束（含被取消）时重启 uiautomator2，避免影响下一个任务；先回复结果再重启，
+                # 任务和设备 worker 随即结束，下一个任务的请求在重启完成后才被处理
+                rerun_uiautomator2()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ import os
 import shutil
 import numpy as np
 import time
+import threading
 import torch
 from PIL import Image
 from models.yolo import attempt_load
@@ -75,10 +76,42 @@ def get_border_opt():
 
 
 
+POPUP_WEIGHTS = 'best_borderv2.0.pt'  # 弹窗外框检测模型
+BUTTON_WEIGHTS = 'best_button.pt'  # 弹窗按钮检测模型
+
+# 已加载的模型，按权重文件缓存；常驻采集进程（crawl_worker.py）预先加载，各任务子进程直接复用。
+# 常驻进程只在 CPU 上加载：CUDA 在 fork 之前初始化后，子进程中无法再使用
+# （"Cannot re-initialize CUDA in forked subprocess"），因此由 fork 出的子进程首次使用时再移到 GPU
+_model_cache = {}
+_model_lock = threading.Lock()
+
+
 def get_model(weights_path):
+    """返回 (device, model, names)，同一权重文件在进程内只加载一次"""
+    device = _inference_device()
+    with _model_lock:
+        if weights_path not in _model_cache:
+            _model_cache[weights_path] = _load_model(weights_path, device)
+        loaded_device, model, names = _model_cache[weights_path]
+        if loaded_device != device:
+            _model_cache[weights_path] = (device, model.to(device), names)
+        return _model_cache[weights_path]
+
+
+def preload_models():
+    """在 CPU 上预加载模型，不初始化 CUDA，供常驻进程 fork 任务子进程之前调用"""
+    with _model_lock:
+        for weights_path in (POPUP_WEIGHTS, BUTTON_WEIGHTS):
+            if weights_path not in _model_cache:
+                _model_cache[weights_path] = _load_model(weights_path, torch.device("cpu"))
+
+
+def _inference_device():
     # 指定使用的GPU
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    return torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
 
+def _load_model(weights_path, device):
     # 加载模型
     # weights = 'best_button.pt'  # 更新权重文件路径
     # weights = 'best_borderv1.0.pt'  # 更新权重文件路径
@@ -175,7 +208,7 @@ def detect_popup_by_yolo(img_path):
     dataset = LoadImages(img_path)
 
     opt = get_border_opt()
-    device, model, names = get_model('best_borderv2.0.pt')
+    device, model, names = get_model(POPUP_WEIGHTS)
     for path, img, im0s, vid_cap in dataset:
         img = torch.from_numpy(img).to(device).float()
         img /= 255.0  # 0 - 255 to 0.0 - 1.0
@@ -220,7 +253,7 @@ def detect_button(img_path):
     buttons = []
     dataset = LoadImages(img_path)
     opt = get_button_opt()
-    device, model, names = get_model('best_button.pt')
+    device, model, names = get_model(BUTTON_WEIGHTS)
     for path, img, im0s, vid_cap in dataset:
         img = torch.from_numpy(img).to(device).float()
         img /= 255.0  # 0 - 255 to 0.0 - 1.0
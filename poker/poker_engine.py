@@ -1,4 +1,5 @@
 import argparse
+import os
 from stop_and_run_uiautomator import rerun_uiautomator2
 from run_config import (
     get_config_settings, 
@@ -8,6 +9,33 @@ from run_config import (
 )
 
 
+def task_config_path(task_id):
+    return f"run_config_task_{task_id}.txt"
+
+
+def prepare_device(pkgName, config_settings):
+    """按配置清除应用数据、重启 uiautomator2"""
+    if config_settings['clear_cache'] == 'true':
+        clear_app_cache(pkgName)
+
+    # 重启 uiautoamtor2
+    if config_settings['rerun_uiautomator2'] == 'true':
+        rerun_uiautomator2()
+
+
+def write_task_config(task_config_file, config_settings, pkgName, appName, task_id):
+    """写入 run_task.py 读取的任务配置"""
+    with open(task_config_file, "w", encoding="utf8") as f:
+        f.write(
+            f"{pkgName},{appName},"
+            f"{config_settings['dynamic_ui_depth']},"
+            f"{config_settings['dynamic_run_time']},"
+            f"{config_settings['searchprivacypolicy']},"
+            f"{config_settings['screenuidrep']},"
+            f"{task_id}"
+        )
+
+
 def main():
     parser = argparse.ArgumentParser(description="Single App Engine Runner")
     parser.add_argument("--pkg", required=True)
@@ -27,37 +55,29 @@ def main():
 
     print(f"[ENGINE] Start processing {pkgName} | {appName}")
 
-    try:
-        if config_settings['clear_cache'] == 'true':
-            clear_app_cache(pkgName)
+    # 每个任务使用独立的配置文件，避免多设备并发时互相覆盖
+    task_config_file = task_config_path(args.task_id)
 
-        # 重启 uiautoamtor2
-        if config_settings['rerun_uiautomator2'] == 'true':
-            rerun_uiautomator2()
+    try:
+        prepare_device(pkgName, config_settings)
 
         timeout = int(config_settings['dynamic_run_time']) + 120
 
         # 给 run_task.py 写入配置
-        with open("run_config_task.txt", "w", encoding="utf8") as f:
-            f.write(
-                f"{pkgName},{appName},"
-                f"{config_settings['dynamic_ui_depth']},"
-                f"{config_settings['dynamic_run_time']},"
-                f"{config_settings['searchprivacypolicy']},"
-                f"{config_settings['screenuidrep']},"
-                f"{args.task_id}"
-            )
+        write_task_config(task_config_file, config_settings, pkgName, appName, args.task_id)
 
         # 执行 run_task.py
         if os_type == "win":
-            execute_cmd_with_timeout("python run_task.py", timeout)
+            execute_cmd_with_timeout(f"python run_task.py {task_config_file}", timeout)
         else:
-            execute_cmd_with_timeout("python3 run_task.py", timeout)
+            execute_cmd_with_timeout(f"python3 run_task.py {task_config_file}", timeout)
 
     except Exception as e:
         print(f"[ENGINE] ERROR: {e}")
 
     finally:
+        if os.path.exists(task_config_file):
+            os.remove(task_config_file)
         execute_cmd_with_timeout(f"adb shell am force-stop {pkgName}")
         print(f"[ENGINE] Completed {pkgName}")
 
@@ -42,37 +42,35 @@ def suppress_keyboard_interrupt_message():
     sys.excepthook = new_hook
 
 
-if __name__ == "__main__":
-    try:
-        with open('run_config_task.txt','r',encoding='utf8') as f:
-            args = f.readline()
-        pkgName,appName,depth,test_time,searchPP,ScreenUidRep,task_id = args.split(',')
-        # pkgName = sys.argv[1]
-        # appName = sys.argv[2]
-        # depth = sys.argv[3]
-        # test_time = sys.argv[4]
-        # searchPP = sys.argv[5]
-        # ScreenUidRep = sys.argv[6]
-
-        Config.get_instance().target_pkg_name = pkgName
-        Config.get_instance().app_name = appName
-        Config.get_instance().maxDepth = int(depth)
-        Config.get_instance().test_time = int(test_time)
-        # Config.get_instance().isDrawAppCallGraph = False
-        if searchPP == 'true':
-            searchPP = True
-        else:
-            searchPP = False
-        Config.get_instance().isSearchPrivacyPolicy = searchPP
-        Config.get_instance().ScreenUidRep = ScreenUidRep
-        Config.get_instance().set_task_id(task_id)
-        LogUtils.log_info(f"Task ID 设置为：{task_id}")
-    except IndexError:
-        print('No arg mode.')
-
-
+def load_task_config(config_file):
+    """读取 poker_engine（或常驻采集进程）写入的任务配置文件，设置本次采集的参数"""
+    with open(config_file,'r',encoding='utf8') as f:
+        args = f.readline()
+    pkgName,appName,depth,test_time,searchPP,ScreenUidRep,task_id = args.split(',')
+    # pkgName = sys.argv[1]
+    # appName = sys.argv[2]
+    # depth = sys.argv[3]
+    # test_time = sys.argv[4]
+    # searchPP = sys.argv[5]
+    # ScreenUidRep = sys.argv[6]
+
+    Config.get_instance().target_pkg_name = pkgName
+    Config.get_instance().app_name = appName
+    Config.get_instance().maxDepth = int(depth)
+    Config.get_instance().test_time = int(test_time)
+    # Config.get_instance().isDrawAppCallGraph = False
+    if searchPP == 'true':
+        searchPP = True
+    else:
+        searchPP = False
+    Config.get_instance().isSearchPrivacyPolicy = searchPP
+    Config.get_instance().ScreenUidRep = ScreenUidRep
+    Config.get_instance().set_task_id(task_id)
+    LogUtils.log_info(f"Task ID 设置为：{task_id}")
 
 
+def run_crawl():
+    """按 Config 中的参数运行一次完整的采集流程，结束后写入结果和覆盖率"""
     # 创建一个阻塞队列
     pp_queue = None
     if Config.get_instance().isSearchPrivacyPolicy is True:
@@ -214,3 +212,13 @@ if __name__ == "__main__":
     if Config.get_instance().isDrawAppCallGraph:
         DrawGraphUtils.draw_callgraph(Config.get_instance().get_CollectDataName())
 
+
+if __name__ == "__main__":
+    try:
+        # poker_engine 会传入任务独立的配置文件路径
+        config_file = sys.argv[1] if len(sys.argv) > 1 else 'run_config_task.txt'
+        load_task_config(config_file)
+    except IndexError:
+        print('No arg mode.')
+
+    run_crawl()